@@ -1,5 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from jad_planning import get_J
 
 
 # ===================== LaTeX style =====================
@@ -11,16 +12,6 @@ plt.rcParams.update({
 })
 
 
-# ===================== Calculation function =====================
-def get_J(delta_w, w, v_t, v_w, v_star):
-    numerator   = - v_star * w * delta_w * (v_t - v_w) * (w - v_star)
-    denominator = (v_star - w) * (w - v_w) * (v_t - v_star)
-
-    J_dis = numerator / denominator
-    J_dur = J_dis / v_star
-    return J_dis, J_dur
-
-
 # ===================== Parameter ranges =====================
 param_ranges = {
     'v^*': (40, 80),
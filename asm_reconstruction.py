@@ -0,0 +1,298 @@
+import argparse
+import csv
+import time
+import numpy as np
+from scipy.signal import fftconvolve
+import ALL_FUNCTIONS as Func
+
+
+# ======================================================
+# Adaptive smoothing method (ASM) speed-field reconstruction
+# ======================================================
+#
+# Treiber & Helbing's ASM: the speed at (t, x) is a kernel average of the
+# detector speeds, once along free-flow characteristics (C_FREE) and once
+# along congested ones (the wave speed, WAVE_SPEED as in d_1), blended by
+# how congested both estimates are:
+#
+#   phi(dx, dt)  = exp(-|dx| / SIGMA - |dt| / TAU)
+#   V_c(x, t)    = sum_i phi(x - x_i, t - t_i - (x - x_i) / c) v_i / sum_i phi(...)
+#   w            = (1 + tanh((V_THR - min(V_free, V_cong)) / DELTA_V)) / 2
+#   V            = w V_cong + (1 - w) V_free
+#
+# The kernel is separable: records are binned per detector location and
+# time cell, each detector series is convolved once in time (FFT), and the
+# characteristic shift (x - x_i) / c becomes a lookup in the smoothed
+# series. The cost is O(detectors x cells), independent of the number
+# of records.
+
+WAVE_SPEED = -15 / 3.6    # congested characteristic (m/s)
+C_FREE = 80 / 3.6         # free-flow characteristic (m/s)
+SIGMA = 600.0             # m
+TAU = 30.0                # s
+V_THR = 60 / 3.6          # m/s, centre of the free / congested transition
+DELTA_V = 20 / 3.6        # m/s, width of the transition
+
+GRID_DT = 1.0             # s
+GRID_DX = 10.0            # m
+
+
+
+# ======================================================
+# Detector series
+# ======================================================
+def detector_series(t, x, v, t_edges, decimals=1):
+    """
+    Records binned per detector location (x rounded to `decimals`) and
+    time cell: (locations, speed sums, counts), sums / counts of shape
+    (n_locations, n_cells).
+    """
+    locations, loc = np.unique(np.round(x, decimals), return_inverse=True)
+    n_t = len(t_edges) - 1
+    i_t = np.searchsorted(t_edges, t, side="right") - 1
+    inside = (i_t >= 0) & (i_t < n_t)
+
+    cell = loc[inside] * n_t + i_t[inside]
+    size = len(locations) * n_t
+    sums = np.bincount(cell, weights=v[inside], minlength=size).reshape(len(locations), n_t)
+    counts = np.bincount(cell, minlength=size).reshape(len(locations), n_t).astype(float)
+    return locations, sums, counts
+
+
+def smooth_series(series, dt, tau=TAU):
+    """
+    Convolution of every row with exp(-|t| / tau), truncated at 6 tau.
+    """
+    half = int(np.ceil(6 * tau / dt))
+    kernel = np.exp(-np.abs(np.arange(-half, half + 1) * dt) / tau)
+    return fftconvolve(series, kernel[None, :], mode="same", axes=1)
+
+
+
+# ======================================================
+# Reconstruction
+# ======================================================
+def _characteristic(S, N, locations, t_centers, x_centers, c, sigma):
+    """
+    Kernel averages along the characteristic of speed c: sums over the
+    detectors of the smoothed series read at t - (x - x_i) / c.
+    """
+    n_t = len(t_centers)
+    dt = t_centers[1] - t_centers[0]
+    num = np.zeros((n_t, len(x_centers)), dtype=np.float32)
+    den = np.zeros_like(num)
+
+    # One zero cell on each side: reads outside the observed period give 0
+    S = np.pad(S, ((0, 0), (1, 1))).astype(np.float32)
+    N = np.pad(N, ((0, 0), (1, 1))).astype(np.float32)
+    steps = np.arange(n_t, dtype=np.float32)[:, None]
+
+    for k, x_i in enumerate(locations):
+        dx = x_centers - x_i
+        w_x = np.exp(-np.abs(dx) / sigma).astype(np.float32)
+
+        # Fractional (padded) time index of t - dx / c, linear interpolation
+        pos = np.clip(steps + (1 - dx / c / dt).astype(np.float32), 0, n_t + 1 - 1e-3)
+        i0 = pos.astype(np.int32)
+        frac = pos - i0
+
+        for series, acc in ((S[k], num), (N[k], den)):
+            lo = series[i0]
+            acc += (lo + (series[i0 + 1] - lo) * frac) * w_x
+
+    return num, den
+
+
+def asm_field(t, x, v, t_edges, x_edges,
+              c_free=C_FREE, c_cong=WAVE_SPEED, sigma=SIGMA, tau=TAU,
+              v_thr=V_THR, delta_v=DELTA_V):
+    """
+    Speed field (m/s) on the cells of t_edges x x_edges from detector
+    records (t, x, v arrays). Returns a dict of (n_t, n_x) arrays:
+    "V", "V_free", "V_cong", "w" (congested weight); NaN where no
+    record is in reach of the kernel.
+    """
+    t_edges = np.asarray(t_edges, dtype=float)
+    x_edges = np.asarray(x_edges, dtype=float)
+    t_centers = (t_edges[:-1] + t_edges[1:]) / 2
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    dt = t_edges[1] - t_edges[0]
+
+    locations, sums, counts = detector_series(t, x, v, t_edges)
+    S = smooth_series(sums, dt, tau)
+    N = smooth_series(counts, dt, tau)
+
+    fields = {}
+    for name, c in (("V_free", c_free), ("V_cong", c_cong)):
+        num, den = _characteristic(S, N, locations, t_centers, x_centers, c, sigma)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fields[name] = np.where(den > 1e-12, num / den, np.nan)
+
+    w = 0.5 * (1 + np.tanh((v_thr - np.minimum(fields["V_free"], fields["V_cong"])) / delta_v))
+    fields["w"] = w
+    fields["V"] = w * fields["V_cong"] + (1 - w) * fields["V_free"]
+    return fields
+
+
+
+# ======================================================
+# Ground truth and validation
+# ======================================================
+def load_fcd_speeds(XML_FILE):
+    """
+    (times, ids, xs, speeds) of an FCD file or of its archive.
+    """
+    if XML_FILE.endswith(Func.TRAJECTORY_ARCHIVE_SUFFIX):
+        return Func.load_trajectory_archive(XML_FILE, speeds=True)
+    times, ids, cols = Func.load_fcd_columns(XML_FILE, attrs=("x", "speed"))
+    return times, ids, cols["x"], cols["speed"]
+
+
+def fcd_speed_field(times, xs, speeds, t_edges, x_edges):
+    """
+    Mean FCD speed of every cell (NaN for empty cells) and the counts.
+    """
+    n_t, n_x = len(t_edges) - 1, len(x_edges) - 1
+    i_t = np.searchsorted(t_edges, times, side="right") - 1
+    i_x = np.searchsorted(x_edges, xs, side="right") - 1
+    inside = (i_t >= 0) & (i_t < n_t) & (i_x >= 0) & (i_x < n_x)
+
+    cell = i_t[inside] * n_x + i_x[inside]
+    sums = np.bincount(cell, weights=speeds[inside], minlength=n_t * n_x)
+    counts = np.bincount(cell, minlength=n_t * n_x)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(counts > 0, sums / counts, np.nan)
+    return mean.reshape(n_t, n_x), counts.reshape(n_t, n_x)
+
+
+def virtual_detectors(times, ids, xs, speeds, locations):
+    """
+    Records of loops at `locations` (t, x, v arrays): crossing time and
+    speed interpolated between the two FCD records around each crossing.
+    """
+    order = np.lexsort((times, ids))
+    t, vid, x, v = times[order], ids[order], xs[order], speeds[order]
+    same = vid[1:] == vid[:-1]
+
+    out_t, out_x, out_v = [], [], []
+    for loc in locations:
+        i0 = np.nonzero(same & (x[:-1] < loc) & (loc <= x[1:]))[0]
+        i1 = i0 + 1
+        frac = (loc - x[i0]) / (x[i1] - x[i0])
+        out_t.append(t[i0] + frac * (t[i1] - t[i0]))
+        out_x.append(np.full(len(i0), float(loc)))
+        out_v.append(v[i0] + frac * (v[i1] - v[i0]))
+
+    return np.concatenate(out_t), np.concatenate(out_x), np.concatenate(out_v)
+
+
+def validation_errors(V, V_true, mask=None):
+    """
+    RMSE / MAE / bias (m/s) over the cells where both fields are defined
+    (and mask, if given).
+    """
+    ok = ~np.isnan(V) & ~np.isnan(V_true)
+    if mask is not None:
+        ok &= mask
+    err = V[ok] - V_true[ok]
+    if len(err) == 0:
+        return {"cells": 0, "rmse": np.nan, "mae": np.nan, "bias": np.nan}
+    return {
+        "cells": int(ok.sum()),
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "mae": float(np.mean(np.abs(err))),
+        "bias": float(np.mean(err))
+    }
+
+
+
+# ======================================================
+# Files
+# ======================================================
+def load_detector_records(csv_files):
+    """
+    (t, x, v) arrays of the rows of detector CSVs (Func.save_result schema).
+    """
+    t, x, v = [], [], []
+    for csv_file in csv_files:
+        with open(csv_file, newline="") as f:
+            for row in csv.DictReader(f):
+                t.append(float(row["step"]))
+                x.append(float(row["location"]))
+                v.append(float(row["speed"]))
+    return np.array(t), np.array(x), np.array(v)
+
+
+def save_field(fields, t_edges, x_edges, npz_file):
+    np.savez_compressed(npz_file, t_edges=t_edges, x_edges=x_edges, **fields)
+
+
+def plot_fields(V, V_true, t_edges, x_edges, png_file):
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 2, figsize=(14, 5), sharey=True)
+    for ax, field, title in zip(axes, (V, V_true), ("ASM reconstruction", "FCD ground truth")):
+        mesh = ax.pcolormesh(t_edges, x_edges, field.T * 3.6, cmap="jet_r", vmin=0, vmax=100, shading="flat")
+        ax.set_title(title)
+        ax.set_xlabel("Time (s)")
+    axes[0].set_ylabel("Position (m)")
+    fig.colorbar(mesh, ax=axes, label="Speed (km/h)")
+    fig.savefig(png_file, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ASM speed-field reconstruction from detector records")
+    parser.add_argument("csv", nargs="*", help="detector CSVs (Func.save_result schema)")
+    parser.add_argument("--fcd", help="trajectory file: ground truth for validation")
+    parser.add_argument("--virtual", type=float, nargs="+", metavar="X",
+                        help="use loops at these positions of the FCD instead of CSVs")
+    parser.add_argument("--grid", type=float, nargs=2, default=[GRID_DT, GRID_DX], metavar=("DT", "DX"))
+    parser.add_argument("--length", type=float, default=8000.0, help="road length (m)")
+    parser.add_argument("--out", default="asm_field.npz")
+    parser.add_argument("--plot", help="write reconstruction / ground truth figure (png)")
+    args = parser.parse_args()
+
+    fcd = load_fcd_speeds(args.fcd) if args.fcd else None
+
+    if args.virtual:
+        if fcd is None:
+            parser.error("--virtual needs --fcd")
+        t, x, v = virtual_detectors(*fcd, args.virtual)
+    elif args.csv:
+        t, x, v = load_detector_records(args.csv)
+    else:
+        parser.error("give detector CSVs or --virtual with --fcd")
+
+    t_end = fcd[0].max() if fcd is not None else t.max()
+    t_edges = np.arange(0, t_end + args.grid[0], args.grid[0])
+    x_edges = np.arange(0, args.length + args.grid[1], args.grid[1])
+
+    t0 = time.perf_counter()
+    fields = asm_field(t, x, v, t_edges, x_edges)
+    elapsed = time.perf_counter() - t0
+
+    save_field(fields, t_edges, x_edges, args.out)
+    print(
+        f"{len(t)} records at {len(np.unique(np.round(x, 1)))} locations -> "
+        f"{fields['V'].shape[0]} x {fields['V'].shape[1]} cells in {elapsed:.2f} s, saved as: {args.out}"
+    )
+
+    if fcd is not None:
+        V_true, _ = fcd_speed_field(fcd[0], fcd[2], fcd[3], t_edges, x_edges)
+        x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+        x_lo, x_hi = np.min(x), np.max(x)
+        between = np.broadcast_to((x_centers > x_lo) & (x_centers < x_hi), V_true.shape)
+
+        print(f"\n{'':>22}{'cells':>10}{'RMSE':>10}{'MAE':>10}{'bias':>10}   (km/h)")
+        for name, mask in (("all", None), ("between detectors", between)):
+            e = validation_errors(fields["V"], V_true, mask)
+            print(f"{name:>22}{e['cells']:>10}{e['rmse'] * 3.6:>10.2f}{e['mae'] * 3.6:>10.2f}{e['bias'] * 3.6:>10.2f}")
+
+        if args.plot:
+            plot_fields(fields["V"], V_true, t_edges, x_edges, args.plot)
+            print(f"\nFigure saved as: {args.plot}")
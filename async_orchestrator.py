@@ -0,0 +1,328 @@
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import traci
+import ALL_FUNCTIONS as Func
+import jad_controller
+import scenario_generator
+import results_store
+import sumo_pool
+import run_cache
+
+
+# ======================================================
+# Parameters (same as d_1_simu_jad.py; the periods and the optional
+# features keep the jad_controller defaults)
+# ======================================================
+WAVE_SPEED = -15 / 3.6
+THRESHOLD_INSERT = 3.0
+SG_MAX_SPEED = 10.0
+SG_MIN_DURATION = 30
+
+SUMO_CFG = "run.sumocfg"
+SEED = 1
+SUMO_OPTIONS = ["--no-warnings", "--no-step-log"]
+
+RESULTS_DB = None    # e.g. results_store.RESULTS_DB to also write runs to the store
+
+
+
+# ======================================================
+# One SUMO instance
+# ======================================================
+def fcd_output(jad_speed_kmh, Et_offset):
+    """
+    The FCD output is redirected so that instances do not overwrite each other.
+    """
+    fcd_file = f"d_1_jad_trajectory_{Func.run_tag(jad_speed_kmh, Et_offset)}.xml"
+    return ["--fcd-output", os.path.abspath(fcd_file)]
+
+
+def run_outputs(jad_speed_kmh, Et_offset):
+    """
+    Files written by one run (save_result's CSVs and the trajectory),
+    named with the same Func.run_tag as save_result.
+    """
+    tag = Func.run_tag(jad_speed_kmh, Et_offset)
+    return [
+        f"d_1_jad_strategy_{tag}.csv",
+        f"d_1_jad_detector_upstream_{tag}.csv",
+        f"d_1_jad_detector_downstream_{tag}.csv",
+        f"d_1_jad_trajectory_{tag}.xml"
+    ]
+
+
+def run_params(jad_speed_kmh, Et_offset):
+    """
+    Parameters of one run that enter its cache key (see run_cache.run_key).
+    """
+    return {
+        "jad_speed_kmh": jad_speed_kmh,
+        "Et_offset": Et_offset,
+        "wave_speed": WAVE_SPEED,
+        "threshold_insert": THRESHOLD_INSERT,
+        "sg_max_speed": SG_MAX_SPEED,
+        "sg_min_duration": SG_MIN_DURATION,
+        "sumo_options": SUMO_OPTIONS
+    }
+
+
+def start_instance(label, jad_speed_kmh, Et_offset, sumo_cfg=SUMO_CFG, seed=SEED):
+    """
+    Start a labeled SUMO instance and return its run state.
+    """
+    sumo_binary = os.path.join(os.environ["SUMO_HOME"], "bin", "sumo")
+    sumo_cmd = [
+        sumo_binary, "-c", sumo_cfg, "--start", *SUMO_OPTIONS,
+        "--seed", str(seed), *fcd_output(jad_speed_kmh, Et_offset)
+    ]
+
+    traci.start(sumo_cmd, label=label, doSwitch=False)
+    return init_run(label, traci.getConnection(label), jad_speed_kmh, Et_offset, sumo_cfg, seed)
+
+
+def load_pooled_run(pool, jad_speed_kmh, Et_offset, seed=SEED):
+    """
+    Load a run into a free instance of a warm pool (sumo_pool) and return its run state.
+    """
+    pooled = sumo_pool.acquire(pool, seed, fcd_output(jad_speed_kmh, Et_offset))
+    inst = init_run(pooled["label"], pooled["conn"], jad_speed_kmh, Et_offset, pool["sumo_cfg"], seed)
+    inst["pooled"] = pooled
+    return inst
+
+
+def init_run(label, conn, jad_speed_kmh, Et_offset, sumo_cfg, seed):
+    scenario = scenario_generator.load_scenario(sumo_cfg)
+    step_length = Func.get_simulation_step_length(sumo_cfg)
+
+    return {
+        "label": label,
+        "conn": conn,
+        "end_time": Func.get_simulation_end_time(sumo_cfg),
+        "step_length": step_length,
+        "seed": seed,
+        "scenario": scenario.get("hash", "reference"),
+        "jad_speed": jad_speed_kmh / 3.6,
+        "Et_offset": Et_offset,
+        "step": 0,
+        "ctrl": jad_controller.init_controller(
+            jad_speed_kmh / 3.6, Et_offset, scenario, step_length,
+            wave_speed=WAVE_SPEED, threshold_insert=THRESHOLD_INSERT,
+            sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION,
+            travel_times=bool(RESULTS_DB)
+        )
+    }
+
+
+def control_step(inst):
+    """
+    Python side of one step of d_1_simu_jad.run_simulation (open-loop JAD,
+    jad_controller.controller_step), executed against this instance's
+    connection right after its simulationStep to inst["step"] + step length.
+    """
+    # ALL_FUNCTIONS talks to `traci`; point it at this instance.
+    # Only the event-loop thread runs control logic, so this is race-free.
+    Func.set_traci(inst["conn"])
+
+    step = Func.simulation_time(inst["step_length"])
+    jad_controller.controller_step(inst["ctrl"], step, inst["conn"].vehicle.getIDList())
+
+    inst["step"] = step + inst["ctrl"]["tick"]
+
+
+def finalize_instance(inst, db=None):
+    ctrl = inst["ctrl"]
+    strategy = jad_controller.jad_strategy(ctrl)
+
+    Func.save_result(
+        inst["jad_speed"], WAVE_SPEED, inst["Et_offset"], ctrl["records_up"], ctrl["records_down"],
+        strategy["A"], strategy["B"], strategy["C"], strategy["D"], strategy["E"], strategy["F"],
+        strategy["P1"], strategy["P2"], strategy["P3"],
+        strategy["vt"], strategy["vw"]
+    )
+
+    if db is not None:
+        results_store.save_run(
+            db, inst["jad_speed"], WAVE_SPEED, inst["Et_offset"], inst["seed"], inst["scenario"],
+            ctrl["records_up"], ctrl["records_down"],
+            strategy["A"], strategy["B"], strategy["C"], strategy["D"], strategy["E"], strategy["F"],
+            strategy["P1"], strategy["P2"], strategy["P3"],
+            strategy["vt"], strategy["vw"], travel_times=ctrl["travel_times"]
+        )
+
+
+
+# ======================================================
+# Orchestrator
+# ======================================================
+async def run_instance(inst, db=None, pool=None, cache=None):
+    """
+    While this instance's simulationStep is in flight (worker thread waiting
+    on the socket), the event loop runs the control logic of other instances.
+    A pooled instance is released (reloaded idle) instead of closed.
+    With a run cache, the outputs are stored and the run is marked done
+    in the sweep manifest.
+    """
+    conn = inst["conn"]
+    while inst["step"] < inst["end_time"]:
+        # the step at time t ends at t + step length (SUMO clock, as in d_1)
+        await asyncio.to_thread(conn.simulationStep, float(inst["step"] + inst["step_length"]))
+        control_step(inst)
+
+    if pool is not None:
+        await asyncio.to_thread(sumo_pool.release, pool, inst["pooled"])
+    else:
+        await asyncio.to_thread(conn.close)
+    finalize_instance(inst, db)
+    print(f"[{inst['label']}] finished: {inst['jad_speed'] * 3.6:.0f} km/h, "
+          f"Et_offset {int(inst['Et_offset'])} s, {inst['ctrl']['n_steps']} steps")
+
+    if cache is not None:
+        job = inst["job"]
+        run_cache.store(cache, job["key"], run_outputs(job["speed"], job["offset"]), job["params"])
+        run_cache.mark_run(cache, job["sweep"], job["idx"], "done", job["key"])
+
+
+async def run_pool_worker(pool, queue, insts, db=None, seed=SEED, cache=None):
+    """
+    One worker per pool instance: takes the next run of the queue as soon
+    as its previous run is finished.
+    """
+    while queue:
+        job = queue.popleft()
+        inst = load_pooled_run(pool, job["speed"], job["offset"], seed)
+        inst["job"] = job
+        insts.append(inst)
+        await run_instance(inst, db, pool, cache)
+
+
+def plan_cached_runs(cache, runs, sumo_cfg, seed, sweep=None):
+    """
+    Register the runs in the sweep manifest. Runs done with their current
+    key keep their outputs (restored from the cache if they were removed);
+    the others are restored if cached. Returns the jobs still to simulate.
+    """
+    sweep = sweep or run_cache.sweep_name([[s, o, seed, sumo_cfg] for s, o in runs])
+    scenario = run_cache.scenario_digest(sumo_cfg)
+    code = run_cache.code_version(__file__)
+    params = [run_params(speed, offset) for speed, offset in runs]
+    keys = [run_cache.run_key(scenario, seed, p, code) for p in params]
+    todo = set(run_cache.open_sweep(cache, sweep, [[s, o] for s, o in runs], keys))
+
+    print(f"[Run cache] sweep {sweep}: {len(runs) - len(todo)} of {len(runs)} runs already done")
+
+    jobs = []
+    for idx, (speed, offset) in enumerate(runs):
+        outputs = run_outputs(speed, offset)
+        if idx not in todo and all(os.path.exists(f) for f in outputs):
+            continue
+
+        key = keys[idx]
+        if run_cache.restore(cache, key) is not None:
+            run_cache.mark_run(cache, sweep, idx, "done", key)
+            print(f"[Run cache] {speed:.0f} km/h, Et_offset {int(offset)} s: restored from {key[:12]}")
+            continue
+
+        jobs.append({"speed": speed, "offset": offset, "idx": idx, "key": key,
+                     "params": params[idx], "sweep": sweep})
+    return jobs
+
+
+async def run_all(runs, sumo_cfg=SUMO_CFG, seed=SEED, pool_size=None, cache=None, sweep=None):
+    """
+    runs: list of (jad_speed_kmh, Et_offset); each must be unique because
+    output file names are keyed by them.
+
+    pool_size None: one SUMO instance per run, all at once.
+    pool_size n:    n warm instances (sumo_pool); runs are handed out from
+                    a queue and loaded with traci.load, so SUMO starts n times.
+    cache:          run cache (run_cache.open_cache); runs done in the sweep
+                    manifest are skipped, cached runs are restored, the
+                    others are simulated and stored.
+    """
+    if len(set(Func.run_tag(s, o) for s, o in runs)) != len(runs):
+        raise ValueError("Runs must have distinct (JAD speed, Et offset)")
+
+    if cache is not None:
+        jobs = plan_cached_runs(cache, runs, sumo_cfg, seed, sweep)
+    else:
+        jobs = [{"speed": s, "offset": o} for s, o in runs]
+    if not jobs:
+        return []
+
+    n_instances = len(jobs) if pool_size is None else min(pool_size, len(jobs))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=n_instances))
+
+    db = results_store.open_store(RESULTS_DB) if RESULTS_DB else None
+
+    t0 = time.perf_counter()
+    if pool_size is None:
+        insts = []
+        for i, job in enumerate(jobs):
+            inst = start_instance(f"sim{i}", job["speed"], job["offset"], sumo_cfg, seed)
+            inst["job"] = job
+            insts.append(inst)
+        await asyncio.gather(*(run_instance(inst, db, cache=cache) for inst in insts))
+    else:
+        pool = sumo_pool.start_pool(n_instances, sumo_cfg, SUMO_OPTIONS)
+        queue = deque(jobs)
+        insts = []
+        await asyncio.gather(*(run_pool_worker(pool, queue, insts, db, seed, cache) for _ in range(n_instances)))
+        sumo_pool.close_pool(pool)
+    elapsed = time.perf_counter() - t0
+
+    if db is not None:
+        db.close()
+
+    total_steps = sum(inst["ctrl"]["n_steps"] for inst in insts)
+    print(
+        f"\n[Orchestrator] {len(insts)} runs on {n_instances} instances, {total_steps} steps in {elapsed:.1f} s "
+        f"({total_steps / elapsed:.0f} steps/s)"
+    )
+    if pool_size is not None:
+        sumo_pool.print_pool_stats(pool)
+    return insts
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    # ----------------------
+    # Arguments: pairs of JAD_SPEED (km/h) and Et_OFFSET (s), optionally
+    # preceded by
+    #   --pool N          N warm SUMO instances
+    #   --cache DIR       run cache (skip / restore runs already simulated)
+    #   --cache-budget G  disk budget of the cache (GB)
+    #   --sweep NAME      manifest name (default: digest of the run list)
+    # ----------------------
+    args = sys.argv[1:]
+    options = {"--pool": None, "--cache": None, "--cache-budget": None, "--sweep": None}
+    while len(args) > 1 and args[0] in options:
+        options[args[0]] = args[1]
+        args = args[2:]
+
+    if len(args) < 2 or len(args) % 2 != 0:
+        print("--- Please provide pairs of JAD_SPEED (km/h) and Et_OFFSET (s)")
+        print("    Example: python async_orchestrator.py 35 0 45 0 55 0 55 -40")
+        print("    Example: python async_orchestrator.py --pool 2 35 0 45 0 55 0 55 -40")
+        print("    Example: python async_orchestrator.py --pool 2 --cache run_cache --cache-budget 2 35 0 45 0")
+        sys.exit(1)
+
+    runs = [(float(args[i]), float(args[i + 1])) for i in range(0, len(args), 2)]
+    pool_size = int(options["--pool"]) if options["--pool"] else None
+
+    cache = None
+    if options["--cache"]:
+        budget = float(options["--cache-budget"]) * 1024 ** 3 if options["--cache-budget"] else run_cache.RUN_CACHE_BUDGET
+        cache = run_cache.open_cache(options["--cache"], budget)
+
+    asyncio.run(run_all(runs, pool_size=pool_size, cache=cache, sweep=options["--sweep"]))
+
+    if cache is not None:
+        run_cache.print_cache_stats(cache)
+        run_cache.close_cache(cache)
@@ -2,6 +2,7 @@ import traci
 import os
 import xml.etree.ElementTree as ET
 import ALL_FUNCTIONS as Func
+import traci_monitor
 
 # ======================================================
 # SUMO Configuration
@@ -12,6 +13,15 @@ sumo_binary = os.path.join(os.environ["SUMO_HOME"], "bin", "sumo")
 seed = 3
 sumo_cmd = [sumo_binary, "-c", SUMO_CFG, "--start", "--seed", str(seed)]
 
+# ======================================================
+# TraCI call accounting (optional)
+# ======================================================
+FLAG_TRACI_MONITOR = False
+TRACI_STEP_BUDGET = 10
+
+if FLAG_TRACI_MONITOR:
+    traci = traci_monitor.install(traci, modules=[Func], step_budget=TRACI_STEP_BUDGET)
+
 # ======================================================
 # Read simulation end time from configuration file
 # ======================================================
@@ -51,6 +61,9 @@ while step < end_time:
 traci.close()
 print("Simulation finished")
 
+if FLAG_TRACI_MONITOR:
+    traci.report()
+
 # ======================================================
 # Rename trajectory.xml -> b_1_base_trajectory.xml
 # ======================================================
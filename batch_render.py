@@ -0,0 +1,189 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from jad_io import run_tag
+
+
+# ======================================================
+# Headless batch rendering of time-space diagrams
+# ======================================================
+#
+# A figure spec is a dict:
+#   {"kind": "d_2" (default) | "d_3" | "c_2", "out": output file, and
+#    d_2: "xml": trajectory file, "jad": strategy CSV or None,
+#         "mode": "vector" | "raster" | "cached" (trajectory layer, see d_2.draw_figure)
+#    d_3: "xml": tuple of trajectory files, "runs": matching (JAD_SPEED_KMH, Et_OFFSET)
+#    c_2: "xml": tuple of trajectory files, "files_and_speeds": see c_2.FILES_AND_SPEEDS}
+# Specs sharing their trajectories are rendered by the same worker, so each
+# group is parsed at most once (not at all for cached d_2 layers).
+# Workers use the Agg backend and never show().
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def render_group(xml_file, specs, dpi=150):
+    """
+    Load the trajectories of one group (a file, or a tuple of files for the
+    multi-panel kinds) and render every figure that uses them.
+    Returns (xml_file, number of figures, load seconds, render seconds).
+    """
+    import matplotlib.pyplot as plt
+    import ALL_FUNCTIONS as Func
+
+    t0 = time.perf_counter()
+    trajectories = None
+    if any(spec.get("kind", "d_2") != "d_2" or spec.get("mode", "vector") != "cached"
+           for spec in specs):
+        files = xml_file if isinstance(xml_file, tuple) else (xml_file,)
+        trajectories = [Func.load_trajectory(f) for f in files]
+    t_load = time.perf_counter() - t0
+
+    for spec in specs:
+        kind = spec.get("kind", "d_2")
+        if kind == "d_2":
+            import d_2_simu_jad_plot_tx as d_2
+            times, ids, xs = trajectories[0] if trajectories is not None else (None, None, None)
+            fig = d_2.draw_figure(times, ids, xs, spec.get("jad"),
+                                  mode=spec.get("mode", "vector"), XML_FILE=xml_file, dpi=dpi)
+        elif kind == "d_3":
+            import d_3_simu_jad_plot_tx_failed as d_3
+            fig = d_3.draw_figure(spec["runs"], trajectories)
+        elif kind == "c_2":
+            import c_2_simu_stability_plot_tx as c_2
+            fig = c_2.draw_figure(spec["files_and_speeds"], trajectories)
+        else:
+            raise ValueError(f"Unknown figure kind: {kind}")
+        fig.savefig(spec["out"], dpi=dpi, bbox_inches="tight")
+        plt.close(fig)
+
+    return xml_file, len(specs), t_load, time.perf_counter() - t0 - t_load
+
+
+def specs_for_runs(runs, formats=("png",), out_dir=".", mode="vector"):
+    """
+    One spec per (run, format) for d_1 runs given as (JAD_SPEED_KMH, Et_OFFSET).
+    """
+    specs = []
+    for speed, offset in runs:
+        tag = run_tag(speed, offset)
+        for fmt in formats:
+            specs.append({
+                "xml": f"d_1_jad_trajectory_{tag}.xml",
+                "jad": f"d_1_jad_strategy_{tag}.csv",
+                "out": os.path.join(out_dir, f"jad_trajectory_{tag}.{fmt}"),
+                "mode": mode
+            })
+    return specs
+
+
+def specs_for_files(xml_files, formats=("png",), out_dir=".", mode="vector"):
+    """
+    One spec per (trajectory, format) without JAD annotations,
+    e.g. for b_1 / c_1 trajectories (XML or .traj.npz archives).
+    """
+    specs = []
+    for xml_file in xml_files:
+        name = os.path.basename(xml_file)
+        if name.endswith(".traj.npz"):
+            name = name[:-len(".npz")]
+        stem = os.path.splitext(name)[0]
+        for fmt in formats:
+            specs.append({"xml": xml_file, "jad": None, "out": os.path.join(out_dir, f"{stem}.{fmt}"),
+                          "mode": mode})
+    return specs
+
+
+def specs_for_failed(runs=None, formats=("png",), out_dir="."):
+    """
+    One d_3 spec per format: failed d_1 runs, one panel each
+    (d_3.FAILED_RUNS by default).
+    """
+    if runs is None:
+        import d_3_simu_jad_plot_tx_failed as d_3
+        runs = d_3.FAILED_RUNS
+    xml_files = tuple(f"d_1_jad_trajectory_{run_tag(speed, offset)}.xml" for speed, offset in runs)
+    return [{"kind": "d_3", "xml": xml_files, "runs": list(runs),
+             "out": os.path.join(out_dir, f"jad_trajectory_failed.{fmt}")}
+            for fmt in formats]
+
+
+def specs_for_stability(files_and_speeds=None, formats=("png",), out_dir="."):
+    """
+    One c_2 spec per format: c_1 trajectories, one panel per target speed
+    (c_2.FILES_AND_SPEEDS by default).
+    """
+    if files_and_speeds is None:
+        import c_2_simu_stability_plot_tx as c_2
+        files_and_speeds = c_2.FILES_AND_SPEEDS
+    xml_files = tuple(f"{name}.xml" for name, _ in files_and_speeds)
+    return [{"kind": "c_2", "xml": xml_files, "files_and_speeds": list(files_and_speeds),
+             "out": os.path.join(out_dir, f"stability_trajectory.{fmt}")}
+            for fmt in formats]
+
+
+def render_all(specs, workers=None, dpi=150):
+    """
+    Render all specs in a process pool, one task per trajectory group.
+    """
+    groups = {}
+    for spec in specs:
+        groups.setdefault(spec["xml"], []).append(spec)
+
+    t0 = time.perf_counter()
+    n_figs = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(render_group, xml, group, dpi) for xml, group in groups.items()]
+        for future in as_completed(futures):
+            xml_file, n, t_load, t_render = future.result()
+            n_figs += n
+            print(f"[Render] {xml_file}: {n} figures, load {t_load:.1f} s, render {t_render:.1f} s")
+
+    elapsed = time.perf_counter() - t0
+    print(
+        f"\n[Render] {n_figs} figures from {len(groups)} trajectory groups in {elapsed:.1f} s "
+        f"({n_figs / elapsed:.2f} figures/s)"
+    )
+    return n_figs
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render time-space diagrams in parallel")
+    parser.add_argument("runs", nargs="*", type=float,
+                        help="pairs of JAD_SPEED (km/h) and Et_OFFSET (s), e.g. 35 0 55 -40")
+    parser.add_argument("--xml", nargs="*", default=[],
+                        help="other trajectory files, rendered without JAD annotations")
+    parser.add_argument("--failed", action="store_true",
+                        help="also render the d_3 figure of failed runs")
+    parser.add_argument("--stability", action="store_true",
+                        help="also render the c_2 figure of c_1 trajectories")
+    parser.add_argument("--formats", default="png", help='e.g. "png,pdf"')
+    parser.add_argument("--mode", default="vector", choices=["vector", "raster", "cached"],
+                        help="trajectory layer: vector paths, rasterized, or cached image")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out-dir", default=".")
+    args = parser.parse_args()
+
+    if len(args.runs) % 2 != 0:
+        parser.error("runs must be pairs of JAD_SPEED and Et_OFFSET")
+    if not args.runs and not args.xml and not args.failed and not args.stability:
+        parser.error("nothing to render")
+
+    runs = list(zip(args.runs[0::2], args.runs[1::2]))
+    formats = args.formats.split(",")
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    specs = (specs_for_runs(runs, formats, args.out_dir, args.mode)
+             + specs_for_files(args.xml, formats, args.out_dir, args.mode))
+    if args.failed:
+        specs += specs_for_failed(formats=formats, out_dir=args.out_dir)
+    if args.stability:
+        specs += specs_for_stability(formats=formats, out_dir=args.out_dir)
+    render_all(specs, workers=args.workers)
@@ -1,6 +1,9 @@
 import traci
 import os
+import csv
+import time
 import xml.etree.ElementTree as ET
+import sumo_pool
 
 # -------------------------------
 # SUMO Configuration
@@ -11,6 +14,10 @@ sumo_binary = os.path.join(os.environ["SUMO_HOME"], "bin", "sumo")
 seed = 3
 sumo_cmd_base = [sumo_binary, "-c", SUMO_CFG, "--start", "--seed", str(seed)]
 
+# Keep one SUMO instance alive and reset it with traci.load between target
+# speeds (see sumo_pool.py) instead of traci.start / traci.close per speed
+FLAG_WARM_SUMO = False
+
 # -------------------------------
 # Read simulation end time from config
 # -------------------------------
@@ -34,31 +41,96 @@ SLOWDOWN_DURATION = 5        # Decelerate to target speed within 5 seconds (adju
 TARGET_SPEED_LIST = [30, 40, 50, 60]  # km/h
 
 # -------------------------------
-# Batch simulation
+# Adaptive search of the critical speed
+# -------------------------------
+# False: run TARGET_SPEED_LIST over the full horizon (trajectories for c_2)
+# True:  bisection of the stable / unstable boundary in [SEARCH_LOW, SEARCH_HIGH],
+#        every run ends as soon as its outcome is decided
+FLAG_ADAPTIVE_SEARCH = False
+SEARCH_LOW = 10              # km/h, expected unstable
+SEARCH_HIGH = 80             # km/h, expected stable
+SEARCH_TOL = 2               # km/h, width of the final bracket
+
+# -------------------------------
+# Online instability criterion
+# -------------------------------
+# Virtual detectors move with the controlled vehicle, VIRTUAL_DETECTOR_OFFSETS
+# behind it, each covering +-VIRTUAL_DETECTOR_HALF_WIDTH. Once the target speed
+# is held, the platoon is unstable as soon as a vehicle at a virtual detector
+# drops below UNSTABLE_SPEED_RATIO x target speed (the oscillation grew into
+# stop-and-go); it is stable if this never happens before the controlled
+# vehicle leaves the road.
+VIRTUAL_DETECTOR_OFFSETS = [250, 500, 1000, 1500, 2000]   # m
+VIRTUAL_DETECTOR_HALF_WIDTH = 50                          # m
+UNSTABLE_SPEED_RATIO = 0.5
+
+SEARCH_FILE = "c_1_stability_search.csv"
+
+
+# -------------------------------
+# Virtual detectors
+# -------------------------------
+def read_virtual_detectors(target_vehicle, target_pos, veh_ids):
+    """
+    Minimum speed (m/s) at each virtual detector behind the controlled vehicle,
+    None for an empty detector.
+    """
+    v_min = [None] * len(VIRTUAL_DETECTOR_OFFSETS)
+    far = max(VIRTUAL_DETECTOR_OFFSETS) + VIRTUAL_DETECTOR_HALF_WIDTH
+
+    for vid in veh_ids:
+        if vid == target_vehicle:
+            continue
+        gap = target_pos - traci.vehicle.getLanePosition(vid)
+        if gap <= 0 or gap > far:
+            continue
+        for i, offset in enumerate(VIRTUAL_DETECTOR_OFFSETS):
+            if abs(gap - offset) <= VIRTUAL_DETECTOR_HALF_WIDTH:
+                speed = traci.vehicle.getSpeed(vid)
+                if v_min[i] is None or speed < v_min[i]:
+                    v_min[i] = speed
+    return v_min
+
+
+# -------------------------------
+# One simulation
 # -------------------------------
-for TARGET_SPEED_KMH in TARGET_SPEED_LIST:
+def run_stability(TARGET_SPEED_KMH, trajectory_file, early_exit=False, pool=None):
+    """
+    Simulate one target speed, trajectory saved as trajectory_file. With
+    early_exit, the simulation stops as soon as the outcome is decided
+    (instability detected, or controlled vehicle gone); otherwise it runs
+    until end_time. With a pool, the run is loaded into a warm instance.
+
+    Returns a dict with "outcome" ("stable" / "unstable"), "decided_at" (step),
+    "min_ratio" (lowest virtual detector speed / target speed) and "steps".
+    """
     TARGET_SPEED = TARGET_SPEED_KMH / 3.6  # Convert km/h → m/s
-    print(f"\n========== Simulation TARGET_SPEED = {TARGET_SPEED_KMH} km/h ==========")
-    
+    print(f"\n========== Simulation TARGET_SPEED = {TARGET_SPEED_KMH:g} km/h ==========")
+
     # Start SUMO
-    traci.start(sumo_cmd_base)
-    
+    if pool is not None:
+        inst = sumo_pool.acquire(pool, seed, ["--fcd-output", os.path.abspath(trajectory_file)], switch=True)
+    else:
+        traci.start(sumo_cmd_base)
+
     step = 0
     TARGET_VEHICLE = None
     slowdown_triggered = False
     speed_fixed = False
+    result = {"outcome": None, "decided_at": None, "min_ratio": None, "steps": 0}
 
     while step < end_time:
         traci.simulationStep()
+        veh_ids = traci.vehicle.getIDList()
 
         # Lock the first vehicle that appears
         if TARGET_VEHICLE is None:
-            veh_ids = traci.vehicle.getIDList()
             if veh_ids:
                 TARGET_VEHICLE = veh_ids[0]
                 print(f"[Step {step}] Controlled vehicle: {TARGET_VEHICLE}")
 
-        if TARGET_VEHICLE and TARGET_VEHICLE in traci.vehicle.getIDList():
+        if TARGET_VEHICLE and TARGET_VEHICLE in veh_ids:
             edge_id = traci.vehicle.getRoadID(TARGET_VEHICLE)
             if edge_id != "":
                 lane_id = traci.vehicle.getLaneID(TARGET_VEHICLE)
@@ -70,7 +142,7 @@ for TARGET_SPEED_KMH in TARGET_SPEED_LIST:
                 # ① Reach SLOWDOWN_DISTANCE → start natural slowdown
                 if distance_to_end <= SLOWDOWN_DISTANCE and not slowdown_triggered:
                     current_speed = traci.vehicle.getSpeed(TARGET_VEHICLE)
-                    print(f"[Step {step}] Start slowing down: from {3.6*current_speed:.2f} km/h to {TARGET_SPEED_KMH} km/h, distance to end {distance_to_end:.2f} m")
+                    print(f"[Step {step}] Start slowing down: from {3.6*current_speed:.2f} km/h to {TARGET_SPEED_KMH:g} km/h, distance to end {distance_to_end:.2f} m")
                     traci.vehicle.slowDown(
                         vehID=TARGET_VEHICLE,
                         speed=TARGET_SPEED,
@@ -81,30 +153,142 @@ for TARGET_SPEED_KMH in TARGET_SPEED_LIST:
                 # ② After reaching target speed → force maintain
                 if slowdown_triggered and not speed_fixed:
                     if abs(traci.vehicle.getSpeed(TARGET_VEHICLE) - TARGET_SPEED) < 0.5:
-                        print(f"[Step {step}] Reached {TARGET_SPEED_KMH} km/h, start maintaining speed")
+                        print(f"[Step {step}] Reached {TARGET_SPEED_KMH:g} km/h, start maintaining speed")
                         traci.vehicle.setSpeed(TARGET_VEHICLE, TARGET_SPEED)
                         speed_fixed = True
 
-                # ③ Speed fixed → maintain each step
+                # ③ Speed fixed → maintain each step, watch the platoon behind
                 if speed_fixed:
                     traci.vehicle.setSpeed(TARGET_VEHICLE, TARGET_SPEED)
 
+                    for v_min in read_virtual_detectors(TARGET_VEHICLE, veh_pos, veh_ids):
+                        if v_min is None:
+                            continue
+                        ratio = v_min / TARGET_SPEED
+                        if result["min_ratio"] is None or ratio < result["min_ratio"]:
+                            result["min_ratio"] = ratio
+
+                    if result["outcome"] is None and result["min_ratio"] is not None \
+                            and result["min_ratio"] < UNSTABLE_SPEED_RATIO:
+                        result["outcome"] = "unstable"
+                        result["decided_at"] = step
+                        print(f"[Step {step}] Unstable: {3.6*result['min_ratio']*TARGET_SPEED:.2f} km/h behind the controlled vehicle")
+
+        elif speed_fixed and result["outcome"] is None:
+            # Controlled vehicle left the road without instability
+            result["outcome"] = "stable"
+            result["decided_at"] = step
+            print(f"[Step {step}] Stable: controlled vehicle left, lowest speed ratio {result['min_ratio'] or 1.0:.2f}")
+
         step += 1
 
+        if early_exit and result["outcome"] is not None:
+            break
+
+    if result["outcome"] is None:
+        result["outcome"] = "stable"
+        result["decided_at"] = step
+    result["steps"] = step
+
     # -------------------------------
     # Close simulation
     # -------------------------------
-    traci.close()
-    print(f"Simulation ended: TARGET_SPEED = {TARGET_SPEED_KMH} km/h")
+    if pool is not None:
+        sumo_pool.release(pool, inst)
+    else:
+        traci.close()
+    print(f"Simulation ended: TARGET_SPEED = {TARGET_SPEED_KMH:g} km/h ({result['outcome']}, {step} steps)")
 
     # -------------------------------
     # Rename trajectory file
     # -------------------------------
+    if pool is not None:
+        print(f"File saved as: {trajectory_file}")
+    else:
+        rename_trajectory(trajectory_file)
+
+    return result
+
+
+def rename_trajectory(new_name):
     old_name = "trajectory.xml"
-    new_name = f"c_1_stability_trajectory_{TARGET_SPEED_KMH}.xml"
 
     if os.path.exists(old_name):
         os.rename(old_name, new_name)
         print(f"File renamed to: {new_name}")
     else:
-        print("trajectory.xml file not found")
\ No newline at end of file
+        print("trajectory.xml file not found")
+
+
+# -------------------------------
+# Bisection of the critical speed
+# -------------------------------
+def search_critical_speed(low=SEARCH_LOW, high=SEARCH_HIGH, tol=SEARCH_TOL, pool=None):
+    """
+    Bisection of the lowest stable target speed. Both ends are checked first;
+    returns (highest unstable, lowest stable, runs), with None for a bound
+    that was not found in [low, high].
+    """
+    runs = []
+
+    def run(speed):
+        t0 = time.perf_counter()
+        result = run_stability(speed, f"c_1_stability_search_trajectory_{speed:g}.xml",
+                               early_exit=True, pool=pool)
+        result["speed"] = speed
+        result["wall_time"] = time.perf_counter() - t0
+        runs.append(result)
+        return result["outcome"] == "stable"
+
+    if run(high) is False:
+        print(f"[Search] Unstable at {high:g} km/h, no stable speed in range")
+        return high, None, runs
+    if run(low) is True:
+        print(f"[Search] Stable at {low:g} km/h, no unstable speed in range")
+        return None, low, runs
+
+    while high - low > tol:
+        mid = round((low + high) / 2, 3)
+        if run(mid):
+            high = mid
+        else:
+            low = mid
+        print(f"[Search] Critical speed in ({low:g}, {high:g}] km/h")
+
+    return low, high, runs
+
+
+def save_search(runs, file_name=SEARCH_FILE):
+    with open(file_name, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["target_speed_kmh", "outcome", "decided_at", "min_ratio", "steps", "wall_time"])
+        for r in runs:
+            writer.writerow([f"{r['speed']:g}", r["outcome"], r["decided_at"],
+                             f"{r['min_ratio']:.3f}" if r["min_ratio"] is not None else "",
+                             r["steps"], f"{r['wall_time']:.2f}"])
+    print(f"File saved as: {file_name}")
+
+
+# -------------------------------
+# Batch simulation
+# -------------------------------
+pool = sumo_pool.start_pool(1, SUMO_CFG) if FLAG_WARM_SUMO else None
+
+if FLAG_ADAPTIVE_SEARCH:
+    unstable, stable, runs = search_critical_speed(pool=pool)
+    save_search(runs)
+
+    total_steps = sum(r["steps"] for r in runs)
+    total_wall = sum(r["wall_time"] for r in runs)
+    print(f"\n[Search] {len(runs)} runs, {total_steps} simulated steps "
+          f"({len(runs) * end_time:g} for full runs), {total_wall:.1f} s")
+    if unstable is not None and stable is not None:
+        print(f"[Search] Critical JAD speed between {unstable:g} km/h (unstable) and {stable:g} km/h (stable)")
+
+else:
+    for TARGET_SPEED_KMH in TARGET_SPEED_LIST:
+        run_stability(TARGET_SPEED_KMH, f"c_1_stability_trajectory_{TARGET_SPEED_KMH}.xml", pool=pool)
+
+if pool is not None:
+    sumo_pool.print_pool_stats(pool)
+    sumo_pool.close_pool(pool)
@@ -23,43 +23,22 @@ YTICK_STEP = 1
 # ===================== Main ==========================
 # ======================================================
 
-import xml.etree.ElementTree as ET
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.collections import LineCollection
 import matplotlib.colors as mcolors
+import ALL_FUNCTIONS as Func
 
-# Create a large figure with 4 subplots
-fig, axes = plt.subplots(2, 2, figsize=FIG_SIZE, sharex=True, sharey=True)
-axes = axes.flatten()
-
-# Collect global speeds
-all_speeds_global = []
-vehicle_data_list = []
-
-print(" ")
 
 # ------------------------------
-# Parse XML and extract data
+# Extract per-vehicle data (t, x in km, v in km/h)
 # ------------------------------
-for FILE_NAME, speed in FILES_AND_SPEEDS:
-    print(f"Processing: {FILE_NAME}.xml")
-    
-    times, ids, xs = [], [], []
-
-    tree = ET.parse(FILE_NAME + ".xml")
-    root = tree.getroot()
-
-    for timestep in root.findall("timestep"):
-        t = float(timestep.get("time"))
-        for veh in timestep.findall("vehicle"):
-            times.append(t)
-            ids.append(veh.get("id"))
-            xs.append(float(veh.get("x")) / 1000.0)
-
-    times = np.array(times)
-    ids = np.array(ids)
-    xs = np.array(xs)
+def load_vehicle_data(trajectory):
+    """
+    trajectory: (times, ids, xs) of Func.load_trajectory
+    """
+    times, ids, xs = trajectory
+    xs = xs / 1000.0
 
     vehicle_data = []
     for vid in np.unique(ids):
@@ -73,90 +52,122 @@ for FILE_NAME, speed in FILES_AND_SPEEDS:
         else:
             v_v = np.array([0.0])
 
-        all_speeds_global.extend(v_v)
         vehicle_data.append((t_v, x_v, v_v))
 
-    vehicle_data_list.append(vehicle_data)
+    return vehicle_data
+
+
+def draw_figure(files_and_speeds=FILES_AND_SPEEDS, trajectories=None):
+    """
+    Four time-space panels, one per (file, blocking speed). trajectories:
+    the loaded trajectories of the files, in the same order (loaded here
+    if None). Returns the figure (not shown, not saved).
+    """
+    # Create a large figure with 4 subplots
+    fig, axes = plt.subplots(2, 2, figsize=FIG_SIZE, sharex=True, sharey=True)
+    axes = axes.flatten()
+
+    # ------------------------------
+    # Parse XML and extract data
+    # ------------------------------
+    vehicle_data_list = []
+    for i, (FILE_NAME, speed) in enumerate(files_and_speeds):
+        if trajectories is None:
+            print(f"Processing: {FILE_NAME}.xml")
+            trajectory = Func.load_trajectory(FILE_NAME + ".xml")
+        else:
+            trajectory = trajectories[i]
+        vehicle_data_list.append(load_vehicle_data(trajectory))
+
+    # ------------------------------
+    # Unified colormap
+    # ------------------------------
+    cmap = plt.colormaps["jet_r"]
+    norm = mcolors.Normalize(vmin=0, vmax=90)  # Fix max speed to 90 km/h
+
+    # ------------------------------
+    # Plot subplots
+    # ------------------------------
+
+    # Subplot labels
+    subplot_labels = ["(a)", "(b)", "(c)", "(d)"]
+
+    for idx, ((FILE_NAME, speed), vehicle_data) in enumerate(zip(files_and_speeds, vehicle_data_list)):
+        segments = []
+        colors = []
+
+        for t_v, x_v, v_v in vehicle_data:
+            points = np.array([t_v, x_v]).T.reshape(-1, 1, 2)
+            segs = np.concatenate([points[:-1], points[1:]], axis=1)
+            segments.extend(segs)
+            colors.extend(v_v[:-1])
+
+        lc = LineCollection(
+            segments, cmap=cmap, norm=norm, array=np.array(colors),
+            linewidths=0.4, alpha=0.5
+        )
+        axes[idx].add_collection(lc)
+
+        ax = axes[idx]
+        ax.set_xlim(X_MIN, X_MAX)
+        ax.set_ylim(Y_MIN, Y_MAX)
+        ax.set_xticks(np.arange(X_MIN, X_MAX + 1, XTICK_STEP))
+        ax.set_yticks(np.arange(Y_MIN, Y_MAX + 0.001, YTICK_STEP))
+
+        # Control subplot axis labels
+        if idx == 0:  # Top-left subplot, no x-label
+            ax.set_xlabel("")
+        else:
+            ax.set_xlabel("Time (s)", fontsize=12)
 
-# ------------------------------
-# Unified colormap
-# ------------------------------
-cmap = plt.colormaps["jet_r"]
-norm = mcolors.Normalize(vmin=0, vmax=90)  # Fix max speed to 90 km/h
+        if idx == 1:  # Top-right subplot, no labels
+            ax.set_xlabel("")
+            ax.set_ylabel("")
+        else:
+            ax.set_ylabel("Space (km)", fontsize=12)
 
-# ------------------------------
-# Plot subplots
-# ------------------------------
+        if idx == 3:  # Bottom-right subplot, no y-label
+            ax.set_ylabel("")
 
-# Subplot labels
-subplot_labels = ["(a)", "(b)", "(c)", "(d)"]
-
-for idx, ((FILE_NAME, speed), vehicle_data) in enumerate(zip(FILES_AND_SPEEDS, vehicle_data_list)):
-    segments = []
-    colors = []
-
-    for t_v, x_v, v_v in vehicle_data:
-        points = np.array([t_v, x_v]).T.reshape(-1, 1, 2)
-        segs = np.concatenate([points[:-1], points[1:]], axis=1)
-        segments.extend(segs)
-        colors.extend(v_v[:-1])
-
-    lc = LineCollection(
-        segments, cmap=cmap, norm=norm, array=np.array(colors),
-        linewidths=0.4, alpha=0.5
-    )
-    axes[idx].add_collection(lc)
-
-    ax = axes[idx]
-    ax.set_xlim(X_MIN, X_MAX)
-    ax.set_ylim(Y_MIN, Y_MAX)
-    ax.set_xticks(np.arange(X_MIN, X_MAX + 1, XTICK_STEP))
-    ax.set_yticks(np.arange(Y_MIN, Y_MAX + 0.001, YTICK_STEP))
-    
-    # Control subplot axis labels
-    if idx == 0:  # Top-left subplot, no x-label
-        ax.set_xlabel("")
-    else:
-        ax.set_xlabel("Time (s)", fontsize=12)
-    
-    if idx == 1:  # Top-right subplot, no labels
-        ax.set_xlabel("")
-        ax.set_ylabel("")
-    else:
-        ax.set_ylabel("Space (km)", fontsize=12)
-
-    if idx == 3:  # Bottom-right subplot, no y-label
-        ax.set_ylabel("")
-
-    # Add text in bottom-left corner: Blocking speed + label
-    ax.text(
-        0.03, 0.05,
-        f"{subplot_labels[idx]} {speed} km/h",
-        color='black', fontsize=12,
-        ha='left', va='bottom',
-        transform=ax.transAxes,
-        bbox=dict(facecolor="white", alpha=0.8, edgecolor="none", pad=2)
-    )   
+        # Add text in bottom-left corner: Blocking speed + label
+        ax.text(
+            0.03, 0.05,
+            f"{subplot_labels[idx]} {speed} km/h",
+            color='black', fontsize=12,
+            ha='left', va='bottom',
+            transform=ax.transAxes,
+            bbox=dict(facecolor="white", alpha=0.8, edgecolor="none", pad=2)
+        )
 
-# ------------------------------
-# Add top horizontal colorbar (slightly narrower)
-# ------------------------------
-cbar_ax = fig.add_axes([0.12, 0.92, 0.78, 0.02])  # [left, bottom, width, height]
-cbar = plt.colorbar(lc, cax=cbar_ax, orientation='horizontal', ticklocation='top')
-cbar.set_label("Speed (km/h)", labelpad=-7)
-cbar.set_ticks([0, 30, 60, 90])
+    # ------------------------------
+    # Add top horizontal colorbar (slightly narrower)
+    # ------------------------------
+    cbar_ax = fig.add_axes([0.12, 0.92, 0.78, 0.02])  # [left, bottom, width, height]
+    cbar = fig.colorbar(lc, cax=cbar_ax, orientation='horizontal', ticklocation='top')
+    cbar.set_label("Speed (km/h)", labelpad=-7)
+    cbar.set_ticks([0, 30, 60, 90])
 
-# ------------------------------
-# Adjust subplot spacing for compact layout
-# ------------------------------
-fig.subplots_adjust(top=0.88, hspace=0.2, wspace=0.2)
+    # ------------------------------
+    # Adjust subplot spacing for compact layout
+    # ------------------------------
+    fig.subplots_adjust(top=0.88, hspace=0.2, wspace=0.2)
+
+    return fig
 
-# ------------------------------
-# Save PNG (rasterized, smaller file, LaTeX-friendly)
-# ------------------------------
-png_name = "stability_trajectory.png"
-plt.savefig(png_name, format="png", dpi=150, bbox_inches="tight")  # DPI adjustable
-print(f"Figure saved as: {png_name}")
 
-plt.show()
-plt.close()
\ No newline at end of file
+# ======================================================
+# ===================== Main entry ====================
+# ======================================================
+if __name__ == "__main__":
+    print(" ")
+    fig = draw_figure()
+
+    # ------------------------------
+    # Save PNG (rasterized, smaller file, LaTeX-friendly)
+    # ------------------------------
+    png_name = "stability_trajectory.png"
+    fig.savefig(png_name, format="png", dpi=150, bbox_inches="tight")  # DPI adjustable
+    print(f"Figure saved as: {png_name}")
+
+    plt.show()
+    plt.close(fig)
@@ -0,0 +1,257 @@
+import argparse
+import csv
+import numpy as np
+import ALL_FUNCTIONS as Func
+
+
+# ======================================================
+# Corridor performance and emissions from trajectories
+# ======================================================
+#
+# The trajectory is turned once into segments between consecutive records
+# of the same vehicle (dt, dx, v, a, start point); every metric is then a
+# sum over segments, so a whole run, or every cell of a space-time grid
+# (one np.bincount per metric), costs a few array passes.
+#
+# VKT / VHT     vehicle-km / vehicle-hours travelled
+# delay         VHT minus the time needed at V_FREE (per segment, >= 0)
+# stops         speed drops below STOP_SPEED after having been above RESTART_SPEED
+# accel_noise   standard deviation of the acceleration (m/s^2)
+# fuel / CO2    instantaneous power model for a light vehicle
+#               (Akcelik & Besley), CO2 from the fuel of a petrol car
+
+V_FREE = 25.0          # m/s, maxSpeed of the "car" vType
+STOP_SPEED = 1.0       # m/s
+RESTART_SPEED = 5.0    # m/s, a vehicle must exceed it before it can stop again
+
+# ---- Fuel model parameters (light vehicle) ----
+FUEL_ALPHA = 0.444     # idle fuel rate (mL/s)
+FUEL_BETA1 = 0.09      # mL/kJ
+FUEL_BETA2 = 0.03      # mL/(kJ m/s^2)
+FUEL_B1 = 0.333        # rolling resistance (kN)
+FUEL_B2 = 0.00108      # aerodynamic drag (kN/(m/s)^2)
+VEH_MASS = 1400.0      # kg
+CO2_PER_ML = 2.31      # g CO2 per mL petrol
+
+METRICS = ["VKT", "VHT", "delay_h", "mean_speed_kmh", "stops",
+           "accel_noise", "fuel_L", "CO2_kg", "vehicles"]
+
+
+
+# ======================================================
+# Segments
+# ======================================================
+def trajectory_segments(times, ids, xs, speeds=None):
+    """
+    Segments between consecutive records of each vehicle, as arrays:
+    t0, x0 (start point), dt, dx, v0, v1, a, veh (vehicle index),
+    stop (see stop_events).
+
+    speeds: FCD speeds (m/s) if loaded, otherwise dx / dt is used.
+    """
+    order = np.lexsort((times, ids))
+    t = times[order]
+    x = xs[order]
+    vid = ids[order]
+
+    i0 = np.nonzero(vid[1:] == vid[:-1])[0]
+    i1 = i0 + 1
+
+    dt = t[i1] - t[i0]
+    dx = x[i1] - x[i0]
+
+    if speeds is not None:
+        v = speeds[order]
+        v0, v1 = v[i0], v[i1]
+    else:
+        v_seg = dx / dt
+        same_prev = np.zeros(len(i0), dtype=bool)
+        same_prev[1:] = i0[1:] == i0[:-1] + 1
+        v0 = np.where(same_prev, np.roll(v_seg, 1), v_seg)
+        v1 = v_seg
+
+    _, veh = np.unique(vid[i0], return_inverse=True)
+
+    seg = {
+        "t0": t[i0],
+        "x0": x[i0],
+        "dt": dt,
+        "dx": dx,
+        "v0": v0,
+        "v1": v1,
+        "a": (v1 - v0) / dt,
+        "veh": veh
+    }
+    seg["stop"] = stop_events(seg)
+    return seg
+
+
+def stop_events(seg):
+    """
+    Boolean per segment: the vehicle stops at its end. Speeds between
+    STOP_SPEED and RESTART_SPEED keep the previous state, so crawling
+    in a jam is not counted as many stops.
+    """
+    v = seg["v1"]
+    low = v < STOP_SPEED
+    defining = np.nonzero(low | (v >= RESTART_SPEED))[0]
+
+    prev, cur = defining[:-1], defining[1:]
+    stop = np.zeros(len(v), dtype=bool)
+    stop[cur] = low[cur] & ~low[prev] & (seg["veh"][cur] == seg["veh"][prev])
+    return stop
+
+
+def fuel_rate(v, a):
+    """
+    Fuel consumption rate (mL/s) of the power model for speed v (m/s)
+    and acceleration a (m/s^2), flat road.
+    """
+    R_T = FUEL_B1 + FUEL_B2 * v ** 2 + VEH_MASS * a / 1000
+    inertia = np.where(a > 0, FUEL_BETA2 * VEH_MASS * a ** 2 * v / 1000, 0.0)
+    return np.where(R_T > 0, FUEL_ALPHA + FUEL_BETA1 * R_T * v + inertia, FUEL_ALPHA)
+
+
+
+# ======================================================
+# Metrics
+# ======================================================
+def _sums(seg, cell, n_cells):
+    """
+    Per-cell sums of every additive quantity (cell: cell index of each segment).
+    """
+    def total(weights=None):
+        return np.bincount(cell, weights=weights, minlength=n_cells)
+
+    delay = np.maximum(seg["dt"] - seg["dx"] / V_FREE, 0.0)
+    stops = seg["stop"]
+    fuel = fuel_rate(seg["v0"], seg["a"]) * seg["dt"]
+
+    # Distinct vehicles per cell
+    n_veh = seg["veh"].max() + 1 if len(cell) else 1
+    pairs = np.unique(cell * n_veh + seg["veh"])
+    vehicles = np.bincount(pairs // n_veh, minlength=n_cells)
+
+    return {
+        "n": total(),
+        "dx": total(seg["dx"]),
+        "dt": total(seg["dt"]),
+        "delay": total(delay),
+        "stops": total(stops.astype(float)),
+        "a": total(seg["a"]),
+        "a2": total(seg["a"] ** 2),
+        "fuel": total(fuel),
+        "vehicles": vehicles
+    }
+
+
+def _finish(s):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a_mean = s["a"] / s["n"]
+        return {
+            "VKT": s["dx"] / 1000,
+            "VHT": s["dt"] / 3600,
+            "delay_h": s["delay"] / 3600,
+            "mean_speed_kmh": s["dx"] / s["dt"] * 3.6,
+            "stops": s["stops"].astype(int),
+            "accel_noise": np.sqrt(np.maximum(s["a2"] / s["n"] - a_mean ** 2, 0.0)),
+            "fuel_L": s["fuel"] / 1000,
+            "CO2_kg": s["fuel"] * CO2_PER_ML / 1000,
+            "vehicles": s["vehicles"]
+        }
+
+
+def corridor_metrics(seg, t_range=None, x_range=None):
+    """
+    Metrics of the whole run, or of the segments starting inside
+    t_range x x_range (s, m). Returns a dict of scalars.
+    """
+    keep = np.ones(len(seg["dt"]), dtype=bool)
+    if t_range is not None:
+        keep &= (seg["t0"] >= t_range[0]) & (seg["t0"] < t_range[1])
+    if x_range is not None:
+        keep &= (seg["x0"] >= x_range[0]) & (seg["x0"] < x_range[1])
+
+    sub = {k: v[keep] for k, v in seg.items()}
+    m = _finish(_sums(sub, np.zeros(keep.sum(), dtype=int), 1))
+    return {k: v[0].item() for k, v in m.items()}
+
+
+def region_metrics(seg, t_edges, x_edges):
+    """
+    Metrics of every cell of the space-time grid t_edges x x_edges.
+    Returns a dict of (len(t_edges) - 1, len(x_edges) - 1) arrays.
+    """
+    n_t, n_x = len(t_edges) - 1, len(x_edges) - 1
+    i_t = np.searchsorted(t_edges, seg["t0"], side="right") - 1
+    i_x = np.searchsorted(x_edges, seg["x0"], side="right") - 1
+    inside = (i_t >= 0) & (i_t < n_t) & (i_x >= 0) & (i_x < n_x)
+
+    sub = {k: v[inside] for k, v in seg.items()}
+    cell = i_t[inside] * n_x + i_x[inside]
+    m = _finish(_sums(sub, cell, n_t * n_x))
+    return {k: v.reshape(n_t, n_x) for k, v in m.items()}
+
+
+
+# ======================================================
+# Files
+# ======================================================
+def load_segments(XML_FILE):
+    times, ids, cols = Func.load_fcd_columns(XML_FILE, attrs=("x", "speed"))
+    return trajectory_segments(times, ids, cols["x"], cols["speed"])
+
+
+def save_metrics(rows, csv_file):
+    """
+    rows: list of dicts with "run" and the METRICS
+    """
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["run"] + METRICS)
+        for r in rows:
+            writer.writerow([r["run"]] + [r[k] for k in METRICS])
+
+
+def save_region_metrics(run, m, t_edges, x_edges, csv_file):
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["run", "t_start", "t_end", "x_start", "x_end"] + METRICS)
+        for i in range(len(t_edges) - 1):
+            for j in range(len(x_edges) - 1):
+                writer.writerow(
+                    [run, t_edges[i], t_edges[i + 1], x_edges[j], x_edges[j + 1]]
+                    + [m[k][i, j] for k in METRICS]
+                )
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corridor performance and emissions of trajectory files")
+    parser.add_argument("xml", nargs="+", help="e.g. b_1_base_trajectory.xml d_1_jad_trajectory_55_0.xml")
+    parser.add_argument("--grid", type=float, nargs=2, metavar=("DT", "DX"),
+                        help="also write per-region metrics on a DT (s) x DX (m) grid")
+    parser.add_argument("--out", default="corridor_metrics.csv")
+    args = parser.parse_args()
+
+    rows = []
+    for xml_file in args.xml:
+        seg = load_segments(xml_file)
+        rows.append(dict(run=xml_file, **corridor_metrics(seg)))
+
+        if args.grid:
+            t_edges = np.arange(0, seg["t0"].max() + args.grid[0], args.grid[0])
+            x_edges = np.arange(0, seg["x0"].max() + args.grid[1], args.grid[1])
+            out = xml_file.rsplit(".", 1)[0] + "_regions.csv"
+            save_region_metrics(xml_file, region_metrics(seg, t_edges, x_edges), t_edges, x_edges, out)
+            print(f"Region metrics saved as: {out}")
+
+    save_metrics(rows, args.out)
+
+    print(f"\n{'':>40}" + "".join(f"{k:>15}" for k in METRICS))
+    for r in rows:
+        print(f"{r['run']:>40}" + "".join(f"{r[k]:>15.3f}" for k in METRICS))
+    print(f"\nFile saved as: {args.out}")
@@ -3,6 +3,10 @@ import sys
 import traci
 from scipy.optimize import brentq
 import ALL_FUNCTIONS as Func
+import jad_controller
+import traci_monitor
+import scenario_generator
+import results_store
 
 # ----------------------
 # JAD Parameters
@@ -10,7 +14,6 @@ import ALL_FUNCTIONS as Func
 WAVE_SPEED = -15 / 3.6       # 16 km/h -> m/s
 FLAG_JAD_PLAN = True
 FLAG_JAD_IMPLEMENT = True
-JAD_PLAN = {}
 
 # ----------------------
 # Check command-line arguments
@@ -34,21 +37,28 @@ else:
     print("    Example: python d_1_simu_jad.py 55 0")
     print("    Example: python d_1_simu_jad.py 55 -40")
     print("    Example: python d_1_simu_jad.py 35 0")
+    print("    Optional third argument: SUMO cfg of a generated scenario (default run.sumocfg)")
     sys.exit(1)
 
 JAD_SPEED = JAD_SPEED_KMH / 3.6  # Convert to m/s
 
+# ----------------------
+# Scenario (optional third argument, see scenario_generator.py)
+# ----------------------
+SUMO_CFG = sys.argv[3] if len(sys.argv) > 3 else "run.sumocfg"
+SCENARIO = scenario_generator.load_scenario(SUMO_CFG)
+
 # ----------------------
 # Ramp insertion trigger parameters
 # ----------------------
-RAMP = 1000.0             # Ramp insertion trigger location (m)
+RAMP = SCENARIO["ramp"]   # Ramp insertion trigger location (m), 1000 in run.sumocfg
 THRESHOLD_INSERT = 3.0    # Time headway threshold (s)
 
 # ----------------------
-# Detector locations
+# Detector locations (500 / 7000 in run.sumocfg)
 # ----------------------
-DETECTOR_LOC_UPSTREAM = 500
-DETECTOR_LOC_DOWNSTREAM = 7000
+DETECTOR_LOC_UPSTREAM = SCENARIO["detector_upstream"]
+DETECTOR_LOC_DOWNSTREAM = SCENARIO["detector_downstream"]
 
 # -------------------------------
 # Stop-and-go detection criteria
@@ -59,11 +69,108 @@ SG_MIN_DURATION = 30  # seconds
 # ----------------------
 # Configuration and parameters
 # ----------------------
-SUMO_CFG = "run.sumocfg"
 sumo_binary = os.path.join(os.environ["SUMO_HOME"], "bin", "sumo")
 seed = 1
 sumo_cmd = [sumo_binary, "-c", SUMO_CFG, "--start", "--no-warnings", "--seed", str(seed)]
 
+# ----------------------
+# Step length and update periods
+# ----------------------
+# Time is read from the SUMO clock, so any <step-length> of the cfg works.
+# Each part of the control loop runs at its own period (s, rounded to whole
+# simulation steps): fine-step physics does not multiply the Python cost.
+STEP_LENGTH = Func.get_simulation_step_length(SUMO_CFG)
+CONTROL_PERIOD = 1.0      # Braking disturbance, three-phase control, re-planning
+DETECTOR_PERIOD = 1.0     # Section detectors (crossings in between are interpolated)
+RAMP_PERIOD = 1.0         # Ramp insertion scan
+
+# ----------------------
+# Rolling detector aggregates (optional): count / flow, occupancy, mean speeds
+# ----------------------
+FLAG_DETECTOR_AGGREGATES = False
+AGG_WINDOWS = Func.AGG_WINDOWS    # s, (10, 30, 60)
+
+# ----------------------
+# Ramp headway sketch (optional): quantiles of the headways at the ramp,
+# and the threshold that gives an opportunity within HEADWAY_WITHIN seconds
+# with probability HEADWAY_PROB (see Func.insertion_threshold)
+# ----------------------
+FLAG_HEADWAY_MONITOR = False
+FLAG_HEADWAY_THRESHOLD = False   # use that threshold instead of THRESHOLD_INSERT once the wave is detected
+HEADWAY_WITHIN = 30.0     # s
+HEADWAY_PROB = 0.9
+
+# ----------------------
+# Closed-loop re-planning (optional)
+# ----------------------
+FLAG_CLOSED_LOOP = False
+REPLAN_BUDGET = 1e-3      # Per-step compute budget of estimation + re-planning (s)
+
+# ----------------------
+# Fast-forward (optional): skip steps in which no controller needs attention
+# ----------------------
+FLAG_FAST_FORWARD = False
+FF_MAX_JUMP = 10          # Longest jump (s); vehicles entering meanwhile must not reach the upstream detector
+
+# ----------------------
+# Early exit (optional): stop the run once its outcome is decided. Once the
+# JAD vehicle is back in car-following (phase 3), a virtual detector watches
+# the section between the upstream detector and the JAD vehicle:
+# - success: no vehicle there below SG_MAX_SPEED for EXIT_HORIZON s
+# - failure: the wave survived (speeds below SG_MAX_SPEED there for
+#   SG_MIN_DURATION s), or a secondary wave at a section detector
+#   (stop-and-go upstream, or a second one downstream)
+# ----------------------
+FLAG_EARLY_EXIT = False
+EXIT_HORIZON = 120        # s
+
+# ----------------------
+# Insertion point selection (optional)
+# ----------------------
+FLAG_OPTIMAL_A = False
+A_SLACK_WEIGHT = 1.0      # Weight of the slack to the edges of the feasible region, against J_dur
+A_SLACK_CAP = 20.0        # Slack beyond this margin (s) does not improve the score
+A_DIS_WEIGHT = 0.01       # Weight of J_dis (s per m), against J_dur
+A_SCORE_TOL = 5.0         # Take an opportunity unless a forecast one scores this much better (s)
+A_HISTORY = 10            # Recent opportunities the forecast of the next ones is based on
+A_HORIZON = 300.0         # Forecast horizon (s)
+
+# ----------------------
+# Results store (optional, in addition to the CSV files; also holds the
+# travel time of every vehicle)
+# ----------------------
+FLAG_RESULTS_STORE = False
+RESULTS_DB = results_store.RESULTS_DB
+
+# ----------------------
+# TraCI call accounting (optional)
+# ----------------------
+FLAG_TRACI_MONITOR = False
+TRACI_STEP_BUDGET = 50    # Max TraCI calls per step before a step is flagged
+
+if FLAG_TRACI_MONITOR:
+    traci = traci_monitor.install(traci, modules=[Func], step_budget=TRACI_STEP_BUDGET)
+
+
+def next_control_step(ctrl, step, end_time):
+    """
+    Next step at which a controller needs attention (fast-forward).
+    Per-step control from the disturbance until the JAD vehicle is back in
+    car-following (wave detection, ramp watch, three-phase control);
+    before and after, only the detectors run, interpolated over jumps of
+    up to FF_MAX_JUMP.
+    """
+    tick = ctrl["tick"]
+    if (ctrl["stopped"] and ctrl["flag_jad_plan"]) or ctrl["jad_plan"]:
+        return step + tick
+
+    target = step + jad_controller.on_step_grid(FF_MAX_JUMP, STEP_LENGTH)
+    if not ctrl["stopped"] and step < Func.STOP_START_TIME:
+        target = min(target, Func.STOP_START_TIME)
+    target = min(target, end_time - STEP_LENGTH)
+
+    return max(target, step + tick)
+
 
 def run_simulation():
     """
@@ -72,149 +179,63 @@ def run_simulation():
     - Ramp insertion and three-stage control
     - Upstream / downstream dual detector monitoring
     - Export CSV after simulation
+    (the per-step logic is jad_controller.controller_step)
     """
     end_time = Func.get_simulation_end_time(SUMO_CFG)
     traci.start(sumo_cmd)
 
-    step = 0
-    target_vehicle = None
-    stopped = False
-
-    # -------------------------------
-    # Upstream / downstream detector monitoring
-    # -------------------------------
-    last_pos_up = {}
-    last_pos_down = {}
-    sg_state_up = {}
-    sg_state_down = {}
-    records_up = []
-    records_down = []
-
-    # -------------------------------
-    # Jam-absorption strategy
-    # -------------------------------
-    flag_jad_plan = FLAG_JAD_PLAN
-    last_position_insert = {}
-    inserted_count = 0
-    insertion_info = None
-
-    A = B = C = D = E = F = None
-    Duration_AB = Duration_BC = None
+    ctrl = jad_controller.init_controller(
+        JAD_SPEED, Et_OFFSET, SCENARIO, STEP_LENGTH,
+        wave_speed=WAVE_SPEED, threshold_insert=THRESHOLD_INSERT,
+        sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION,
+        control_period=CONTROL_PERIOD, detector_period=DETECTOR_PERIOD, ramp_period=RAMP_PERIOD,
+        jad_plan=FLAG_JAD_PLAN, jad_implement=FLAG_JAD_IMPLEMENT,
+        detector_aggregates=FLAG_DETECTOR_AGGREGATES, agg_windows=AGG_WINDOWS,
+        headway_monitor=FLAG_HEADWAY_MONITOR, headway_threshold=FLAG_HEADWAY_THRESHOLD,
+        headway_within=HEADWAY_WITHIN, headway_prob=HEADWAY_PROB,
+        closed_loop=FLAG_CLOSED_LOOP, replan_budget=REPLAN_BUDGET,
+        early_exit=FLAG_EARLY_EXIT, exit_horizon=EXIT_HORIZON, travel_times=FLAG_RESULTS_STORE,
+        optimal_A=FLAG_OPTIMAL_A, A_slack_weight=A_SLACK_WEIGHT, A_slack_cap=A_SLACK_CAP,
+        A_dis_weight=A_DIS_WEIGHT, A_score_tol=A_SCORE_TOL, A_history=A_HISTORY, A_horizon=A_HORIZON
+    )
 
+    step = 0
     while step < end_time:
-        traci.simulationStep()
-        veh_ids = traci.vehicle.getIDList()
-
-        # ----------------------------------
-        # First vehicle natural braking
-        # ----------------------------------
-        target_vehicle, stopped = Func.handle_first_vehicle_braking(
-            step, veh_ids, target_vehicle, stopped
-        )
-
-        # ----------------------------------
-        # Upstream detection
-        # ----------------------------------
-        last_pos_up, events_up, _ = Func.detector(
-            step, veh_ids, last_pos=last_pos_up, location=DETECTOR_LOC_UPSTREAM,
-            sg_state=sg_state_up, sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION
-        )
-        if events_up:
-            records_up.extend(events_up)
-
-        # ----------------------------------
-        # Downstream detection
-        # ----------------------------------
-        last_pos_down, events_down, sg_down = Func.detector(
-            step, veh_ids, last_pos=last_pos_down, location=DETECTOR_LOC_DOWNSTREAM,
-            sg_state=sg_state_down, sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION
-        )
-        if events_down:
-            records_down.extend(events_down)
-
-        # ----------------------------------
-        # Print information if stop-and-go is detected
-        # ----------------------------------
-        if sg_down is not None:
-            F = (sg_down["t_start"], DETECTOR_LOC_DOWNSTREAM)
-            E = (sg_down["t_end"], DETECTOR_LOC_DOWNSTREAM)
-            vw = sg_down["v_min"]
-
-            E = (E[0] + Et_OFFSET, E[1])  # Add buffer time for point A
-
-            print(
-                f"\n[SG detected at {sg_down['location']} m] "
-                f"start={sg_down['t_start']} s, "
-                f"end={sg_down['t_end']} s, "
-                f"duration={sg_down['duration']} s, "
-                f"v_start={sg_down['v_start']:.2f} m/s, "
-                f"v_end={sg_down['v_end']:.2f} m/s, "
-                f"v_min={sg_down['v_min']:.2f} m/s, "
-                f"v_mean={sg_down['v_mean']:.2f} m/s"
-            )
-
-        # ----------------------------------
-        # Check ramp insertion opportunity
-        # ----------------------------------
-        if E is not None and F is not None:
-            last_position_insert, insertion_info = Func.check_insertion_opportunity_at_ramp(
-                RAMP, THRESHOLD_INSERT, step, veh_ids, last_position_insert
-            )
-
-        # ----------------------------------
-        # Execute JAD strategy (once: compute A/B/C + insertion)
-        # ----------------------------------
-        if insertion_info and E and F and flag_jad_plan:
-            A = (step, RAMP)
-            vt = insertion_info["leader_v"]
-
-            # JAD Plan
-            B, C, D = Func.plan_jad(JAD_SPEED, WAVE_SPEED, A, E, F, vt, vw)
-            Duration_AB = int(B[0] - A[0])
-            Duration_BC = int(C[0] - B[0])
-
-            print(
-                f"[JAD Input] "
-                f"A ({int(A[0])},{int(A[1])}), "
-                f"E ({int(E[0])},{int(E[1])}), "
-                f"F ({int(F[0])},{int(F[1])}), "
-                f"vt={vt:.2f} m/s, vw={vw:.2f} m/s, w={WAVE_SPEED:.2f} m/s"
-            )
-
-            print(
-                f"[JAD Strategy] "
-                f"A ({int(A[0])},{int(A[1])}), "
-                f"B ({int(B[0])},{int(B[1])}), "
-                f"C ({int(C[0])},{int(C[1])})"
-            )
-
-            P1, P2, P3 = Func.get_feasible_region_of_A(
-                E, F, vt, vw, JAD_SPEED, WAVE_SPEED, DETECTOR_LOC_UPSTREAM
-            )
+        traci.simulationStep(float(step + STEP_LENGTH))   # the step at time t ends at t + STEP_LENGTH
+        step = Func.simulation_time(STEP_LENGTH)
 
-            print(
-                f"[Feasible Region of A] "
-                f"P1 ({int(P1[0])},{int(P1[1])}), "
-                f"P2 ({int(P2[0])},{int(P2[1])}), "
-                f"P3 ({int(P3[0])},{int(P3[1])})"
-            )
+        outcome = jad_controller.controller_step(ctrl, step, traci.vehicle.getIDList())
+        if outcome is not None:
+            print(f"\n[Early exit] {outcome[0]} at {step} s: {outcome[1]}")
+            break
 
-            if FLAG_JAD_IMPLEMENT:
-                inserted_count = Func.insert_vehicle_at_ramp(
-                    JAD_PLAN, step, insertion_info, inserted_count
-                )
+        if FLAG_FAST_FORWARD:
+            step = next_control_step(ctrl, step, end_time)
+        else:
+            step += ctrl["tick"]
 
-            flag_jad_plan = False
+    traci.close()
 
-        # ----------------------------------
-        # Control inserted vehicles at each step
-        # ----------------------------------
-        if FLAG_JAD_IMPLEMENT and JAD_PLAN is not None:
-            Func.control_inserted_vehicles(JAD_PLAN, JAD_SPEED, step, Duration_AB, Duration_BC)
+    n_steps = ctrl["n_steps"]
+    if FLAG_FAST_FORWARD:
+        print(f"[Fast-forward] {n_steps} control steps for {int(end_time)} s")
+    if STEP_LENGTH != 1 or ctrl["tick"] != 1:
+        print(f"[Step length] {STEP_LENGTH} s steps, {n_steps} control updates for {int(end_time)} s")
+
+    if FLAG_CLOSED_LOOP:
+        print(
+            f"[Closed loop] max re-planning time={ctrl['replan_max']*1e3:.3f} ms, "
+            f"steps over budget ({REPLAN_BUDGET*1e3:.1f} ms)={ctrl['replan_over']}, "
+            f"re-plans skipped (previous plan kept)={ctrl['replan_skipped']}"
+        )
 
-        step += 1
+    # (with the closed loop: the last re-planned strategy)
+    strategy = jad_controller.jad_strategy(ctrl)
+    records_up, records_down = ctrl["records_up"], ctrl["records_down"]
 
-    traci.close()
+    if FLAG_TRACI_MONITOR:
+        traci.report()
+        traci.save_report(f"d_1_jad_traci_calls_{Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)}.csv")
 
     # ----------------------------------
     # Save results
@@ -222,18 +243,37 @@ def run_simulation():
     if FLAG_JAD_PLAN:
         Func.save_result(
             JAD_SPEED, WAVE_SPEED, Et_OFFSET, records_up, records_down,
-            A, B, C, D, E, F,
-            P1, P2, P3,
-            vt, vw
+            strategy["A"], strategy["B"], strategy["C"], strategy["D"], strategy["E"], strategy["F"],
+            strategy["P1"], strategy["P2"], strategy["P3"],
+            strategy["vt"], strategy["vw"]
         )
 
+        if FLAG_HEADWAY_MONITOR:
+            Func.save_headway_monitor(
+                ctrl["headway_monitor"], f"d_1_jad_headway_sketch_{Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)}.json"
+            )
+
+        if FLAG_DETECTOR_AGGREGATES:
+            Func.save_detector_aggregates(JAD_SPEED, Et_OFFSET, ctrl["agg_rows_up"], ctrl["agg_rows_down"])
+
+        if FLAG_RESULTS_STORE:
+            db = results_store.open_store(RESULTS_DB)
+            results_store.save_run(
+                db, JAD_SPEED, WAVE_SPEED, Et_OFFSET, seed, SCENARIO.get("hash", "reference"),
+                records_up, records_down,
+                strategy["A"], strategy["B"], strategy["C"], strategy["D"], strategy["E"], strategy["F"],
+                strategy["P1"], strategy["P2"], strategy["P3"],
+                strategy["vt"], strategy["vw"], travel_times=ctrl["travel_times"]
+            )
+            db.close()
+
     print("Simulation finished\n")
 
     # ----------------------------------
     # Rename trajectory file
     # ----------------------------------
-    old_name = "trajectory.xml"
-    new_name = f"d_1_jad_trajectory_{int(JAD_SPEED*3.6)}_{int(Et_OFFSET)}.xml"
+    old_name = os.path.join(os.path.dirname(SUMO_CFG), "trajectory.xml")
+    new_name = f"d_1_jad_trajectory_{Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)}.xml"
 
     if os.path.exists(old_name):
         os.rename(old_name, new_name)
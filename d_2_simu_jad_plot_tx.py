@@ -1,32 +1,44 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import sys
 import ALL_FUNCTIONS as Func
+import results_store
 
 
 # =========================================================
 # Global parameters
 # =========================================================
 FIG_SIZE = (5.5, 5)
+DPI = 150
+X_LIM = (200, 1600)
+Y_LIM = (0, 8)
+
+# ---- Trajectory layer: "vector", "raster" (rasterized in PDF) or "cached" (reused image) ----
+LAYER_MODE = "vector"
 
 # ---- Detector positions (m) ----
 DETECTOR_DOWNSTREAM = 7000
 DETECTOR_UPSTREAM   = 500
 RAMP                = 1000
 
+# ---- Read the JAD strategy from the results store instead of the CSV ----
+RESULTS_DB = None    # e.g. results_store.RESULTS_DB
+
 
 
 # =========================================================
-# Main plotting function
+# Figure from loaded trajectory arrays
 # =========================================================
-def plot_for_speed(JAD_SPEED_KMH, Et_OFFSET):
+def draw_figure(times, ids, xs, JAD_FILE=None, row=None, mode="vector", XML_FILE=None, dpi=DPI):
+    """
+    Time-space diagram with reference lines and, if a strategy CSV or
+    strategy row is given, the JAD points and feasible region.
+    Returns the figure (not shown, not saved).
 
-    XML_FILE = f"d_1_jad_trajectory_{int(JAD_SPEED_KMH)}_{int(Et_OFFSET)}.xml"
-    JAD_FILE = f"d_1_jad_strategy_{int(JAD_SPEED_KMH)}_{int(Et_OFFSET)}.csv"
-
-    # -----------------------------------------------------
-    # Load trajectory
-    # -----------------------------------------------------
-    times, ids, xs = Func.load_trajectory(XML_FILE)
+    mode="cached" draws the trajectory layer from the image cache of
+    XML_FILE; times / ids / xs are not needed then. The layer is rendered
+    at dpi, which must be the dpi the figure is saved with.
+    """
 
     # -----------------------------------------------------
     # Create figure
@@ -38,7 +50,12 @@ def plot_for_speed(JAD_SPEED_KMH, Et_OFFSET):
     # ------------------------------
     # Plot trajectories
     # ------------------------------
-    lc_for_cbar = Func.plot_trajectories(ids, lc_for_cbar, times, xs, ax)
+    if mode == "cached":
+        lc_for_cbar, t_max = Func.plot_trajectories_cached(XML_FILE, ax, X_LIM, Y_LIM, dpi)
+        times = np.array([t_max])
+    else:
+        lc_for_cbar = Func.plot_trajectories(ids, lc_for_cbar, times, xs, ax,
+                                             rasterized=(mode == "raster"))
 
 
     # -----------------------------------------------------
@@ -50,7 +67,8 @@ def plot_for_speed(JAD_SPEED_KMH, Et_OFFSET):
     # -----------------------------------------------------
     # JAD Strategy
     # -----------------------------------------------------
-    Func.plot_jad_strategy(JAD_FILE, ax)
+    if JAD_FILE is not None or row is not None:
+        Func.plot_jad_strategy(JAD_FILE, ax, row=row)
 
 
     # -----------------------------------------------------
@@ -59,22 +77,54 @@ def plot_for_speed(JAD_SPEED_KMH, Et_OFFSET):
     ax.autoscale()
     ax.set_xlabel("Time (s)", fontsize=12)
     ax.set_ylabel("Space (km)", fontsize=12)
-    ax.set_xlim(200, 1600)
-    ax.set_ylim(0, 8)
+    ax.set_xlim(*X_LIM)
+    ax.set_ylim(*Y_LIM)
 
     cbar_ax = fig.add_axes([0.1, 0.88, 0.85, 0.03])
-    cbar = plt.colorbar(lc_for_cbar, cax=cbar_ax, orientation='horizontal')
+    cbar = fig.colorbar(lc_for_cbar, cax=cbar_ax, orientation='horizontal')
     cbar.set_label("Speed (km/h)", labelpad=-7)
     cbar.set_ticks([0, 30, 60, 90])
     cbar.ax.xaxis.set_ticks_position('top')
     cbar.ax.xaxis.set_label_position('top')
 
+    return fig
+
+
+
+# =========================================================
+# Main plotting function
+# =========================================================
+def plot_for_speed(JAD_SPEED_KMH, Et_OFFSET):
+
+    tag = Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)
+    XML_FILE = f"d_1_jad_trajectory_{tag}.xml"
+    JAD_FILE = f"d_1_jad_strategy_{tag}.csv"
+
+    # -----------------------------------------------------
+    # Load trajectory (not needed for a cached trajectory layer)
+    # -----------------------------------------------------
+    if LAYER_MODE == "cached":
+        times = ids = xs = None
+    else:
+        times, ids, xs = Func.load_trajectory(XML_FILE)
+
+    # -----------------------------------------------------
+    # JAD Strategy from the results store (optional)
+    # -----------------------------------------------------
+    row = None
+    if RESULTS_DB:
+        db = results_store.open_store(RESULTS_DB)
+        row = results_store.load_strategy(db, JAD_SPEED_KMH, Et_OFFSET)
+        db.close()
+
+    fig = draw_figure(times, ids, xs, JAD_FILE, row, mode=LAYER_MODE, XML_FILE=XML_FILE)
+
     # -----------------------------------------------------
     # Save figure
     # -----------------------------------------------------
-    plt.savefig(f"jad_trajectory_{int(JAD_SPEED_KMH)}_{int(Et_OFFSET)}.png", dpi=150, bbox_inches="tight")
+    fig.savefig(f"jad_trajectory_{tag}.png", dpi=DPI, bbox_inches="tight")
     plt.show()
-    plt.close()
+    plt.close(fig)
 
 
 # =========================================================
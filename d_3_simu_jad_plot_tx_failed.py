@@ -10,14 +10,18 @@ RAMP                = 1000
 # -------- Canvas settings --------
 FIG_SIZE = (5.5, 9)
 
+# -------- Failed runs: JAD speed too low, wave width underestimated --------
+FAILED_RUNS = [(35, 0), (55, -40)]
+
 
 # ======================================================
 # Single plot function
 # ======================================================
-def plot_for_speed(jad_speed, Et_offset, ax, idx):
+def plot_for_speed(jad_speed, Et_offset, ax, idx, trajectory=None):
 
-    XML_FILE = f"d_1_jad_trajectory_{int(jad_speed)}_{int(Et_offset)}.xml"
-    JAD_FILE = f"d_1_jad_strategy_{int(jad_speed)}_{int(Et_offset)}.csv"
+    tag = Func.run_tag(jad_speed, Et_offset)
+    XML_FILE = f"d_1_jad_trajectory_{tag}.xml"
+    JAD_FILE = f"d_1_jad_strategy_{tag}.csv"
 
     plt.sca(ax)
 
@@ -26,9 +30,11 @@ def plot_for_speed(jad_speed, Et_offset, ax, idx):
     subplot_labels = ["(a)", "(b)"]
 
     # -----------------------------------------------------
-    # Load trajectory
+    # Load trajectory (unless already loaded, see batch_render.py)
     # -----------------------------------------------------
-    times, ids, xs = Func.load_trajectory(XML_FILE)
+    if trajectory is None:
+        trajectory = Func.load_trajectory(XML_FILE)
+    times, ids, xs = trajectory
 
     # ------------------------------
     # Trajectories
@@ -74,32 +80,47 @@ def plot_for_speed(jad_speed, Et_offset, ax, idx):
 # ======================================================
 # Main figure
 # ======================================================
-fig, axes = plt.subplots(2, 1, figsize=FIG_SIZE, sharex=True)
+def draw_figure(runs=FAILED_RUNS, trajectories=None):
+    """
+    One panel per failed run (JAD_SPEED_KMH, Et_OFFSET); trajectories: the
+    loaded trajectories of the runs, in the same order (loaded here if None).
+    Returns the figure (not shown, not saved).
+    """
+    fig, axes = plt.subplots(2, 1, figsize=FIG_SIZE, sharex=True)
 
-lc = plot_for_speed(35, 0, axes[0], 0)
-lc = plot_for_speed(55, -40, axes[1], 1)
-lc_ref = lc
+    for idx, (jad_speed, Et_offset) in enumerate(runs):
+        lc = plot_for_speed(jad_speed, Et_offset, axes[idx], idx,
+                            None if trajectories is None else trajectories[idx])
+    lc_ref = lc
 
-axes[-1].set_xlabel("Time (s)", fontsize=12)
+    axes[-1].set_xlabel("Time (s)", fontsize=12)
 
 
-# ======================================================
-# Top horizontal colorbar
-# ======================================================
-cbar_ax = fig.add_axes([0.1, 0.94, 0.84, 0.02])  # [left, bottom, width, height]
-cbar = plt.colorbar(lc_ref, cax=cbar_ax, orientation='horizontal', ticklocation='top')
-cbar.set_label("Speed (km/h)", labelpad=-7)
-cbar.set_ticks([0, 30, 60, 90])
+    # ======================================================
+    # Top horizontal colorbar
+    # ======================================================
+    cbar_ax = fig.add_axes([0.1, 0.94, 0.84, 0.02])  # [left, bottom, width, height]
+    cbar = fig.colorbar(lc_ref, cax=cbar_ax, orientation='horizontal', ticklocation='top')
+    cbar.set_label("Speed (km/h)", labelpad=-7)
+    cbar.set_ticks([0, 30, 60, 90])
 
-plt.tight_layout(rect=[0, 0, 1, 0.93])
+    fig.tight_layout(rect=[0, 0, 1, 0.93])
+
+    return fig
 
 
 # ======================================================
-# Save PNG
+# Main entry
 # ======================================================
-png_name = "jad_trajectory_failed.png"
-plt.savefig(png_name, format="png", dpi=150, bbox_inches="tight")
-print(f"Figure saved as: {png_name}")
-
-plt.show()
-plt.close()
\ No newline at end of file
+if __name__ == "__main__":
+    fig = draw_figure()
+
+    # ======================================================
+    # Save PNG
+    # ======================================================
+    png_name = "jad_trajectory_failed.png"
+    fig.savefig(png_name, format="png", dpi=150, bbox_inches="tight")
+    print(f"Figure saved as: {png_name}")
+
+    plt.show()
+    plt.close(fig)
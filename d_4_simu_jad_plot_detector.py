@@ -6,17 +6,32 @@ import numpy as np
 from matplotlib.collections import LineCollection
 import matplotlib.colors as mcolors
 import os
+import sys
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes, mark_inset
+import ALL_FUNCTIONS as Func
+import results_store
 
 
 # ======================================================
 # ====================== Configuration =================
 # ======================================================
 
-UPSTREAM_FILE = "d_1_jad_detector_upstream_55_0.csv"
-DOWNSTREAM_FILE = "d_1_jad_detector_downstream_55_0.csv"
-XML_FILE = "d_1_jad_trajectory_55_0.xml"
-JAD_FILE = "d_1_jad_strategy_55_0.csv"
+# ---- Run: JAD_SPEED (km/h) and Et_OFFSET (s) as arguments, as for d_2 (default 55 0) ----
+JAD_SPEED_KMH, Et_OFFSET = 55, 0
+if len(sys.argv) > 2:
+    try:
+        JAD_SPEED_KMH = float(sys.argv[1])
+        Et_OFFSET = float(sys.argv[2])
+    except ValueError:
+        print("--- Invalid arguments. Please provide two arguments: JAD_SPEED (km/h) and Et_OFFSET (s)")
+        print("    Example: python d_4_simu_jad_plot_detector.py 55 0")
+        sys.exit(1)
+
+RUN_TAG = Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)
+UPSTREAM_FILE = f"d_1_jad_detector_upstream_{RUN_TAG}.csv"
+DOWNSTREAM_FILE = f"d_1_jad_detector_downstream_{RUN_TAG}.csv"
+XML_FILE = f"d_1_jad_trajectory_{RUN_TAG}.xml"
+JAD_FILE = f"d_1_jad_strategy_{RUN_TAG}.csv"
 
 FOCUS_X_MIN, FOCUS_X_MAX = 6900, 7100
 FOCUS_T_MIN, FOCUS_T_MAX = 380, 600
@@ -37,6 +52,10 @@ TL_RECT = [0, 0.08, 1, 0.98]
 
 SG_MAX_SPEED = 10 # m/s
 
+# Read detector records / strategy from the results store instead of the CSVs
+RESULTS_DB = None    # e.g. results_store.RESULTS_DB
+DETECTOR_UPSTREAM, DETECTOR_DOWNSTREAM = 500, 7000
+
 # ======================================================
 # ====================== Load Detector Data ============
 # ======================================================
@@ -51,8 +70,16 @@ def load_detector_data(filename):
     return steps, speeds
 
 
-up_steps, up_speeds = load_detector_data(UPSTREAM_FILE)
-down_steps, down_speeds = load_detector_data(DOWNSTREAM_FILE)
+if RESULTS_DB:
+    db = results_store.open_store(RESULTS_DB)
+    up_steps, up_speeds = results_store.load_detector(db, JAD_SPEED_KMH, Et_OFFSET, DETECTOR_UPSTREAM)
+    down_steps, down_speeds = results_store.load_detector(db, JAD_SPEED_KMH, Et_OFFSET, DETECTOR_DOWNSTREAM)
+    strategy_row = results_store.load_strategy(db, JAD_SPEED_KMH, Et_OFFSET)
+    db.close()
+else:
+    up_steps, up_speeds = load_detector_data(UPSTREAM_FILE)
+    down_steps, down_speeds = load_detector_data(DOWNSTREAM_FILE)
+    strategy_row = None
 
 up_speeds = [v * 3.6 for v in up_speeds]
 down_speeds = [v * 3.6 for v in down_speeds]
@@ -192,21 +219,24 @@ ax.text(0.03, 0.05, "(b)",
 def is_valid(v):
     return v != "" and v is not None
 
-if os.path.exists(JAD_FILE):
+if strategy_row is None and os.path.exists(JAD_FILE):
     with open(JAD_FILE, "r") as f:
         reader = csv.DictReader(f)
         rows = list(reader)
 
     if rows:
-        row = rows[-1]
-        for p in ["E", "F"]:
-            if is_valid(row.get(f"{p}_t")) and is_valid(row.get(f"{p}_x")):
-                t = float(row[f"{p}_t"])
-                x = float(row[f"{p}_x"]) / 1000
-                if FOCUS_T_MIN <= t <= FOCUS_T_MAX and FOCUS_X_MIN/1000 <= x <= FOCUS_X_MAX/1000:
-                    ax.scatter(t, x, color=POINT_COLOR, s=POINT_SIZE, zorder=10)
-                    ax.text(t, x, f" {p}", fontsize=POINT_FONT,
-                            va="bottom", ha="left", color=POINT_COLOR)
+        strategy_row = rows[-1]
+
+if strategy_row is not None:
+    row = strategy_row
+    for p in ["E", "F"]:
+        if is_valid(row.get(f"{p}_t")) and is_valid(row.get(f"{p}_x")):
+            t = float(row[f"{p}_t"])
+            x = float(row[f"{p}_x"]) / 1000
+            if FOCUS_T_MIN <= t <= FOCUS_T_MAX and FOCUS_X_MIN/1000 <= x <= FOCUS_X_MAX/1000:
+                ax.scatter(t, x, color=POINT_COLOR, s=POINT_SIZE, zorder=10)
+                ax.text(t, x, f" {p}", fontsize=POINT_FONT,
+                        va="bottom", ha="left", color=POINT_COLOR)
 
 # ======================================================
 # ====================== Colorbar =====================
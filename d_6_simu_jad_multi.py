@@ -0,0 +1,188 @@
+import os
+import sys
+import traci
+import ALL_FUNCTIONS as Func
+import jad_scheduler as Sched
+import scenario_generator
+
+# ----------------------
+# JAD Parameters
+# ----------------------
+WAVE_SPEED = -15 / 3.6       # 16 km/h -> m/s
+JAD_PLAN = {}
+
+# ----------------------
+# Check command-line arguments
+# ----------------------
+if len(sys.argv) > 2:
+    try:
+        # First argument: JAD_SPEED_KMH
+        JAD_SPEED_KMH = float(sys.argv[1])
+
+        # Second argument: Et_OFFSET (used directly, no conversion)
+        Et_OFFSET = float(sys.argv[2])
+
+        print(f"JAD_SPEED: {int(JAD_SPEED_KMH)} km/h, Et_OFFSET: {Et_OFFSET}")
+
+    except ValueError:
+        print("--- Invalid arguments. Please provide two arguments: JAD_SPEED (km/h) and Et_OFFSET (s)")
+        print("    Example: python d_6_simu_jad_multi.py 55 0")
+        sys.exit(1)
+else:
+    print("--- Please provide two arguments: JAD_SPEED (km/h) and Et_OFFSET (s)")
+    print("    Example: python d_6_simu_jad_multi.py 55 0")
+    print("    Optional third argument: SUMO cfg of a generated scenario (default run.sumocfg)")
+    sys.exit(1)
+
+JAD_SPEED = JAD_SPEED_KMH / 3.6  # Convert to m/s
+
+# ----------------------
+# Scenario (optional third argument, see scenario_generator.py)
+# ----------------------
+SUMO_CFG = sys.argv[3] if len(sys.argv) > 3 else "run.sumocfg"
+SCENARIO = scenario_generator.load_scenario(SUMO_CFG)
+
+# ----------------------
+# Ramp insertion trigger parameters
+# ----------------------
+RAMP = SCENARIO["ramp"]   # Ramp insertion trigger location (m), 1000 in run.sumocfg
+THRESHOLD_INSERT = 3.0    # Time headway threshold (s)
+MAX_WAIT = 600            # Drop a wave without insertion opportunity MAX_WAIT s after E
+
+# ----------------------
+# Detector locations (500 / 7000 in run.sumocfg)
+# ----------------------
+DETECTOR_LOC_UPSTREAM = SCENARIO["detector_upstream"]
+DETECTOR_LOC_DOWNSTREAM = SCENARIO["detector_downstream"]
+
+# -------------------------------
+# Stop-and-go detection criteria
+# -------------------------------
+SG_MAX_SPEED = 10.0   # m/s
+SG_MIN_DURATION = 30  # seconds
+
+# -------------------------------
+# Repeated disturbances (one wave each)
+# -------------------------------
+STOP_FIRST = 150      # First natural stop (s)
+STOP_INTERVAL = 500   # Time between natural stops (s)
+
+# ----------------------
+# Configuration and parameters
+# ----------------------
+sumo_binary = os.path.join(os.environ["SUMO_HOME"], "bin", "sumo")
+seed = 1
+sumo_cmd = [sumo_binary, "-c", SUMO_CFG, "--start", "--no-warnings", "--seed", str(seed)]
+
+# Time is read from the SUMO clock, so any <step-length> of the cfg works
+STEP_LENGTH = Func.get_simulation_step_length(SUMO_CFG)
+
+
+def run_simulation():
+    """
+    SUMO main simulation loop with the event-driven scheduler
+    - Repeated natural stops, one stop-and-go wave each
+    - One JAD vehicle per detected wave, several can be active at once
+    - Per step: detectors, ramp scan only while a wave waits, due events only
+    """
+    end_time = Func.get_simulation_end_time(SUMO_CFG)
+    stop_times = set(range(STOP_FIRST, int(end_time), STOP_INTERVAL))
+
+    traci.start(sumo_cmd)
+
+    step = 0
+    last_step = None
+
+    # -------------------------------
+    # Upstream / downstream detector monitoring
+    # -------------------------------
+    last_pos_up = {}
+    last_pos_down = {}
+    sg_state_up = {}
+    sg_state_down = {}
+
+    # -------------------------------
+    # Jam-absorption scheduler
+    # -------------------------------
+    sched = Sched.init_scheduler(
+        JAD_SPEED, WAVE_SPEED, Et_OFFSET, RAMP, DETECTOR_LOC_UPSTREAM, max_wait=MAX_WAIT
+    )
+    last_position_insert = {}
+
+    while step < end_time:
+        traci.simulationStep(float(step + STEP_LENGTH))   # the step at time t ends at t + STEP_LENGTH
+        step = Func.simulation_time(STEP_LENGTH)
+        veh_ids = traci.vehicle.getIDList()
+
+        # ----------------------------------
+        # Repeated natural braking
+        # ----------------------------------
+        Func.handle_repeated_braking(
+            step, veh_ids, stop_times, stop_distance_to_end=SCENARIO["stop_distance_to_end"]
+        )
+
+        # ----------------------------------
+        # Upstream / downstream detection
+        # ----------------------------------
+        last_pos_up, _, _ = Func.detector(
+            step, veh_ids, last_pos=last_pos_up, location=DETECTOR_LOC_UPSTREAM,
+            sg_state=sg_state_up, sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION,
+            prev_step=last_step, step_length=STEP_LENGTH
+        )
+        last_pos_down, _, sg_down = Func.detector(
+            step, veh_ids, last_pos=last_pos_down, location=DETECTOR_LOC_DOWNSTREAM,
+            sg_state=sg_state_down, sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION,
+            prev_step=last_step, step_length=STEP_LENGTH
+        )
+
+        if sg_down is not None:
+            Sched.on_wave_detected(sched, sg_down)
+
+        # ----------------------------------
+        # Ramp scan only while a wave waits for a JAD vehicle
+        # ----------------------------------
+        if Sched.has_pending_waves(sched):
+            last_position_insert, insertion_info = Func.check_insertion_opportunity_at_ramp(
+                RAMP, THRESHOLD_INSERT, step, veh_ids, last_position_insert
+            )
+            if insertion_info:
+                Sched.on_insertion_opportunity(sched, JAD_PLAN, step, insertion_info)
+        else:
+            last_position_insert = {}
+
+        # ----------------------------------
+        # Due phase transitions / expiries, safety of controlled vehicles
+        # ----------------------------------
+        Sched.dispatch(sched, JAD_PLAN, step)
+        Sched.check_safety(sched, JAD_PLAN, step)
+
+        last_step = step
+        step += STEP_LENGTH
+
+    traci.close()
+
+    # ----------------------------------
+    # Save results
+    # ----------------------------------
+    Sched.save_plans(sched, f"d_6_jad_multi_strategy_{Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)}.csv")
+
+    print(f"Simulation finished: {sched['n_waves']} waves, {sched['n_inserted']} JAD vehicles\n")
+
+    # ----------------------------------
+    # Rename trajectory file
+    # ----------------------------------
+    old_name = os.path.join(os.path.dirname(SUMO_CFG), "trajectory.xml")
+    new_name = f"d_6_jad_multi_trajectory_{Func.run_tag(JAD_SPEED_KMH, Et_OFFSET)}.xml"
+
+    if os.path.exists(old_name):
+        os.rename(old_name, new_name)
+        print(f"File saved as: {new_name}\n")
+    else:
+        print("trajectory.xml file not found")
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    run_simulation()
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import os
+import socket
+import time
+import numpy as np
+import ALL_FUNCTIONS as Func
+import scenario_generator
+
+
+# ======================================================
+# Stream recorded detector records to jad_service.py
+# ======================================================
+#
+# The detector CSVs of d_1 (and, for the ramp, loop crossings computed from
+# a trajectory file) are merged by time and sent as a live feed, `speedup`
+# times faster than real time (0: as fast as possible), to a growing file
+# or to the service socket. Every line gets the "sent" wall clock, so the
+# service can measure end-to-end latency, and ramp crossings their lane
+# (the service takes ramp headways per lane).
+#
+#   python jad_service.py 55 0 --port 8765 --once &
+#   python detector_stream_replay.py d_1_jad_detector_upstream_55_0.csv \
+#       d_1_jad_detector_downstream_55_0.csv --ramp-from b_1_base_trajectory.xml \
+#       --port 8765 --speedup 50
+
+HEADER = "veh_id,step,speed,location,sent,lane\n"
+
+
+
+# ======================================================
+# Records
+# ======================================================
+def load_detector_records(csv_files):
+    """
+    (veh_id, t, speed, location, lane) of every row, in file order
+    (lane "" when the file has none).
+    """
+    records = []
+    for csv_file in csv_files:
+        with open(csv_file, newline="") as f:
+            for row in csv.DictReader(f):
+                records.append((row["veh_id"], float(row["step"]), float(row["speed"]), float(row["location"]),
+                                row.get("lane") or ""))
+    return records
+
+
+def loop_crossings(XML_FILE, location):
+    """
+    Records a loop at x = location would produce: crossing time and speed
+    interpolated between the two FCD records around the crossing, lane of
+    the record after it.
+    """
+    times, ids, cols = Func.load_fcd_columns(XML_FILE, attrs=("x", "speed", "lane"))
+    order = np.lexsort((times, ids))
+    t, vid, x, v = times[order], ids[order], cols["x"][order], cols["speed"][order]
+    lane = cols["lane"][order]
+
+    i0 = np.nonzero((vid[1:] == vid[:-1]) & (x[:-1] < location) & (location <= x[1:]))[0]
+    i1 = i0 + 1
+    frac = (location - x[i0]) / (x[i1] - x[i0])
+    t_cross = t[i0] + frac * (t[i1] - t[i0])
+    v_cross = v[i0] + frac * (v[i1] - v[i0])
+
+    return [(str(vid[i]), round(float(tc), 3), round(float(vc), 3), float(location), str(lane[i]))
+            for i, tc, vc in zip(i1, t_cross, v_cross)]
+
+
+
+# ======================================================
+# Streaming
+# ======================================================
+def open_sink(path=None, host="127.0.0.1", port=None, retries=50):
+    """
+    Writable text stream: appended file, or a connection to the service
+    (retried while the service starts).
+    """
+    if path is not None:
+        new = not os.path.exists(path)
+        f = open(path, "a")
+        if new:
+            f.write(HEADER)
+        return f
+
+    for _ in range(retries):
+        try:
+            conn = socket.create_connection((host, port))
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+    else:
+        raise ConnectionRefusedError(f"No service on {host}:{port}")
+
+    f = conn.makefile("w")
+    conn.close()          # the file object keeps the socket open
+    f.write(HEADER)
+    return f
+
+
+def stream_records(records, sink, speedup=0.0):
+    """
+    Send the records in time order; records of the same time go out
+    together, at (t - t_first) / speedup after the start.
+    Returns (records sent, wall time).
+    """
+    records = sorted(records, key=lambda r: r[1])
+    if not records:
+        return 0, 0.0
+
+    t_first = records[0][1]
+    start = time.perf_counter()
+    i = 0
+    while i < len(records):
+        t = records[i][1]
+        j = i
+        while j < len(records) and records[j][1] == t:
+            j += 1
+
+        if speedup > 0:
+            delay = start + (t - t_first) / speedup - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        sent = time.time()
+        sink.write("".join(f"{vid},{t:.10g},{v},{loc},{sent:.6f},{lane}\n"
+                           for vid, t, v, loc, lane in records[i:j]))
+        sink.flush()
+        i = j
+
+    return len(records), time.perf_counter() - start
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream recorded detector CSVs as a live feed")
+    parser.add_argument("csv", nargs="+", help="detector CSVs written by Func.save_result")
+    parser.add_argument("--ramp-from", metavar="XML", help="add ramp loop crossings from a trajectory file")
+    parser.add_argument("--cfg", default="run.sumocfg", help="scenario (ramp location)")
+    parser.add_argument("--speedup", type=float, default=10.0, help="x real time, 0 = as fast as possible")
+    parser.add_argument("--repeat", type=int, default=1, help="send the records this many times (load test)")
+    sink = parser.add_mutually_exclusive_group(required=True)
+    sink.add_argument("--to", metavar="CSV", help="append to a file followed by jad_service --tail")
+    sink.add_argument("--port", type=int, help="send to jad_service --port")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    records = load_detector_records(args.csv)
+    if args.ramp_from:
+        ramp = scenario_generator.load_scenario(args.cfg)["ramp"]
+        records += loop_crossings(args.ramp_from, ramp)
+
+    # Repeats are shifted in time, so the feed stays ordered
+    if args.repeat > 1:
+        span = max(r[1] for r in records) + 1
+        records = [(vid, t + k * span, v, loc, lane)
+                   for k in range(args.repeat) for vid, t, v, loc, lane in records]
+
+    out = open_sink(args.to, args.host, args.port)
+    n, elapsed = stream_records(records, out, args.speedup)
+    out.close()
+    print(f"{n} records sent in {elapsed:.2f} s ({n / max(elapsed, 1e-9):.0f} records/s)")
@@ -0,0 +1,89 @@
+import argparse
+import numpy as np
+import ALL_FUNCTIONS as Func
+import jad_replay
+import scenario_generator
+
+
+# ======================================================
+# Merge ramp headway sketches and choose THRESHOLD_INSERT
+# ======================================================
+#
+# Inputs are headway sketches saved by d_1 (FLAG_HEADWAY_MONITOR,
+# d_1_jad_headway_sketch_*.json) or trajectory files, whose ramp headways
+# are sketched here (jad_replay.ramp_crossings, same measurement). All
+# inputs are merged into one monitor, so seeds and workers combine
+# without per-vehicle data.
+#
+#   python headway_sketch.py b_1_base_trajectory.xml d_1_jad_headway_sketch_55_0.json \
+#       --within 30 --prob 0.9 --out merged.json
+
+QUANTILES = [0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+WITHIN = [10, 30, 60]          # s
+PROBS = [0.5, 0.8, 0.9, 0.95]
+
+
+def sketch_trajectory(XML_FILE, ramp, window=Func.HEADWAY_WINDOW):
+    """
+    Headway monitor of the ramp crossings recorded in a trajectory file.
+    """
+    traj = jad_replay.load_replay_data(XML_FILE)
+    crossings = jad_replay.ramp_crossings(traj, ramp)
+
+    mon = Func.init_headway_monitor(window)
+    ok = ~np.isnan(crossings["headway"])
+    for t, h in zip(crossings["t"][ok], crossings["headway"][ok]):
+        Func.update_headway_monitor(mon, float(t), [float(h)])
+    mon["t_first"] = float(traj["t"].min())
+    mon["t_last"] = float(traj["t"].max())
+    return mon
+
+
+def load_monitor(path, ramp):
+    if path.endswith(".json"):
+        return Func.load_headway_monitor(path)
+    return sketch_trajectory(path, ramp)
+
+
+def fmt(value, width=0):
+    """
+    Seconds with 2 decimals, "n/a" for None (no headways, or no observed duration).
+    """
+    return f"{value:>{width}.2f}" if value is not None else f"{'n/a':>{width}}"
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge ramp headway sketches and suggest insertion thresholds")
+    parser.add_argument("inputs", nargs="+", help="sketch .json files and/or trajectory .xml files")
+    parser.add_argument("--cfg", default="run.sumocfg", help="scenario (ramp location) of trajectory inputs")
+    parser.add_argument("--within", type=float, default=None, help="s, single query instead of the table")
+    parser.add_argument("--prob", type=float, default=0.9)
+    parser.add_argument("--out", help="save the merged sketch (.json)")
+    args = parser.parse_args()
+
+    ramp = scenario_generator.load_scenario(args.cfg)["ramp"]
+    mon = Func.merge_headway_monitors(*(load_monitor(p, ramp) for p in args.inputs))
+    digest = mon["overall"]
+    duration = mon["duration"]
+
+    print(f"{digest['n']} headways over {duration:.0f} s ({len(digest['centroids'])} centroids)")
+    print("".join(f"{'q' + format(q, 'g'):>8}" for q in QUANTILES))
+    print("".join(fmt(Func.digest_quantile(digest, q), 8) for q in QUANTILES))
+
+    if args.within is not None:
+        h = Func.monitor_threshold(mon, args.within, args.prob)
+        print(f"\nThreshold for an opportunity within {args.within:g} s with p={args.prob}: {fmt(h)} s")
+    else:
+        print("\nThreshold (s) for an opportunity within T with probability p:")
+        print(f"{'T (s)':>8}" + "".join(f"{'p=' + format(p, 'g'):>10}" for p in PROBS))
+        for within in WITHIN:
+            row = [Func.monitor_threshold(mon, within, p) for p in PROBS]
+            print(f"{within:>8}" + "".join(fmt(h, 10) for h in row))
+
+    if args.out:
+        Func.save_headway_monitor(mon, args.out)
+        print(f"\nFile saved as: {args.out}")
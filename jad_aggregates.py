@@ -0,0 +1,126 @@
+# ======================================================
+# Loop-detector interval aggregates in ring buffers
+# ======================================================
+#
+# Crossings of one detector are summed per BIN_LENGTH bin into a ring of
+# max(windows) bins, and a running total is kept for every window: a new
+# record adds to its bin and to the totals, a new bin subtracts the bin
+# that leaves each window. Reading a rolling aggregate is O(1), updating is
+# O(number of windows), and memory does not grow with the run length.
+#
+# count / flow        vehicles, veh/h
+# occupancy           proxy: sum of EFFECTIVE_LENGTH / v over the window length
+# v_time_mean         arithmetic mean of the crossing speeds
+# v_harmonic_mean     space-mean speed estimate (count / sum of 1 / v)
+
+AGG_WINDOWS = (10, 30, 60)    # s
+BIN_LENGTH = 1.0              # s
+EFFECTIVE_LENGTH = 5.0        # m, vehicle length + loop length
+MIN_SPEED = 0.1               # m/s, speeds below count as this (stopped on the loop)
+
+_SUMS = ("n", "v", "inv_v", "occ")
+
+
+def init_detector_aggregates(location, windows=AGG_WINDOWS, bin_length=BIN_LENGTH):
+    w_bins = [max(int(round(w / bin_length)), 1) for w in windows]
+    n_bins = max(w_bins)
+    return {
+        "location": location,
+        "bin_length": bin_length,
+        "windows": list(windows),
+        "w_bins": w_bins,
+        "n_bins": n_bins,
+        "ring": {k: [0.0] * n_bins for k in _SUMS},
+        "totals": [dict.fromkeys(_SUMS, 0.0) for _ in windows],
+        "current": None   # index of the newest bin
+    }
+
+
+def update_detector_aggregates(agg, step, events):
+    """
+    Advance the aggregates to `step` and add the crossing events
+    (dicts with "step" and "speed", as returned by Func.detector).
+
+    Returns the fixed intervals closed meanwhile (one row per window whose
+    end, a multiple of the window, was passed), see interval_row.
+    """
+    closed = []
+    for e in events:
+        closed += _advance(agg, int(e["step"] // agg["bin_length"]))
+        _add(agg, e["speed"])
+    closed += _advance(agg, int(step // agg["bin_length"]))
+    return closed
+
+
+def rolling_aggregates(agg, window):
+    """
+    Aggregates of the last `window` seconds (one of the configured windows),
+    up to the newest bin.
+    """
+    i = agg["windows"].index(window)
+    return _finish(agg["totals"][i], window)
+
+
+def interval_row(agg, i, end_bin):
+    window = agg["windows"][i]
+    t_end = end_bin * agg["bin_length"]
+    row = {"location": agg["location"], "window": window, "t_start": t_end - window, "t_end": t_end}
+    row.update(_finish(agg["totals"][i], window))
+    return row
+
+
+def _add(agg, speed):
+    v = max(speed, MIN_SPEED)
+    values = (1.0, speed, 1.0 / v, EFFECTIVE_LENGTH / v)
+    slot = agg["current"] % agg["n_bins"]
+    for k, x in zip(_SUMS, values):
+        agg["ring"][k][slot] += x
+    for totals in agg["totals"]:
+        for k, x in zip(_SUMS, values):
+            totals[k] += x
+
+
+def _advance(agg, b):
+    """
+    Move the newest bin to b (no-op if b is not newer).
+    """
+    closed = []
+    current = agg["current"]
+    if current is None:
+        agg["current"] = b
+        return closed
+    if b <= current:
+        return closed
+
+    ring, n_bins = agg["ring"], agg["n_bins"]
+
+    # One pass per bin, so empty intervals after a gap are reported too
+    for k in range(current + 1, b + 1):
+        closed += _close(agg, k)
+        for i, w in enumerate(agg["w_bins"]):
+            # Bin k - w leaves window i (slot k - w still holds it, w <= n_bins)
+            old = (k - w) % n_bins
+            for s in _SUMS:
+                agg["totals"][i][s] -= ring[s][old]
+        slot = k % n_bins
+        for s in _SUMS:
+            ring[s][slot] = 0.0
+
+    agg["current"] = b
+    return closed
+
+
+def _close(agg, k):
+    # Entering bin k ends the fixed interval [k - w, k) of every window w dividing k
+    return [interval_row(agg, i, k) for i, w in enumerate(agg["w_bins"]) if k % w == 0]
+
+
+def _finish(totals, window):
+    n = totals["n"]
+    return {
+        "count": int(round(n)),
+        "flow": n * 3600 / window,
+        "occupancy": min(max(totals["occ"] / window, 0.0), 1.0),
+        "v_time_mean": totals["v"] / n if n > 0.5 else None,
+        "v_harmonic_mean": n / totals["inv_v"] if n > 0.5 else None
+    }
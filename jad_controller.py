@@ -0,0 +1,429 @@
+import time
+from collections import deque
+import ALL_FUNCTIONS as Func
+
+
+# ======================================================
+# Per-step JAD controller
+# ======================================================
+#
+# The Python side of one simulation step of d_1_simu_jad.py, shared by
+# every driver (d_1_simu_jad.py, async_orchestrator.py):
+#
+#   ctrl = init_controller(jad_speed, Et_offset, scenario, step_length, ...)
+#   step = 0
+#   while step < end_time:
+#       traci.simulationStep(float(step + step_length))
+#       step = Func.simulation_time(step_length)
+#       controller_step(ctrl, step, traci.vehicle.getIDList())
+#       step += ctrl["tick"]
+#
+# Time is read from the SUMO clock, and each part of the step runs at its
+# own period (control / detectors / ramp scan, rounded to whole simulation
+# steps), so any <step-length> of the cfg works.
+
+CONTROLLER_DEFAULTS = {
+    "wave_speed": -15 / 3.6,      # m/s
+    "threshold_insert": 3.0,      # Time headway threshold at the ramp (s)
+    "sg_max_speed": 10.0,         # Stop-and-go detection criteria (m/s, s)
+    "sg_min_duration": 30,
+    "control_period": 1.0,        # Braking disturbance, three-phase control, re-planning (s)
+    "detector_period": 1.0,       # Section detectors (s)
+    "ramp_period": 1.0,           # Ramp insertion scan (s)
+    "jad_plan": True,
+    "jad_implement": True,
+    "detector_aggregates": False,
+    "agg_windows": None,          # None: Func.AGG_WINDOWS
+    "headway_monitor": False,
+    "headway_threshold": False,
+    "headway_within": 30.0,
+    "headway_prob": 0.9,
+    "closed_loop": False,
+    "replan_budget": 1e-3,        # Per-step compute budget of estimation + re-planning (s)
+    "early_exit": False,
+    "exit_horizon": 120,          # s
+    "travel_times": False,        # Record entry / exit time of every vehicle (results store)
+    "optimal_A": False,
+    "A_slack_weight": 1.0,
+    "A_slack_cap": 20.0,
+    "A_dis_weight": 0.01,
+    "A_score_tol": 5.0,
+    "A_history": 10,
+    "A_horizon": 300.0
+}
+
+
+def on_step_grid(period, step_length):
+    """
+    Period (s) rounded to a whole number of simulation steps (at least one).
+    """
+    return max(round(period / step_length), 1) * step_length
+
+
+def is_due(step, last_run, period):
+    return last_run is None or step - last_run >= period - 1e-6
+
+
+def init_controller(jad_speed, Et_offset, scenario, step_length=1, **options):
+    """
+    Controller state of one run.
+    - jad_speed:   m/s
+    - scenario:    scenario_generator.load_scenario output (ramp, detectors, stop distance)
+    - options:     any key of CONTROLLER_DEFAULTS
+    """
+    unknown = set(options) - set(CONTROLLER_DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown controller options: {', '.join(sorted(unknown))}")
+
+    cfg = dict(CONTROLLER_DEFAULTS, **options)
+    if cfg["agg_windows"] is None:
+        cfg["agg_windows"] = Func.AGG_WINDOWS
+
+    control_period = on_step_grid(cfg["control_period"], step_length)
+    detector_period = on_step_grid(cfg["detector_period"], step_length)
+    ramp_period = on_step_grid(cfg["ramp_period"], step_length)
+
+    return {
+        "cfg": cfg,
+        "jad_speed": jad_speed,
+        "Et_offset": Et_offset,
+        "ramp": scenario["ramp"],
+        "detector_up": scenario["detector_upstream"],
+        "detector_down": scenario["detector_downstream"],
+        "stop_distance_to_end": scenario["stop_distance_to_end"],
+        "step_length": step_length,
+        "control_period": control_period,
+        "detector_period": detector_period,
+        "ramp_period": ramp_period,
+        "tick": min(control_period, detector_period, ramp_period),
+        "last_control": None, "last_detector": None, "last_ramp": None,
+        "n_steps": 0,
+
+        # First vehicle braking disturbance
+        "target_vehicle": None,
+        "stopped": False,
+
+        # Upstream / downstream detector monitoring
+        "last_pos_up": {}, "last_pos_down": {},
+        "sg_state_up": {}, "sg_state_down": {},
+        "records_up": [], "records_down": [],
+        "agg_up": Func.init_detector_aggregates(scenario["detector_upstream"], cfg["agg_windows"]),
+        "agg_down": Func.init_detector_aggregates(scenario["detector_downstream"], cfg["agg_windows"]),
+        "agg_rows_up": [], "agg_rows_down": [],
+
+        # Jam-absorption strategy
+        "flag_jad_plan": cfg["jad_plan"],
+        "jad_plan": {},
+        "last_position_insert": {},
+        "threshold_insert": cfg["threshold_insert"],
+        "headway_monitor": Func.init_headway_monitor(),
+        "last_position_headway": {},
+        "inserted_count": 0,
+        "jad_vehicle": None,
+        "opportunities": deque(maxlen=cfg["A_history"]),
+        "skipped_A": False,
+        "A": None, "B": None, "C": None, "D": None, "E": None, "F": None,
+        "P1": None, "P2": None, "P3": None,
+        "vt": None, "vw": None,
+        "Duration_AB": None, "Duration_BC": None,
+
+        # Closed-loop re-planning
+        "wave_est": Func.init_wave_estimate(cfg["wave_speed"], Et_offset),
+        "replan_max": 0.0,
+        "replan_over": 0,
+        "replan_skipped": 0,
+
+        # Travel times (Func.record_travel_times)
+        "travel_times": {},
+
+        # Early exit
+        "n_waves": 0,
+        "quiet_since": None,
+        "low_since": None,
+        "outcome": None
+    }
+
+
+def jad_strategy(ctrl):
+    """
+    Points of the JAD strategy to save (A-F, P1-P3, vt, vw); with closed-loop
+    re-planning, B-F are the last re-planned ones.
+    """
+    strategy = {k: ctrl[k] for k in ("A", "B", "C", "D", "E", "F", "P1", "P2", "P3", "vt", "vw")}
+    if ctrl["cfg"]["closed_loop"]:
+        for k in ("B", "C", "D", "E", "F"):
+            strategy[k] = ctrl["wave_est"][k] or strategy[k]
+    return strategy
+
+
+
+# ======================================================
+# One step
+# ======================================================
+def controller_step(ctrl, step, veh_ids):
+    """
+    Run whatever is due at time `step` (s, read from the SUMO clock):
+    - travel times (optional)
+    - first vehicle braking disturbance
+    - upstream / downstream detectors (stop-and-go -> E, F)
+    - ramp insertion opportunity, JAD plan and insertion
+    - closed-loop re-planning, three-phase control of inserted vehicles
+    - early exit verdict
+
+    Returns the early exit outcome ("success" | "failure", reason), or None.
+    """
+    cfg = ctrl["cfg"]
+    jad_plan = ctrl["jad_plan"]
+    jad_speed = ctrl["jad_speed"]
+    wave_speed = cfg["wave_speed"]
+    ramp = ctrl["ramp"]
+    detector_up = ctrl["detector_up"]
+    detector_down = ctrl["detector_down"]
+    sg_max_speed = cfg["sg_max_speed"]
+    sg_min_duration = cfg["sg_min_duration"]
+
+    ctrl["n_steps"] += 1
+
+    run_control = is_due(step, ctrl["last_control"], ctrl["control_period"])
+    run_detector = is_due(step, ctrl["last_detector"], ctrl["detector_period"])
+    run_ramp = is_due(step, ctrl["last_ramp"], ctrl["ramp_period"])
+    events_up, sg_up, sg_down = [], None, None
+
+    if cfg["travel_times"]:
+        Func.record_travel_times(ctrl["travel_times"], step, veh_ids)
+
+    # ----------------------------------
+    # First vehicle natural braking
+    # ----------------------------------
+    if run_control:
+        ctrl["target_vehicle"], ctrl["stopped"] = Func.handle_first_vehicle_braking(
+            step, veh_ids, ctrl["target_vehicle"], ctrl["stopped"], ctrl["stop_distance_to_end"]
+        )
+
+    if run_detector:
+        # ----------------------------------
+        # Upstream detection
+        # ----------------------------------
+        ctrl["last_pos_up"], events_up, sg_up = Func.detector(
+            step, veh_ids, last_pos=ctrl["last_pos_up"], location=detector_up,
+            sg_state=ctrl["sg_state_up"], sg_max_speed=sg_max_speed, sg_min_duration=sg_min_duration,
+            prev_step=ctrl["last_detector"], step_length=ctrl["step_length"]
+        )
+        if events_up:
+            ctrl["records_up"].extend(events_up)
+
+        # ----------------------------------
+        # Downstream detection
+        # ----------------------------------
+        ctrl["last_pos_down"], events_down, sg_down = Func.detector(
+            step, veh_ids, last_pos=ctrl["last_pos_down"], location=detector_down,
+            sg_state=ctrl["sg_state_down"], sg_max_speed=sg_max_speed, sg_min_duration=sg_min_duration,
+            prev_step=ctrl["last_detector"], step_length=ctrl["step_length"]
+        )
+        if events_down:
+            ctrl["records_down"].extend(events_down)
+
+        if cfg["detector_aggregates"]:
+            ctrl["agg_rows_up"] += Func.update_detector_aggregates(ctrl["agg_up"], step, events_up)
+            ctrl["agg_rows_down"] += Func.update_detector_aggregates(ctrl["agg_down"], step, events_down)
+
+        ctrl["last_detector"] = step
+
+    # ----------------------------------
+    # Print information if stop-and-go is detected
+    # ----------------------------------
+    if sg_down is not None:
+        ctrl["n_waves"] += 1
+        ctrl["F"] = (sg_down["t_start"], detector_down)
+        ctrl["E"] = (sg_down["t_end"] + ctrl["Et_offset"], detector_down)  # Add buffer time for point A
+        ctrl["vw"] = sg_down["v_min"]
+
+        print(
+            f"\n[SG detected at {sg_down['location']} m] "
+            f"start={sg_down['t_start']} s, "
+            f"end={sg_down['t_end']} s, "
+            f"duration={sg_down['duration']} s, "
+            f"v_start={sg_down['v_start']:.2f} m/s, "
+            f"v_end={sg_down['v_end']:.2f} m/s, "
+            f"v_min={sg_down['v_min']:.2f} m/s, "
+            f"v_mean={sg_down['v_mean']:.2f} m/s"
+        )
+
+        if cfg["headway_monitor"]:
+            monitor = ctrl["headway_monitor"]
+            h = Func.monitor_threshold(monitor, cfg["headway_within"], cfg["headway_prob"])
+            median = Func.digest_quantile(monitor['overall'], 0.5)
+            # None before any headway was observed
+            print(
+                f"[Headway sketch] {monitor['overall']['n']} headways, "
+                f"median={f'{median:.2f} s' if median is not None else 'n/a'}, "
+                f"opportunity within {cfg['headway_within']:.0f} s with p={cfg['headway_prob']}: "
+                f"threshold {f'{h:.2f} s' if h is not None else 'n/a'} "
+                f"(THRESHOLD_INSERT={cfg['threshold_insert']})"
+            )
+            if cfg["headway_threshold"] and h is not None:
+                ctrl["threshold_insert"] = h
+
+        if cfg["detector_aggregates"]:
+            w = max(cfg["agg_windows"])
+            agg = Func.rolling_aggregates(ctrl["agg_down"], w)
+            v_harmonic = agg['v_harmonic_mean']
+            # None while no vehicle crossed the detector in the window
+            print(
+                f"[Detector aggregates, last {w} s] "
+                f"flow={agg['flow']:.0f} veh/h, occupancy={agg['occupancy']:.2f}, "
+                f"v_harmonic={f'{v_harmonic:.2f} m/s' if v_harmonic is not None else 'n/a'}"
+            )
+
+    E, F = ctrl["E"], ctrl["F"]
+
+    # ----------------------------------
+    # Check ramp insertion opportunity
+    # ----------------------------------
+    if cfg["headway_monitor"] and run_ramp:
+        ctrl["last_position_headway"], headways = Func.ramp_headways(ramp, veh_ids, ctrl["last_position_headway"])
+        Func.update_headway_monitor(ctrl["headway_monitor"], step, headways)
+
+    # (with optimal_A from the start: the opportunities seen before
+    # the wave is detected feed the forecast of the next ones)
+    insertion_info = None
+    if (E is not None and F is not None or cfg["optimal_A"] and ctrl["flag_jad_plan"]) and run_ramp:
+        ctrl["last_position_insert"], insertion_info = Func.check_insertion_opportunity_at_ramp(
+            ramp, ctrl["threshold_insert"], step, veh_ids, ctrl["last_position_insert"]
+        )
+    if run_ramp:
+        ctrl["last_ramp"] = step
+
+    # ----------------------------------
+    # Optimal insertion point: score this opportunity against the ones
+    # forecast from the recent opportunities (see Func.decide_insertion);
+    # skip it only for a forecast one that scores clearly better
+    # ----------------------------------
+    if cfg["optimal_A"] and insertion_info and ctrl["flag_jad_plan"]:
+        vt_now = insertion_info["leader_v"]
+
+        if E and F:
+            decision, _, best = Func.decide_insertion(
+                step, vt_now, list(ctrl["opportunities"]), E, F, ctrl["vw"], jad_speed, wave_speed,
+                detector_up, ramp, horizon=cfg["A_horizon"], score_tol=cfg["A_score_tol"],
+                slack_weight=cfg["A_slack_weight"], slack_cap=cfg["A_slack_cap"], dis_weight=cfg["A_dis_weight"]
+            )
+            if decision == "wait":
+                print(f"[Insertion point] t={step:g} s, vt={vt_now:.2f} m/s skipped, "
+                      f"expecting a better one around t={best[0]:.0f} s")
+                ctrl["skipped_A"] = True
+                insertion_info = None
+            elif decision == "infeasible" and ctrl["skipped_A"]:
+                # Taken as before only if no opportunity was skipped
+                print(f"[Insertion point] t={step:g} s outside the feasible region, skipped")
+                insertion_info = None
+
+        ctrl["opportunities"].append((step, vt_now))
+        if not (E and F):
+            insertion_info = None
+
+    # ----------------------------------
+    # Execute JAD strategy (once: compute A/B/C + insertion)
+    # ----------------------------------
+    if insertion_info and E and F and ctrl["flag_jad_plan"]:
+        A = (step, ramp)
+        vt = insertion_info["leader_v"]
+        vw = ctrl["vw"]
+
+        # JAD Plan
+        B, C, D = Func.plan_jad(jad_speed, wave_speed, A, E, F, vt, vw)
+        ctrl["Duration_AB"] = Func.phase_duration(B[0] - A[0], ctrl["control_period"])
+        ctrl["Duration_BC"] = Func.phase_duration(C[0] - B[0], ctrl["control_period"])
+
+        print(
+            f"[JAD Input] "
+            f"A ({int(A[0])},{int(A[1])}), "
+            f"E ({int(E[0])},{int(E[1])}), "
+            f"F ({int(F[0])},{int(F[1])}), "
+            f"vt={vt:.2f} m/s, vw={vw:.2f} m/s, w={wave_speed:.2f} m/s"
+        )
+
+        print(
+            f"[JAD Strategy] "
+            f"A ({int(A[0])},{int(A[1])}), "
+            f"B ({int(B[0])},{int(B[1])}), "
+            f"C ({int(C[0])},{int(C[1])})"
+        )
+
+        P1, P2, P3 = Func.get_feasible_region_of_A(
+            E, F, vt, vw, jad_speed, wave_speed, detector_up
+        )
+
+        print(
+            f"[Feasible Region of A] "
+            f"P1 ({int(P1[0])},{int(P1[1])}), "
+            f"P2 ({int(P2[0])},{int(P2[1])}), "
+            f"P3 ({int(P3[0])},{int(P3[1])})"
+        )
+
+        ctrl.update({"A": A, "B": B, "C": C, "D": D, "P1": P1, "P2": P2, "P3": P3, "vt": vt})
+
+        if cfg["jad_implement"]:
+            ctrl["jad_vehicle"] = f"inserted_{ctrl['inserted_count']}"
+            ctrl["inserted_count"] = Func.insert_vehicle_at_ramp(
+                jad_plan, step, insertion_info, ctrl["inserted_count"]
+            )
+
+        ctrl["flag_jad_plan"] = False
+
+    # ----------------------------------
+    # Closed loop: re-estimate the wave and re-plan every control update
+    # (positions are read before the timed section; once the budget is
+    # spent, the remaining vehicles keep their previous plan)
+    # ----------------------------------
+    if cfg["closed_loop"] and run_control:
+        positions = Func.controlled_positions(jad_plan, veh_ids)
+        t0 = time.perf_counter()
+
+        Func.update_wave_estimate(
+            ctrl["wave_est"], step, events_up, ctrl["sg_state_up"], ctrl["sg_state_down"], sg_down,
+            detector_up, detector_down, sg_max_speed
+        )
+        if jad_plan:
+            ctrl["replan_skipped"] += Func.replan_inserted_vehicles(
+                jad_plan, jad_speed, step, positions, ctrl["wave_est"], deadline=t0 + cfg["replan_budget"]
+            )
+
+        elapsed = time.perf_counter() - t0
+        ctrl["replan_max"] = max(ctrl["replan_max"], elapsed)
+        if elapsed > cfg["replan_budget"]:
+            ctrl["replan_over"] += 1
+
+    # ----------------------------------
+    # Control inserted vehicles at each control update
+    # ----------------------------------
+    if cfg["jad_implement"] and run_control:
+        Func.control_inserted_vehicles(jad_plan, jad_speed, step, ctrl["Duration_AB"], ctrl["Duration_BC"])
+
+    # ----------------------------------
+    # Early exit once the outcome is decided
+    # ----------------------------------
+    if cfg["early_exit"]:
+        jad_vehicle = ctrl["jad_vehicle"]
+        if sg_up is not None:
+            ctrl["outcome"] = ("failure", f"stop-and-go at the upstream detector ({sg_up['t_start']}-{sg_up['t_end']} s)")
+        elif sg_down is not None and ctrl["n_waves"] > 1:
+            ctrl["outcome"] = ("failure", f"secondary wave at the downstream detector ({sg_down['t_start']}-{sg_down['t_end']} s)")
+        elif jad_vehicle is not None and jad_vehicle not in jad_plan and run_control:
+            v_min = Func.min_speed_behind(jad_vehicle, veh_ids, detector_up)
+            if v_min is not None and v_min < sg_max_speed:
+                ctrl["quiet_since"] = None
+                ctrl["low_since"] = step if ctrl["low_since"] is None else ctrl["low_since"]
+            else:
+                ctrl["low_since"] = None
+                ctrl["quiet_since"] = step if ctrl["quiet_since"] is None else ctrl["quiet_since"]
+
+            if ctrl["low_since"] is not None and step - ctrl["low_since"] >= sg_min_duration:
+                ctrl["outcome"] = ("failure", f"speeds below {sg_max_speed} m/s behind {jad_vehicle} since {ctrl['low_since']} s")
+            elif ctrl["quiet_since"] is not None and step - ctrl["quiet_since"] >= cfg["exit_horizon"]:
+                ctrl["outcome"] = ("success", f"no speed below {sg_max_speed} m/s behind {jad_vehicle} since {ctrl['quiet_since']} s")
+
+    if run_control:
+        ctrl["last_control"] = step
+
+    return ctrl["outcome"]
@@ -0,0 +1,349 @@
+import xml.etree.ElementTree as ET
+import csv
+import os
+
+
+
+# ======================================================
+# Get simulation end time
+# ======================================================
+def get_simulation_end_time(cfg_path):
+    """
+    Read the simulation end time from a SUMO cfg file.
+    If not specified, use the default value 3600.
+    """
+    tree = ET.parse(cfg_path)
+    root = tree.getroot()
+
+    end_time = 3600  # default value
+
+    time_elem = root.find('time')
+    if time_elem is not None:
+        end_elem = time_elem.find('end')
+        if end_elem is not None:
+            end_time = float(end_elem.get('value'))
+
+    return end_time
+
+
+
+def get_simulation_step_length(cfg_path):
+    """
+    Read the step length (s) from a SUMO cfg file.
+    If not specified, use the SUMO default 1.0.
+    """
+    tree = ET.parse(cfg_path)
+    root = tree.getroot()
+
+    step_length = 1.0  # default value
+
+    time_elem = root.find('time')
+    if time_elem is not None:
+        step_elem = time_elem.find('step-length')
+        if step_elem is not None:
+            step_length = float(step_elem.get('value'))
+
+    return step_length
+
+
+
+# ======================================================
+# Save results to CSV files
+# ======================================================
+def run_tag(jad_speed_kmh, Et_offset):
+    """
+    Suffix of the output files of a run, e.g. "55_0": JAD speed rounded to
+    whole km/h (so that 61 / 3.6 * 3.6 stays 61), Et_offset in whole s.
+    """
+    return f"{round(jad_speed_kmh)}_{int(Et_offset)}"
+
+
+def save_result(jad_speed, wave_speed, Et_offset, records_up, records_down,
+                A, B, C, D, E, F,
+                P1, P2, P3,
+                v_t, v_w):
+
+    def point_or_empty(P):
+        if P is None:
+            return "", ""
+        return P[0], P[1]
+
+    # Upstream
+    tag = run_tag(jad_speed * 3.6, Et_offset)
+
+    with open(f"d_1_jad_detector_upstream_{tag}.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["veh_id", "step", "speed", "location"])
+        for rec in records_up:
+            writer.writerow([
+                rec["veh_id"],
+                rec["step"],
+                rec["speed"],
+                rec["location"]
+            ])
+
+    # Downstream
+    with open(f"d_1_jad_detector_downstream_{tag}.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["veh_id", "step", "speed", "location"])
+        for rec in records_down:
+            writer.writerow([
+                rec["veh_id"],
+                rec["step"],
+                rec["speed"],
+                rec["location"]
+            ])
+
+    # Process points uniformly
+    A_t, A_x = point_or_empty(A)
+    B_t, B_x = point_or_empty(B)
+    C_t, C_x = point_or_empty(C)
+    D_t, D_x = point_or_empty(D)
+    E_t, E_x = point_or_empty(E)
+    F_t, F_x = point_or_empty(F)
+    P1_t, P1_x = point_or_empty(P1)
+    P2_t, P2_x = point_or_empty(P2)
+    P3_t, P3_x = point_or_empty(P3)
+
+    # JAD strategy
+    with open(f"d_1_jad_strategy_{tag}.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+
+        writer.writerow([
+            "A_t", "A_x",
+            "B_t", "B_x",
+            "C_t", "C_x",
+            "D_t", "D_x",
+            "E_t", "E_x",
+            "F_t", "F_x",
+            "P1_t", "P1_x",
+            "P2_t", "P2_x",
+            "P3_t", "P3_x",
+            "v_t", "v_w",
+            "wave_speed",
+            "jad_speed"
+        ])
+
+        writer.writerow([
+            A_t, A_x,
+            B_t, B_x,
+            C_t, C_x,
+            D_t, D_x,
+            E_t, E_x,
+            F_t, F_x,
+            P1_t, P1_x,
+            P2_t, P2_x,
+            P3_t, P3_x,
+            v_t,
+            v_w,
+            wave_speed,
+            jad_speed
+        ])
+
+
+
+AGGREGATE_COLUMNS = ["location", "window", "t_start", "t_end", "count", "flow",
+                     "occupancy", "v_time_mean", "v_harmonic_mean"]
+
+
+def save_detector_aggregates(jad_speed, Et_offset, rows_up, rows_down):
+    """
+    Fixed-interval aggregates of both detectors (see jad_aggregates),
+    one row per detector, window and interval.
+    """
+    with open(f"d_1_jad_detector_aggregates_{run_tag(jad_speed * 3.6, Et_offset)}.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(AGGREGATE_COLUMNS)
+        for row in rows_up + rows_down:
+            writer.writerow(["" if row[c] is None else row[c] for c in AGGREGATE_COLUMNS])
+
+
+
+# -------------------------------
+# Append to CSV (only write travel_time)
+# -------------------------------
+def append_travel_times_to_csv(csv_file, travel_times, seed):
+    file_exists = os.path.exists(csv_file)
+
+    # Collect all valid travel times
+    travel_time_list = []
+    for veh_id, times in travel_times.items():
+        if times['leave'] is not None:
+            travel_time = times['leave'] - times['enter']
+            travel_time_list.append(travel_time)
+
+    with open(csv_file, 'a', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+
+        # Write header only if file does not exist
+        if not file_exists:
+            writer.writerow(['seed'])
+
+        # Write a whole row: seed + all vehicle travel times
+        writer.writerow([seed] + travel_time_list)
+
+    print(f"[INFO] Travel times for SEED={seed} have been appended to {csv_file}")
+
+
+
+# ------------------------------
+# Load trajectory data
+# ------------------------------
+def load_trajectory(XML_FILE):
+    """Read SUMO trajectory XML (or its archive, see write_trajectory_archive)"""
+    if XML_FILE.endswith(TRAJECTORY_ARCHIVE_SUFFIX):
+        return load_trajectory_archive(XML_FILE)
+
+    # numpy is only needed here; simulation scripts that import this
+    # module for save_result do not pay for it
+    import numpy as np
+
+    times, ids, xs = [], [], []
+
+    tree = ET.parse(XML_FILE)
+    root = tree.getroot()
+
+    for timestep in root.findall("timestep"):
+        t = float(timestep.get("time"))
+        for veh in timestep.findall("vehicle"):
+            times.append(t)
+            ids.append(veh.get("id"))
+            xs.append(float(veh.get("x")))
+
+    return np.array(times), np.array(ids), np.array(xs)
+
+
+
+# ------------------------------
+# Load selected FCD attributes
+# ------------------------------
+FCD_STRING_ATTRS = ("id", "lane", "type")
+
+
+def load_fcd_columns(XML_FILE, attrs=("x", "speed")):
+    """
+    Read SUMO trajectory XML into columns, streaming (large files are not
+    held in memory as a tree).
+
+    Returns (times, ids, columns) where columns maps every name in attrs
+    to an array (float, or str for lane / type).
+    """
+    import numpy as np
+
+    times, ids = [], []
+    values = {a: [] for a in attrs}
+    t = None
+
+    for event, elem in ET.iterparse(XML_FILE, events=("start", "end")):
+        if event == "start":
+            if elem.tag == "timestep":
+                t = float(elem.get("time"))
+            continue
+
+        if elem.tag == "vehicle":
+            times.append(t)
+            ids.append(elem.get("id"))
+            for a in attrs:
+                values[a].append(elem.get(a))
+        elif elem.tag == "timestep":
+            elem.clear()
+
+    columns = {
+        a: np.array(v) if a in FCD_STRING_ATTRS else np.array(v, dtype=float)
+        for a, v in values.items()
+    }
+    return np.array(times), np.array(ids), columns
+
+
+
+# ------------------------------
+# Compact trajectory archive
+# ------------------------------
+#
+# One record per vehicle and step, stored per vehicle (vehicles in ID order,
+# records in time order) as int32 columns:
+#   t  ms, x  cm, v  cm/s   (FCD writes 2 decimals, so x / v are lossless)
+# Each column holds the first value of a vehicle, then differences to the
+# previous record; the near-constant differences deflate well (npz, one
+# compressed block per column).
+
+TRAJECTORY_ARCHIVE_SUFFIX = ".traj.npz"
+TRAJECTORY_ARCHIVE_VERSION = 1
+ARCHIVE_SCALES = {"t": 1000, "x": 100, "v": 100}
+
+
+def write_trajectory_archive(path, times, ids, xs, speeds=None):
+    import numpy as np
+
+    # Vehicles in ID order (the storage order, not SUMO's network order)
+    names, veh = np.unique(ids, return_inverse=True)
+
+    order = np.lexsort((times, veh))
+    counts = np.bincount(veh, minlength=len(names))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    def delta(values, scale):
+        q = np.round(values[order] * scale).astype(np.int64)
+        d = np.diff(q, prepend=0)
+        d[starts[counts > 0]] = q[starts[counts > 0]]
+        return d.astype(np.int32)
+
+    columns = {
+        "t": delta(times, ARCHIVE_SCALES["t"]),
+        "x": delta(xs, ARCHIVE_SCALES["x"])
+    }
+    if speeds is not None:
+        columns["v"] = delta(speeds, ARCHIVE_SCALES["v"])
+
+    np.savez_compressed(
+        path,
+        version=np.int32(TRAJECTORY_ARCHIVE_VERSION),
+        names=names,
+        counts=counts.astype(np.int32),
+        **columns
+    )
+
+
+def load_trajectory_archive(path, speeds=False, by_vehicle=False):
+    """
+    Decode an archive to the arrays of load_trajectory (times, ids, xs),
+    plus speeds if requested.
+
+    Records are sorted by time, the vehicles of a step by ID. This is not the
+    order of the XML (FCD lists the vehicles of a step in network order), so
+    callers comparing with load_trajectory must sort both sides.
+    by_vehicle=True keeps the stored per-vehicle order and skips that sort.
+    """
+    import numpy as np
+
+    with np.load(path) as data:
+        if int(data["version"]) != TRAJECTORY_ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported trajectory archive version in {path}")
+        names = data["names"]
+        counts = data["counts"].astype(np.int64)
+        columns = {c: data[c] for c in ("t", "x", "v") if c in data.files}
+
+    if speeds and "v" not in columns:
+        raise ValueError(f"{path} has no speeds")
+
+    # Per-vehicle cumulative sums: global cumsum minus the total before each vehicle
+    ends = np.cumsum(counts)
+    before = np.repeat(np.concatenate([[0], ends[:-1]]), counts)
+
+    def undelta(d, scale):
+        c = np.cumsum(d, dtype=np.int64)
+        offset = np.concatenate([[0], c])[before]
+        return (c - offset) / scale
+
+    times = undelta(columns["t"], ARCHIVE_SCALES["t"])
+    xs = undelta(columns["x"], ARCHIVE_SCALES["x"])
+    ids = np.repeat(names, counts)
+    result = [times, ids, xs]
+    if speeds:
+        result.append(undelta(columns["v"], ARCHIVE_SCALES["v"]))
+
+    if not by_vehicle:
+        order = np.argsort(times, kind="stable")
+        result = [a[order] for a in result]
+
+    return tuple(result)
@@ -0,0 +1,344 @@
+# ======================================================
+# jam-absorption strategy
+# ======================================================
+def plan_jad(jad_speed, wave_speed,
+             A, E, F, vt, vw):
+
+    At = A[0]
+    Ax = A[1]
+    Et = E[0]
+    Ex = E[1]
+    Ft = F[0]
+    Fx = F[1]   
+
+    """
+    [D] 
+    Dt &= \frac{vt At - WAVE_SPEED Ft + (Fx - Ax)}{vt - WAVE_SPEED},
+    Dx &= x_A + vt (Dt - At)
+    """
+    Dt = (vt * At - wave_speed * Ft + (Fx - Ax)) / (vt - wave_speed)
+    Dx = Ax + vt * (Dt - At)
+    D = (Dt, Dx)
+
+    """
+    [C] 
+    Ct &= \frac{vw Dt - WAVE_SPEED Et + (Ex - Dx)}{vw - WAVE_SPEED},
+    Cx &= Dx + vw (Ct - Dt)
+    """
+    Ct = (vw * Dt - wave_speed * Et + (Ex - Dx)) / (vw - wave_speed)
+    Cx = Dx + vw * (Ct - Dt)
+    C = (Ct, Cx)  
+
+    """
+    [B] 
+    Bt &= \frac{vt At - JAD_SPEED Ct + (Cx - Ax)}{vt - JAD_SPEED}, 
+    Bx &= Ax + vt (Bt - At)
+    """    
+    Bt = (vt * At - jad_speed * Ct + (Cx - Ax)) / (vt - jad_speed)
+    Bx = Ax + vt * (Bt - At)
+    B = (Bt, Bx)
+
+    return B, C, D
+
+
+
+# ======================================================
+# Compute vertices of the feasible region of A
+# ======================================================
+def get_feasible_region_of_A(E, F, v_t, v_w, v_star, w, x_u):
+    """
+    Return three vertices of the feasible triangle:
+    P1 = (t_E, x_max)
+    P2 = (t_E, x_u)
+    P3 = (t_max, x_u)
+
+    E, F: tuples (t, x)
+    v_t, v_w, v_star, w: scalars
+    x_u: lower bound on x
+    """
+
+    t_E, x_E = E
+    t_F, _ = F  # x_F is not needed because x_E = x_F
+
+    # Directly compute gamma
+    numerator = (
+        w * w * v_t * t_E
+        - w * w * v_t * t_F
+        - w * w * v_w * t_E
+        + w * w * v_w * t_F
+        - w * v_star * v_t * t_E
+        + w * v_star * v_t * t_F
+        + w * v_star * v_w * t_E
+        - w * v_star * v_w * t_F
+    )
+
+    denominator = (
+        v_t * w
+        - v_t * v_w
+        - v_star * w
+        + v_star * v_w
+    )
+
+    gamma = x_E - w * t_E + numerator / denominator
+
+    # Upper vertex on B-line
+    x_max = w * t_E + gamma
+
+    # Lower bound
+    x_min = x_u
+
+    # Intersection of B-line and x = x_u
+    t_max = (x_min - gamma) / w
+
+    P1 = (t_E, x_max)
+    P2 = (t_E, x_min)
+    P3 = (t_max, x_min)
+
+    return P1, P2, P3
+
+
+
+# ======================================================
+# Closed-loop wave estimation
+# ======================================================
+def init_wave_estimate(wave_speed, Et_offset):
+    """
+    State of the online wave estimator (see update_wave_estimate)
+    """
+    return {
+        "F": None,          # Wave front at the downstream detector (t, x)
+        "E": None,          # Wave tail at the downstream detector (t, x), incl. Et_offset
+        "t_end": None,      # Raw end time of the last low-speed episode
+        "vt": None,         # Inflow traffic speed (m/s)
+        "vw": None,         # In-wave speed (m/s)
+        "w": wave_speed,    # Wave speed (m/s)
+        "w_from": None,     # Upstream episode used for the wave speed
+        "Et_offset": Et_offset,
+        "B": None,
+        "C": None,
+        "D": None
+    }
+
+
+def update_wave_estimate(est, step, events_up, sg_state_up, sg_state_down, sg_down,
+                         detector_up, detector_down, sg_max_speed,
+                         alpha=0.1, merge_gap=30):
+    """
+    Update the wave estimate with this step's detector output.
+    Cost is O(number of crossings in this step); no history is kept.
+
+    - vt:    EWMA of free-flow speeds crossing the upstream detector
+    - F, E:  start / end of the low-speed episode at the downstream detector;
+             an episode starting within merge_gap s after E widens the same wave
+    - vw:    running minimum speed inside the wave
+    - w:     from the front arrival times at both detectors, once upstream sees it
+    """
+
+    # ---------- Inflow speed ----------
+    for e in events_up:
+        if e["speed"] >= sg_max_speed:
+            if est["vt"] is None:
+                est["vt"] = e["speed"]
+            else:
+                est["vt"] += alpha * (e["speed"] - est["vt"])
+
+    # ---------- Completed low-speed episode downstream ----------
+    if sg_down is not None:
+        new_wave = (
+            est["t_end"] is None
+            or sg_down["t_start"] - est["t_end"] > merge_gap
+        )
+        if new_wave:
+            est["F"] = (sg_down["t_start"], detector_down)
+            est["vw"] = sg_down["v_min"]
+        else:
+            est["vw"] = min(est["vw"], sg_down["v_min"])
+
+        est["t_end"] = sg_down["t_end"]
+        est["E"] = (sg_down["t_end"] + est["Et_offset"], detector_down)
+
+    # ---------- Ongoing episode widening the known wave ----------
+    elif sg_state_down.get("in_low_speed") and est["t_end"] is not None:
+        if sg_state_down["t_start"] - est["t_end"] <= merge_gap:
+            est["E"] = (max(est["E"][0], step + est["Et_offset"]), detector_down)
+            est["vw"] = min(est["vw"], sg_state_down["v_min"])
+
+    # ---------- Wave speed from the upstream front ----------
+    if (sg_state_up.get("in_low_speed") and est["F"] is not None
+            and est["w_from"] != sg_state_up["t_start"]):
+        dt = sg_state_up["t_start"] - est["F"][0]
+        if dt > 0:
+            est["w"] = (detector_up - detector_down) / dt
+        est["w_from"] = sg_state_up["t_start"]
+
+    return est
+
+
+
+# ======================================================
+# Closed-loop re-planning
+# ======================================================
+def replan_jad(jad_speed, wave_speed, phase, P, E, F, vt, vw):
+    """
+    Re-solve the JAD plan from the current point P = (t, x) of the JAD vehicle.
+
+    Phase 1: P plays the role of A, B/C/D follow from plan_jad.
+    Phase 2: the vehicle already drives at jad_speed, so only C moves:
+             C is where its current line meets the wave tail through E.
+    """
+    if phase == 1:
+        return plan_jad(jad_speed, wave_speed, P, E, F, vt, vw)
+
+    Pt, Px = P
+    Et, Ex = E
+
+    """
+    [C] 
+    Ct &= \frac{Ex - WAVE_SPEED Et - Px + JAD_SPEED Pt}{JAD_SPEED - WAVE_SPEED},
+    Cx &= Px + JAD_SPEED (Ct - Pt)
+    """
+    Ct = (Ex - wave_speed * Et - Px + jad_speed * Pt) / (jad_speed - wave_speed)
+    Cx = Px + jad_speed * (Ct - Pt)
+
+    return None, (Ct, Cx), None
+
+
+
+# ======================================================
+# Impact of the JAD maneuver (distance / duration, see a_impact.py)
+# ======================================================
+def get_J(delta_w, w, v_t, v_w, v_star):
+    numerator   = - v_star * w * delta_w * (v_t - v_w) * (w - v_star)
+    denominator = (v_star - w) * (w - v_w) * (v_t - v_star)
+
+    J_dis = numerator / denominator
+    J_dur = J_dis / v_star
+    return J_dis, J_dur
+
+
+
+# ======================================================
+# Best insertion point inside the feasible region of A
+# ======================================================
+def score_insertion_points(t, v_t, E, F, v_w, v_star, w, x_u, ramp,
+                           slack_weight=1.0, slack_cap=20.0, dis_weight=0.01):
+    """
+    Score insertion opportunities A = (t, ramp), one per entry of the arrays
+    t / v_t (v_t: leader speed of that opportunity).
+
+    J_dis, J_dur  impact of the maneuver (get_J, delta_w = t_E - t_F); it
+                  depends on v_t only, not on the time of A
+    slack         time from A to the nearest edge of its feasible region (s):
+                  since t_E, and until the B-line passes the ramp
+    score         slack_weight * min(slack, slack_cap) - J_dur - dis_weight * J_dis,
+                  -inf where A is infeasible. Slack is a safety margin: beyond
+                  slack_cap it earns nothing, so a later A is not better for
+                  being later
+    """
+    import numpy as np
+
+    t = np.asarray(t, dtype=float)
+    v_t = np.asarray(v_t, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        J_dis, J_dur = get_J(E[0] - F[0], w, v_t, v_w, v_star)
+
+        # The region depends on v_t; where its hypotenuse crosses x = ramp
+        P1, P2, P3 = get_feasible_region_of_A(E, F, v_t, v_w, v_star, w, x_u)
+        t_ramp = P1[0] + (P1[1] - ramp) / (P1[1] - P2[1]) * (P3[0] - P1[0])
+
+        slack = np.minimum(t - P1[0], t_ramp - t)
+        feasible = (ramp >= x_u) & (slack >= 0) & (J_dur > 0)
+        score = np.where(
+            feasible,
+            slack_weight * np.minimum(slack, slack_cap) - J_dur - dis_weight * J_dis,
+            -np.inf
+        )
+
+    return {
+        "J_dis": J_dis,
+        "J_dur": J_dur,
+        "slack": slack,
+        "t_ramp": t_ramp,
+        "feasible": feasible,
+        "score": score
+    }
+
+
+def optimal_insertion_point(t, v_t, E, F, v_w, v_star, w, x_u, ramp, **weights):
+    """
+    Best A among the candidates (see score_insertion_points).
+
+    Returns (A, index of the candidate, scores), A and index being None
+    when no candidate is feasible.
+    """
+    import numpy as np
+
+    scores = score_insertion_points(t, v_t, E, F, v_w, v_star, w, x_u, ramp, **weights)
+    if not scores["feasible"].any():
+        return None, None, scores
+
+    i = int(np.argmax(scores["score"]))
+    return (float(np.asarray(t, dtype=float)[i]), ramp), i, scores
+
+
+def forecast_opportunities(history, t_now, horizon):
+    """
+    Opportunities expected after t_now from the recent ones (history: list of
+    (t, v_t), oldest first): times spaced by their mean interval up to
+    t_now + horizon, and the leader speeds seen recently (any of which the
+    next leader may have). Empty with fewer than two opportunities.
+    """
+    import numpy as np
+
+    if len(history) < 2:
+        return np.empty(0), np.empty(0)
+
+    t_hist = np.array([h[0] for h in history], dtype=float)
+    v_hist = np.array([h[1] for h in history], dtype=float)
+    interval = (t_hist[-1] - t_hist[0]) / (len(history) - 1)
+    if interval <= 0:
+        return np.empty(0), np.empty(0)
+
+    t = t_now + interval * np.arange(1, int(horizon // interval) + 1)
+    return t, np.unique(v_hist)
+
+
+def decide_insertion(t, v_t, history, E, F, v_w, v_star, w, x_u, ramp,
+                     horizon=300.0, score_tol=5.0, **weights):
+    """
+    Online decision at a real opportunity (t, v_t), against the opportunities
+    forecast from history (forecast_opportunities). A forecast time counts
+    with its worst score over the recent leader speeds, so waiting is only
+    chosen for a time that beats A whatever the next leader speed:
+
+    "take"        A is feasible and no forecast time scores more than
+                  score_tol better
+    "wait"        a forecast time is feasible for every recent leader speed
+                  and scores more than score_tol better (or A is infeasible)
+    "infeasible"  A is infeasible and no forecast time is surely feasible
+
+    Returns (decision, scores of A, (t, worst score) of the best forecast
+    time or None).
+    """
+    import numpy as np
+
+    now = score_insertion_points([t], [v_t], E, F, v_w, v_star, w, x_u, ramp, **weights)
+    t_fc, v_fc = forecast_opportunities(history, t, horizon)
+
+    best = None
+    if len(t_fc):
+        T, V = np.meshgrid(t_fc, v_fc)
+        scores = score_insertion_points(T.ravel(), V.ravel(), E, F, v_w, v_star, w, x_u, ramp, **weights)
+        worst = scores["score"].reshape(T.shape).min(axis=0)
+        i = int(np.argmax(worst))
+        if np.isfinite(worst[i]):
+            best = (float(t_fc[i]), float(worst[i]))
+
+    if now["feasible"][0]:
+        if best is not None and best[1] - now["score"][0] > score_tol:
+            return "wait", now, best
+        return "take", now, best
+    if best is not None:
+        return "wait", now, best
+    return "infeasible", now, None
@@ -0,0 +1,274 @@
+import csv
+import os
+import hashlib
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+from matplotlib.patches import Polygon
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from jad_io import load_trajectory
+
+
+
+# ------------------------------
+# Plot reference lines
+# ------------------------------
+def plot_reference_lines(ax, times, detector_downstream, detector_upstream, ramp):
+
+    right_x = times.max()
+    font_size_ref = 10
+    offset_y = 0.37
+
+    def draw_ref(y, label, offset=0):
+        ax.axhline(y=y/1000, color="white", linestyle="--", linewidth=0.6)
+        ax.text(
+            right_x, y/1000 - offset,
+            label,
+            va="bottom",
+            ha="right",
+            color="white",
+            fontsize=font_size_ref
+        )
+
+    draw_ref(detector_downstream, "detector\ndownstream", offset_y)
+    draw_ref(detector_upstream,   "detector\nupstream",   offset_y)
+    draw_ref(ramp,                "ramp",                 0) 
+
+
+
+# ------------------------------
+# JAD Strategy
+# ------------------------------
+def plot_jad_strategy(JAD_FILE, ax, row=None):
+    """
+    Draw points A~F and the feasible region of A from the strategy CSV,
+    or from `row` (e.g. results_store.load_strategy) when given.
+    """
+
+    # ---- Point Style ----
+    POINT_COLOR = "black"
+    POINT_SIZE  = 40
+    POINT_Z     = 10
+    POINT_FONT  = 14    
+
+    # ---- Feasible Region Style ----
+    REGION_COLOR     = "black"
+    REGION_ALPHA     = 0.2
+    REGION_LW        = 2
+    REGION_Z         = 2
+    REGION_FONT_SIZE = 10    
+
+    def is_valid(v):
+        return v != "" and v is not None
+
+    if row is None and JAD_FILE is not None and os.path.exists(JAD_FILE):
+        with open(JAD_FILE, "r") as f:
+            rows = list(csv.DictReader(f))
+        if rows:
+            row = rows[-1]
+
+    if row is None:
+        return
+
+    # ---- Label Points A~F ----
+    for p in ["A", "B", "C", "D", "E", "F"]:
+        if is_valid(row.get(f"{p}_t")) and is_valid(row.get(f"{p}_x")):
+            t = float(row[f"{p}_t"])
+            x = float(row[f"{p}_x"]) / 1000
+            ax.scatter(t, x, color=POINT_COLOR, s=POINT_SIZE, zorder=POINT_Z)
+            ax.text(t, x, f" {p}", fontsize=POINT_FONT,
+                    va="bottom", ha="left", color=POINT_COLOR)
+
+    # ---- Feasible Region Triangle ----
+    P_points = []
+    for p in ["P1", "P2", "P3"]:
+        if is_valid(row.get(f"{p}_t")) and is_valid(row.get(f"{p}_x")):
+            P_points.append((float(row[f"{p}_t"]), float(row[f"{p}_x"])))
+
+    if len(P_points) == 3:
+        triangle_xy = [(t, x/1000) for t, x in P_points]
+
+        triangle = Polygon(
+            triangle_xy,
+            closed=True,
+            facecolor=REGION_COLOR,
+            alpha=REGION_ALPHA,
+            edgecolor=REGION_COLOR,
+            linewidth=REGION_LW,
+            zorder=REGION_Z
+        )
+        ax.add_patch(triangle)
+
+        xs_tri = [p[0] for p in triangle_xy]
+        ys_tri = [p[1] for p in triangle_xy]
+
+        ax.text(
+            min(xs_tri) - 10,
+            max(ys_tri) + 0.02,
+            "Feasible\nRegion of A",
+            fontsize=REGION_FONT_SIZE,
+            color="black",
+            ha="right",
+            va="top"
+        )
+
+
+
+# ------------------------------
+# Plot trajectories
+# ------------------------------
+def plot_inserted_vehicles(ids, times, xs, ax):
+    """
+    Draw the inserted (JAD) vehicles as thick black vector lines.
+    """
+    LineWidth_INSERTED = 2.0
+
+    mask = np.char.startswith(ids, "inserted_")
+    ids_i, t_i, x_i = ids[mask], times[mask], xs[mask] / 1000
+    order = np.lexsort((t_i, ids_i))
+    ids_i, t_i, x_i = ids_i[order], t_i[order], x_i[order]
+
+    for vid in np.unique(ids_i):
+        sel = ids_i == vid
+        if sel.sum() < 2:
+            continue
+        ax.plot(t_i[sel], x_i[sel],
+                color="black",
+                linewidth=LineWidth_INSERTED,
+                zorder=10)
+
+
+def plot_trajectories(ids, lc_for_cbar, times, xs, ax, rasterized=False, inserted=True):
+    """
+    rasterized=True embeds the dense trajectory layer as an image in
+    vector outputs (PDF/SVG); the JAD vehicle line stays a vector path.
+    inserted=False leaves the JAD vehicle lines out.
+    """
+
+    ALPHA_ORIGINAL = 0.5
+    LineWidth_ORIGINAL = 0.6
+
+    cmap = plt.colormaps["jet_r"]
+    norm = mcolors.Normalize(vmin=0, vmax=90)
+
+    # Sort by vehicle, then time (one pass instead of one mask per vehicle)
+    order = np.lexsort((times, ids))
+    ids_s = ids[order]
+    t_s = times[order]
+    x_s = xs[order] / 1000
+
+    # Segments between consecutive points of the same vehicle
+    i0 = np.nonzero(ids_s[1:] == ids_s[:-1])[0]
+    i1 = i0 + 1
+    if len(i0) == 0:
+        return lc_for_cbar
+
+    segments = np.stack([
+        np.column_stack([t_s[i0], x_s[i0]]),
+        np.column_stack([t_s[i1], x_s[i1]])
+    ], axis=1)
+
+    # Segment k is coloured by the speed of segment k-1 of the same vehicle
+    # (first segment of a vehicle: its own speed)
+    v_seg = (x_s[i1] - x_s[i0]) * 1000 / (t_s[i1] - t_s[i0]) * 3.6
+    v_list = v_seg.copy()
+    prev_same = np.zeros(len(i0), dtype=bool)
+    prev_same[1:] = i0[1:] == i0[:-1] + 1
+    v_list[prev_same] = v_seg[np.nonzero(prev_same)[0] - 1]
+
+    seg_inserted = np.char.startswith(ids_s[i0], "inserted_")
+
+    # ---- Inserted (JAD) vehicles ----
+    if inserted and seg_inserted.any():
+        plot_inserted_vehicles(ids, times, xs, ax)
+
+    # ---- All other vehicles in one collection ----
+    if (~seg_inserted).any():
+        lc = LineCollection(segments[~seg_inserted],
+                            cmap=cmap,
+                            norm=norm,
+                            array=v_list[~seg_inserted],
+                            linewidths=LineWidth_ORIGINAL,
+                            alpha=ALPHA_ORIGINAL)
+        lc.set_rasterized(rasterized)
+        ax.add_collection(lc)
+
+        if lc_for_cbar is None:
+            lc_for_cbar = lc
+
+    return lc_for_cbar
+
+
+
+# ------------------------------
+# Cached raster layer of trajectories
+# ------------------------------
+TRAJECTORY_LAYER_CACHE = ".trajectory_layer_cache"
+
+
+def render_trajectory_layer(times, ids, xs, xlim, ylim, width_px, height_px, dpi):
+    """
+    Render only the trajectories of the non-inserted vehicles (transparent
+    background, no axes) to an RGBA array covering exactly xlim x ylim.
+    """
+    fig = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    fig.patch.set_alpha(0)
+
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.patch.set_alpha(0)
+
+    plot_trajectories(ids, None, times, xs, ax, inserted=False)
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def plot_trajectories_cached(XML_FILE, ax, xlim, ylim, dpi, cache_dir=TRAJECTORY_LAYER_CACHE):
+    """
+    Draw the trajectory layer of XML_FILE as one image on ax. The layer is
+    rendered once per (file, extent, pixel size) and cached, so figures that
+    only change annotations do not parse or draw the trajectories again.
+    As in raster mode, the JAD vehicle lines are not part of the image: their
+    points are cached with it and drawn as vector paths on top.
+
+    Returns (mappable for the colorbar, last time of the trajectory data).
+    """
+    fig = ax.figure
+    bbox = ax.get_position()
+    width_px = int(round(bbox.width * fig.get_figwidth() * dpi))
+    height_px = int(round(bbox.height * fig.get_figheight() * dpi))
+
+    st = os.stat(XML_FILE)
+    key = hashlib.sha1(
+        f"{os.path.abspath(XML_FILE)}|{st.st_size}|{st.st_mtime_ns}|"
+        f"{tuple(xlim)}|{tuple(ylim)}|{width_px}x{height_px}|{dpi}|v2".encode()
+    ).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"{key}.npz")
+
+    if os.path.exists(path):
+        data = np.load(path)
+        img, t_max = data["img"], float(data["t_max"])
+        ins_ids, ins_t, ins_x = data["ins_ids"], data["ins_t"], data["ins_x"]
+    else:
+        times, ids, xs = load_trajectory(XML_FILE)
+        img = render_trajectory_layer(times, ids, xs, xlim, ylim, width_px, height_px, dpi)
+        t_max = float(times.max())
+        mask = np.char.startswith(ids, "inserted_")
+        ins_ids, ins_t, ins_x = ids[mask], times[mask], xs[mask]
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez_compressed(path, img=img, t_max=t_max, ins_ids=ins_ids, ins_t=ins_t, ins_x=ins_x)
+
+    ax.imshow(img, extent=(xlim[0], xlim[1], ylim[0], ylim[1]), origin="upper",
+              aspect="auto", interpolation="none", zorder=1)
+    plot_inserted_vehicles(ins_ids, ins_t, ins_x, ax)
+
+    # Same colour mapping as plot_trajectories, for the colorbar only
+    lc_for_cbar = LineCollection([], cmap=plt.colormaps["jet_r"],
+                                 norm=mcolors.Normalize(vmin=0, vmax=90), alpha=0.5)
+    return lc_for_cbar, t_max
@@ -0,0 +1,271 @@
+import argparse
+import csv
+import time
+import numpy as np
+import ALL_FUNCTIONS as Func
+import scenario_generator
+import sg_threshold_sweep
+
+
+# ======================================================
+# Offline JAD replay over a recorded trajectory
+# ======================================================
+#
+# Everything d_1 feeds the planner can be read back from an FCD file:
+#
+# F, E, v_w   first stop-and-go event at the downstream detector
+#             (crossings of the odometer getDistance, as in Func.detector;
+#             FCD "distance" minus its value at the vehicle's first record)
+# A, v_t      first ramp crossing after the event with a headway above
+#             THRESHOLD_INSERT (positions = FCD "x", as in
+#             Func.check_insertion_opportunity_at_ramp); v_t is the leader speed
+#
+# A, B, C, D and P1-P3 are then solved for a whole grid of
+# (jad_speed, wave_speed, Et_offset, threshold_insert) with the plan_jad /
+# get_feasible_region_of_A formulas applied to arrays. No SUMO is started.
+#
+# On a baseline run the traffic is the one d_1 sees before inserting
+# (same seed and scenario), so feasible rows shortlist what to simulate.
+# FCD values are rounded to 0.01, so a crossing within 1 cm of a section
+# can be found one step apart from the live detector.
+
+WAVE_SPEED = -15 / 3.6
+SG_MAX_SPEED = 10.0
+SG_MIN_DURATION = 30
+
+JAD_SPEEDS_KMH = np.arange(20, 71, 5)
+WAVE_SPEEDS_KMH = np.arange(-20, -9, 1)
+Et_OFFSETS = np.arange(-60, 61, 10)
+THRESHOLDS_INSERT = np.arange(2.0, 6.01, 0.5)
+
+POINTS = ["A", "B", "C", "D", "E", "F", "P1", "P2", "P3"]
+
+
+
+# ======================================================
+# Trajectory
+# ======================================================
+def load_replay_data(XML_FILE):
+    """
+    FCD columns needed by the replay, sorted by (vehicle, time).
+    "row" keeps the file order (= TraCI ID list order within a step),
+    "odometer" is what traci.vehicle.getDistance returns.
+    """
+    times, ids, cols = Func.load_fcd_columns(XML_FILE, attrs=("x", "distance", "speed", "lane"))
+    order = np.lexsort((times, ids))
+
+    traj = {"t": times, "id": ids, "row": np.arange(len(times))}
+    traj.update(cols)
+    traj = {k: v[order] for k, v in traj.items()}
+
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = traj["id"][1:] != traj["id"][:-1]
+    start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    traj["odometer"] = traj["distance"] - traj["distance"][start]
+    return traj
+
+
+def _consecutive(traj):
+    """
+    Indices (i0, i1) of consecutive records of the same vehicle.
+    """
+    i0 = np.nonzero(traj["id"][1:] == traj["id"][:-1])[0]
+    return i0, i0 + 1
+
+
+def detector_crossings(traj, location):
+    """
+    (steps, speeds) of every crossing of `location`, ordered by time.
+    """
+    i0, i1 = _consecutive(traj)
+    d = traj["odometer"]
+    hit = i1[(d[i0] < location) & (location <= d[i1])]
+    hit = hit[np.argsort(traj["t"][hit], kind="stable")]
+    return traj["t"][hit], traj["speed"][hit]
+
+
+def ramp_crossings(traj, ramp):
+    """
+    Every crossing of the ramp, ordered as the insertion check sees them
+    (by step, then ID list order), with:
+    t, t_prev (step of the previous position), focal_v, leader_v,
+    headway (NaN without leader).
+    """
+    n = len(traj["t"])
+
+    # Leader: next vehicle ahead in the same lane at the same step
+    by_pos = np.lexsort((traj["x"], traj["lane"], traj["t"]))
+    leader = np.full(n, -1)
+    same = ((traj["t"][by_pos[1:]] == traj["t"][by_pos[:-1]])
+            & (traj["lane"][by_pos[1:]] == traj["lane"][by_pos[:-1]])
+            & (traj["x"][by_pos[1:]] > traj["x"][by_pos[:-1]]))
+    leader[by_pos[:-1][same]] = by_pos[1:][same]
+
+    i0, i1 = _consecutive(traj)
+    x = traj["x"]
+    hit = (x[i0] < ramp) & (ramp <= x[i1])
+    i0, i1 = i0[hit], i1[hit]
+    i1_order = np.lexsort((traj["row"][i1], traj["t"][i1]))
+    i0, i1 = i0[i1_order], i1[i1_order]
+
+    focal_v = traj["speed"][i1]
+    lead = leader[i1]
+    has_leader = lead >= 0
+
+    headway = np.full(len(i1), np.nan)
+    leader_v = np.full(len(i1), np.nan)
+    moving = has_leader & (focal_v >= 0.1)
+    headway[moving] = (x[lead[moving]] - x[i1[moving]]) / focal_v[moving]
+    leader_v[has_leader] = traj["speed"][lead[has_leader]]
+
+    return {
+        "t": traj["t"][i1],
+        "t_prev": traj["t"][i0],
+        "focal_v": focal_v,
+        "leader_v": leader_v,
+        "headway": headway
+    }
+
+
+def first_stop_and_go(steps, speeds, sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION):
+    """
+    First stop-and-go event of the detector records (see sg_threshold_sweep),
+    or None.
+    """
+    if len(steps) == 0:
+        return None
+    step_ids, inverse = np.unique(steps, return_inverse=True)
+    v_mean = np.bincount(inverse, weights=speeds) / np.bincount(inverse)
+    r = sg_threshold_sweep.sweep(step_ids, v_mean, [sg_max_speed], [sg_min_duration])[0]
+    return r if r["n_events"] > 0 else None
+
+
+def first_insertion(crossings, t_from, thresholds):
+    """
+    Index of the first insertion opportunity for every threshold (-1 if none).
+    The ramp check starts at the step the wave is detected, so a crossing
+    counts if its previous position was recorded at or after t_from.
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    ok = np.zeros((len(thresholds), len(crossings["t"])), dtype=bool)
+    valid = ~np.isnan(crossings["headway"]) & (crossings["t_prev"] >= t_from)
+    ok[:, valid] = crossings["headway"][valid][None, :] > thresholds[:, None]
+
+    idx = np.argmax(ok, axis=1)
+    idx[~ok.any(axis=1)] = -1
+    return idx
+
+
+
+# ======================================================
+# Parameter grid
+# ======================================================
+def replay(traj, jad_speeds, wave_speeds, Et_offsets, thresholds,
+           ramp, detector_up, detector_down,
+           sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION):
+    """
+    Solve the JAD plan for every combination (jad_speed, wave_speed in m/s,
+    Et_offset in s, threshold_insert in s).
+
+    Returns a dict of flat arrays, one entry per combination; points are
+    "{P}_t" / "{P}_x" (NaN when there is no wave or no opportunity), plus
+    "feasible": A lies in P1-P3 and A < B < C in time.
+    """
+    sg = first_stop_and_go(*detector_crossings(traj, detector_down), sg_max_speed, sg_min_duration)
+    crossings = ramp_crossings(traj, ramp)
+
+    J, W, O, T = np.meshgrid(
+        np.asarray(jad_speeds, dtype=float), np.asarray(wave_speeds, dtype=float),
+        np.asarray(Et_offsets, dtype=float), np.arange(len(thresholds)), indexing="ij"
+    )
+    J, W, O, T = J.ravel(), W.ravel(), O.ravel(), T.ravel()
+    nan = np.full(len(J), np.nan)
+
+    res = {
+        "jad_speed": J, "wave_speed": W, "Et_offset": O,
+        "threshold_insert": np.asarray(thresholds, dtype=float)[T]
+    }
+
+    if sg is None:
+        for p in POINTS:
+            res[f"{p}_t"], res[f"{p}_x"] = nan, nan
+        res["v_t"], res["v_w"] = nan, nan
+        res["feasible"] = np.zeros(len(J), dtype=bool)
+        return res
+
+    idx = first_insertion(crossings, sg["E_t"], thresholds)[T]
+    found = idx >= 0
+    A_t = np.where(found, crossings["t"][idx], np.nan)
+    vt = np.where(found, crossings["leader_v"][idx], np.nan)
+    vw = np.full(len(J), sg["v_min"])
+
+    A = (A_t, np.full(len(J), float(ramp)))
+    E = (sg["E_t"] + O, np.full(len(J), float(detector_down)))
+    F = (np.full(len(J), sg["F_t"]), np.full(len(J), float(detector_down)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        B, C, D = Func.plan_jad(J, W, A, E, F, vt, vw)
+        P1, P2, P3 = Func.get_feasible_region_of_A(E, F, vt, vw, J, W, detector_up)
+
+        # A in the triangle (vertical edge t_E, bottom edge x_u, hypotenuse on the B-line)
+        x_line = P2[1] + (P1[1] - P2[1]) * (P3[0] - A[0]) / (P3[0] - P1[0])
+        feasible = (
+            (A[0] >= P1[0]) & (A[0] <= P3[0]) & (A[1] >= P2[1]) & (A[1] <= x_line)
+            & (A[0] < B[0]) & (B[0] < C[0])
+        )
+
+    for p, P in zip(POINTS, (A, B, C, D, E, F, P1, P2, P3)):
+        # P2 / P3 have the scalar x_u as their x
+        res[f"{p}_t"], res[f"{p}_x"] = (np.broadcast_to(np.asarray(c, dtype=float), J.shape) for c in P)
+    res["v_t"], res["v_w"] = vt, vw
+    res["feasible"] = feasible
+    return res
+
+
+def save_replay(res, csv_file):
+    columns = (["jad_speed", "wave_speed", "Et_offset", "threshold_insert"]
+               + [f"{p}_{c}" for p in POINTS for c in ("t", "x")]
+               + ["v_t", "v_w", "feasible"])
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(len(res["jad_speed"])):
+            row = []
+            for c in columns:
+                v = res[c][i]
+                if c == "feasible":
+                    row.append(int(v))
+                else:
+                    row.append("" if np.isnan(v) else float(v))
+            writer.writerow(row)
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the JAD planner over a recorded trajectory")
+    parser.add_argument("xml", nargs="?", default="b_1_base_trajectory.xml")
+    parser.add_argument("--cfg", default="run.sumocfg", help="scenario of the trajectory (ramp / detectors)")
+    parser.add_argument("--out", default="b_1_jad_replay.csv")
+    args = parser.parse_args()
+
+    scenario = scenario_generator.load_scenario(args.cfg)
+
+    t0 = time.perf_counter()
+    traj = load_replay_data(args.xml)
+    t_load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    res = replay(
+        traj, JAD_SPEEDS_KMH / 3.6, WAVE_SPEEDS_KMH / 3.6, Et_OFFSETS, THRESHOLDS_INSERT,
+        scenario["ramp"], scenario["detector_upstream"], scenario["detector_downstream"]
+    )
+    t_replay = time.perf_counter() - t0
+
+    save_replay(res, args.out)
+
+    n = len(res["jad_speed"])
+    print(f"{n} combinations: load {t_load:.1f} s, replay {t_replay:.2f} s")
+    print(f"{int(res['feasible'].sum())} feasible, file saved as: {args.out}")
@@ -0,0 +1,290 @@
+import csv
+import heapq
+from collections import deque
+from traci import TraCIException
+import ALL_FUNCTIONS as Func
+
+
+# ======================================================
+# Event-driven JAD scheduler
+# ======================================================
+#
+# One priority queue holds everything that happens at a known time:
+#   ("expire", wave_id)      insertion window of a detected wave closes
+#   ("phase",  veh_id, 2)    JAD vehicle reaches B -> slow down to JAD speed
+#   ("phase",  veh_id, 3)    JAD vehicle reaches C -> resume car-following
+#
+# Per step, only due events are popped; the ramp scan runs only while a
+# wave is waiting for an insertion opportunity, and the safety check only
+# touches vehicles currently under JAD control. Nothing grows with the
+# simulated history except the per-wave log.
+#
+# TraCI calls go through Func.traci, the handle of the simulation functions,
+# so Func.set_traci (a TraciMonitor, a labeled connection) covers them too.
+
+
+def init_scheduler(jad_speed, wave_speed, Et_offset, ramp, x_u, max_wait=600):
+    """
+    Scheduler state.
+    - ramp:     insertion location (x of A)
+    - x_u:      lower bound of the feasible region of A (upstream detector)
+    - max_wait: a wave without an insertion opportunity within max_wait s after E is dropped
+    """
+    return {
+        "jad_speed": jad_speed,
+        "wave_speed": wave_speed,
+        "Et_offset": Et_offset,
+        "ramp": ramp,
+        "x_u": x_u,
+        "max_wait": max_wait,
+        "queue": [],            # heap of (time, seq, event)
+        "seq": 0,
+        "pending": deque(),     # wave ids waiting for insertion, oldest first
+        "waves": {},            # wave id -> plan / status
+        "active": {},           # veh id -> {"wave", "phase"}
+        "n_waves": 0,
+        "n_inserted": 0
+    }
+
+
+def schedule(sched, t, event):
+    heapq.heappush(sched["queue"], (t, sched["seq"], event))
+    sched["seq"] += 1
+
+
+def has_pending_waves(sched):
+    return len(sched["pending"]) > 0
+
+
+
+# ======================================================
+# Wave detected at the downstream detector
+# ======================================================
+def on_wave_detected(sched, sg_event):
+    """
+    Register a stop-and-go event (output of Func.detector) as a new wave
+    waiting for a JAD vehicle.
+    """
+    wave_id = sched["n_waves"]
+    sched["n_waves"] += 1
+
+    F = (sg_event["t_start"], sg_event["location"])
+    E = (sg_event["t_end"] + sched["Et_offset"], sg_event["location"])
+
+    sched["waves"][wave_id] = {
+        "wave": wave_id,
+        "status": "pending",
+        "veh_id": None,
+        "E": E,
+        "F": F,
+        "vw": sg_event["v_min"],
+        "vt": None,
+        "A": None, "B": None, "C": None, "D": None,
+        "P1": None, "P2": None, "P3": None
+    }
+    sched["pending"].append(wave_id)
+    schedule(sched, E[0] + sched["max_wait"], ("expire", wave_id))
+
+    print(
+        f"[Scheduler] wave {wave_id} detected: "
+        f"F ({int(F[0])},{int(F[1])}), E ({int(E[0])},{int(E[1])}), vw={sg_event['v_min']:.2f} m/s"
+    )
+    return wave_id
+
+
+
+# ======================================================
+# Insertion opportunity at the ramp
+# ======================================================
+def is_A_feasible(A, P1, P2, P3):
+    """
+    A lies in the triangle P1-P2-P3 (vertical edge t = t_E, bottom edge x = x_u,
+    hypotenuse along the B-line).
+    """
+    t, x = A
+    t_E, x_max = P1
+    _, x_u = P2
+    t_max, _ = P3
+
+    if t < t_E or t > t_max or x < x_u:
+        return False
+    x_line = x_u + (x_max - x_u) * (t_max - t) / (t_max - t_E)
+    return x <= x_line
+
+
+def on_insertion_opportunity(sched, jad_plan, step, insertion_info):
+    """
+    Assign the opportunity to the oldest pending wave whose plan is feasible.
+    A wave for which this A is not feasible stays pending: its feasible
+    region depends on the leader speed vt, so a later opportunity may fit;
+    the wave is retired by its "expire" event. Returns the wave id served,
+    or None.
+    """
+    A = (step, sched["ramp"])
+    vt = insertion_info["leader_v"]
+
+    for wave_id in sched["pending"]:
+        wave = sched["waves"][wave_id]
+
+        if step < wave["E"][0]:
+            continue
+
+        P1, P2, P3 = Func.get_feasible_region_of_A(
+            wave["E"], wave["F"], vt, wave["vw"], sched["jad_speed"],
+            sched["wave_speed"], sched["x_u"]
+        )
+        if not is_A_feasible(A, P1, P2, P3):
+            print(f"[Scheduler] wave {wave_id}: A ({step},{int(A[1])}) outside feasible region "
+                  f"(vt={vt:.2f} m/s), opportunity skipped")
+            continue
+
+        B, C, D = Func.plan_jad(sched["jad_speed"], sched["wave_speed"],
+                                A, wave["E"], wave["F"], vt, wave["vw"])
+
+        sched["pending"].remove(wave_id)
+        veh_id = f"inserted_{sched['n_inserted']}"
+        sched["n_inserted"] = Func.insert_vehicle_at_ramp(
+            jad_plan, step, insertion_info, sched["n_inserted"]
+        )
+
+        wave.update({
+            "status": "served", "veh_id": veh_id, "vt": vt,
+            "A": A, "B": B, "C": C, "D": D, "P1": P1, "P2": P2, "P3": P3
+        })
+        sched["active"][veh_id] = {"wave": wave_id, "phase": 1}
+
+        schedule(sched, B[0], ("phase", veh_id, 2))
+        schedule(sched, C[0], ("phase", veh_id, 3))
+
+        print(
+            f"[Scheduler] wave {wave_id} -> {veh_id}: "
+            f"A ({int(A[0])},{int(A[1])}), B ({int(B[0])},{int(B[1])}), C ({int(C[0])},{int(C[1])})"
+        )
+        return wave_id
+
+    return None
+
+
+
+# ======================================================
+# Dispatch due events
+# ======================================================
+def _release(sched, jad_plan, veh_id):
+    try:
+        Func.traci.vehicle.setSpeedMode(veh_id, 31)
+        Func.traci.vehicle.setSpeed(veh_id, -1)
+    except TraCIException:
+        pass  # Vehicle has left the network
+    sched["active"].pop(veh_id, None)
+    jad_plan.pop(veh_id, None)
+
+
+def dispatch(sched, jad_plan, step):
+    """
+    Pop and execute every event due at this step.
+    """
+    queue = sched["queue"]
+
+    while queue and queue[0][0] <= step:
+        _, _, event = heapq.heappop(queue)
+        kind = event[0]
+
+        if kind == "expire":
+            wave_id = event[1]
+            wave = sched["waves"][wave_id]
+            if wave["status"] == "pending":
+                wave["status"] = "expired"
+                sched["pending"].remove(wave_id)
+                print(f"[Scheduler] wave {wave_id}: no insertion opportunity, expired")
+
+        elif kind == "phase":
+            veh_id, phase = event[1], event[2]
+            info = sched["active"].get(veh_id)
+            if info is None or info["phase"] >= phase:
+                continue  # Cancelled (released early) or stale
+
+            info["phase"] = phase
+            if veh_id in jad_plan:
+                jad_plan[veh_id]["phase"] = phase
+                jad_plan[veh_id]["phase_start"] = step
+
+            if phase == 2:
+                try:
+                    Func.traci.vehicle.setSpeedMode(veh_id, 0)
+                    Func.traci.vehicle.setSpeed(veh_id, sched["jad_speed"])
+                except TraCIException:
+                    _release(sched, jad_plan, veh_id)
+            else:
+                print(f"[Step {step}] {veh_id} Phase 3: resuming natural car-following")
+                _release(sched, jad_plan, veh_id)
+
+
+
+# ======================================================
+# Safety check for controlled vehicles only
+# ======================================================
+def check_safety(sched, jad_plan, step, safe_gap=8.0):
+    """
+    Same rule as control_inserted_vehicles (front-to-front gap below safe_gap
+    -> resume automatic car-following), but one getLeader call per
+    controlled vehicle instead of a scan over all vehicles.
+
+    getLeader gives the gap from the follower's minGap to the leader's
+    rear, so the front-to-front gap adds the follower's minGap and the
+    length of that leader (any vType).
+    """
+    vehicle = Func.traci.vehicle
+
+    for veh_id in list(sched["active"]):
+        try:
+            leader = vehicle.getLeader(veh_id, safe_gap)
+        except TraCIException:
+            _release(sched, jad_plan, veh_id)
+            continue
+
+        if leader is None or leader[0] == "":
+            continue
+
+        gap = leader[1] + vehicle.getMinGap(veh_id) + vehicle.getLength(leader[0])
+        if gap < safe_gap:
+            print(
+                f"[Step {step}] {veh_id} unsafe gap {gap:.2f}m, resuming automatic car-following early"
+            )
+            _release(sched, jad_plan, veh_id)
+
+
+
+# ======================================================
+# Save per-wave plans
+# ======================================================
+def save_plans(sched, csv_file):
+    """
+    One row per detected wave, same point columns as Func.save_result.
+    """
+    def point_or_empty(P):
+        if P is None:
+            return "", ""
+        return P[0], P[1]
+
+    points = ["A", "B", "C", "D", "E", "F", "P1", "P2", "P3"]
+
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        header = ["wave", "status", "veh_id"]
+        for p in points:
+            header += [f"{p}_t", f"{p}_x"]
+        header += ["v_t", "v_w", "wave_speed", "jad_speed"]
+        writer.writerow(header)
+
+        for wave_id in sorted(sched["waves"]):
+            wave = sched["waves"][wave_id]
+            row = [wave_id, wave["status"], wave["veh_id"] or ""]
+            for p in points:
+                row += list(point_or_empty(wave[p]))
+            row += [
+                "" if wave["vt"] is None else wave["vt"],
+                wave["vw"],
+                sched["wave_speed"],
+                sched["jad_speed"]
+            ]
+            writer.writerow(row)
@@ -0,0 +1,354 @@
+import argparse
+import importlib
+import json
+import os
+import socket
+import time
+import ALL_FUNCTIONS as Func
+import scenario_generator
+
+
+# ======================================================
+# Online JAD planning from streamed detector records
+# ======================================================
+#
+# Crossing records arrive as CSV lines with the schema of Func.save_result
+# (veh_id, step, speed, location), optionally followed by "sent", the wall
+# clock (time.time()) at which the source emitted the record, and "lane".
+# They are read from a growing file (tail) or from a local TCP socket:
+#
+#   python jad_service.py 55 0 --tail feed.csv
+#   python jad_service.py 55 0 --port 8765
+#   python detector_stream_replay.py ... --port 8765 --speedup 50   (test feed)
+#
+# downstream  records are aggregated per AGG_INTERVAL; every closed interval
+#             updates the stop-and-go state (Func.update_stop_and_go), so a
+#             wave is known when the first record of the next interval
+#             arrives -> F, E, v_w
+# ramp        loop time headway (t - t of the previous vehicle in the same
+#             lane; records without a lane form one stream) at the ramp;
+#             after a wave, the first headway above THRESHOLD_INSERT gives
+#             A and v_t (previous vehicle = leader) -> plan_jad,
+#             get_feasible_region_of_A
+# upstream    only counted (its location is x_u of the feasible region)
+#
+# Every wave and plan is written as a JSON line with its latency: from the
+# arrival of the record that triggered it (processing) and, when records
+# carry "sent", from the source (end to end).
+
+WAVE_SPEED = -15 / 3.6
+SG_MAX_SPEED = 10.0
+SG_MIN_DURATION = 30
+THRESHOLD_INSERT = 3.0
+AGG_INTERVAL = 1.0          # s, aggregation interval of the downstream speeds
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+POLL_INTERVAL = 0.02        # s, file tail polling
+LOCATION_TOL = 0.5          # m, matching a record location to a section
+
+
+
+# ======================================================
+# Record sources
+# ======================================================
+def tail_lines(path, idle_timeout=None, poll=POLL_INTERVAL):
+    """
+    Lines of a file as they are appended (tail -f). Waits for the file to
+    appear; stops after idle_timeout seconds without new data (None: never).
+    """
+    while not os.path.exists(path):
+        time.sleep(poll)
+
+    with open(path) as f:
+        partial = ""
+        last_data = time.monotonic()
+        while True:
+            line = f.readline()
+            if line:
+                last_data = time.monotonic()
+                partial += line
+                if partial.endswith("\n"):
+                    yield partial
+                    partial = ""
+                continue
+            if idle_timeout is not None and time.monotonic() - last_data > idle_timeout:
+                return
+            time.sleep(poll)
+
+
+def socket_lines(host=SERVICE_HOST, port=SERVICE_PORT, once=False):
+    """
+    Lines sent by the clients of a local TCP server, one connection after
+    the other. With once=True, stops when the first client disconnects.
+    """
+    with socket.create_server((host, port)) as server:
+        print(f"[Service] listening on {host}:{port}")
+        while True:
+            conn, addr = server.accept()
+            with conn, conn.makefile("r") as f:
+                yield from f
+            if once:
+                return
+
+
+
+# ======================================================
+# Incremental planner
+# ======================================================
+def init_service(jad_speed, wave_speed, Et_offset, ramp, detector_up, detector_down,
+                 threshold_insert=THRESHOLD_INSERT, agg_interval=AGG_INTERVAL,
+                 sg_max_speed=SG_MAX_SPEED, sg_min_duration=SG_MIN_DURATION):
+    return {
+        "jad_speed": jad_speed,
+        "wave_speed": wave_speed,
+        "Et_offset": Et_offset,
+        "ramp": ramp,
+        "detector_up": detector_up,
+        "detector_down": detector_down,
+        "threshold_insert": threshold_insert,
+        "agg_interval": agg_interval,
+        "sg_max_speed": sg_max_speed,
+        "sg_min_duration": sg_min_duration,
+
+        # Downstream interval being filled
+        "sg_state": {},
+        "bucket": None,
+        "bucket_events": [],
+
+        # Ramp: previous crossing (t, speed) per lane, current wave (None: waiting for one)
+        "ramp_last": {},
+        "wave": None,
+
+        # Statistics
+        "n_records": 0,
+        "n_late": 0,
+        "n_up": 0,
+        "proc_total": 0.0,
+        "proc_max": 0.0
+    }
+
+
+def _at(location, section):
+    return abs(location - section) < LOCATION_TOL
+
+
+def _latency(msg, arrival, sent):
+    msg["latency_ms"] = (time.perf_counter() - arrival) * 1e3
+    msg["e2e_ms"] = (time.time() - sent) * 1e3 if sent is not None else None
+    return msg
+
+
+def process_record(state, veh_id, t, speed, location, sent=None, lane=None, arrival=None):
+    """
+    Feed one crossing record. Returns the messages it triggers
+    (dicts with "type" "wave" or "plan").
+    """
+    arrival = time.perf_counter() if arrival is None else arrival
+    state["n_records"] += 1
+    messages = []
+
+    if _at(location, state["detector_down"]):
+        interval = state["agg_interval"]
+        bucket = t - t % interval
+
+        if state["bucket"] is not None and bucket < state["bucket"]:
+            state["n_late"] += 1          # interval already closed
+            return messages
+
+        if state["bucket"] is not None and bucket > state["bucket"]:
+            sg = Func.update_stop_and_go(
+                state["sg_state"], state["bucket"], state["bucket_events"], location,
+                state["sg_max_speed"], state["sg_min_duration"]
+            )
+            state["bucket_events"] = []
+            if sg is not None:
+                state["wave"] = {
+                    "F": (sg["t_start"], state["detector_down"]),
+                    "E": (sg["t_end"] + state["Et_offset"], state["detector_down"]),
+                    "v_w": sg["v_min"],
+                    "detected_at": sg["t_end"]
+                }
+                messages.append(_latency({
+                    "type": "wave",
+                    "location": location,
+                    "t_start": sg["t_start"],
+                    "t_end": sg["t_end"],
+                    "duration": sg["duration"],
+                    "v_min": sg["v_min"],
+                    "v_mean": sg["v_mean"]
+                }, arrival, sent))
+
+        state["bucket"] = bucket
+        state["bucket_events"].append({"speed": speed})
+
+    elif _at(location, state["ramp"]):
+        last = state["ramp_last"].get(lane)
+        state["ramp_last"][lane] = (t, speed)
+        wave = state["wave"]
+
+        if last is not None and wave is not None and t >= wave["detected_at"]:
+            headway = t - last[0]
+            if headway > state["threshold_insert"]:
+                messages.append(_latency(plan_from_opportunity(state, t, last[1], headway),
+                                         arrival, sent))
+                state["wave"] = None      # one plan per wave
+
+    elif _at(location, state["detector_up"]):
+        state["n_up"] += 1
+
+    elapsed = time.perf_counter() - arrival
+    state["proc_total"] += elapsed
+    state["proc_max"] = max(state["proc_max"], elapsed)
+    return messages
+
+
+def plan_from_opportunity(state, t, vt, headway):
+    """
+    JAD plan for an insertion at the ramp at time t behind a leader at vt.
+    """
+    wave = state["wave"]
+    jad_speed, wave_speed = state["jad_speed"], state["wave_speed"]
+    x_u, ramp = state["detector_up"], state["ramp"]
+    E, F, vw = wave["E"], wave["F"], wave["v_w"]
+
+    A = (t, ramp)
+    B, C, D = Func.plan_jad(jad_speed, wave_speed, A, E, F, vt, vw)
+    P1, P2, P3 = Func.get_feasible_region_of_A(E, F, vt, vw, jad_speed, wave_speed, x_u)
+    scores = Func.score_insertion_points([t], [vt], E, F, vw, jad_speed, wave_speed, x_u, ramp)
+
+    def point(P):
+        return [float(P[0]), float(P[1])]
+
+    return {
+        "type": "plan",
+        "headway": headway,
+        "A": point(A), "B": point(B), "C": point(C), "D": point(D),
+        "E": point(E), "F": point(F),
+        "P1": point(P1), "P2": point(P2), "P3": point(P3),
+        "v_t": vt,
+        "v_w": vw,
+        "feasible": bool(scores["feasible"][0]),
+        "slack": float(scores["slack"][0])
+    }
+
+
+
+# ======================================================
+# Service loop
+# ======================================================
+def parse_line(line):
+    """
+    (veh_id, t, speed, location, sent, lane) of a CSV line, None for the
+    header or a malformed line. sent and lane are optional (None).
+    """
+    fields = line.rstrip("\r\n").split(",")
+    if len(fields) < 4:
+        return None
+    try:
+        sent = float(fields[4]) if len(fields) > 4 and fields[4] else None
+        lane = fields[5] if len(fields) > 5 and fields[5] else None
+        return fields[0], float(fields[1]), float(fields[2]), float(fields[3]), sent, lane
+    except ValueError:
+        return None
+
+
+def serve(lines, state, out):
+    """
+    Run the planner over a stream of CSV lines; messages go to `out`
+    (JSON lines) and to the console.
+    """
+    t_first = t_last = None
+    try:
+        for line in lines:
+            arrival = time.perf_counter()
+            record = parse_line(line)
+            if record is None:
+                continue
+            if t_first is None:
+                t_first = arrival
+
+            for msg in process_record(state, *record, arrival=arrival):
+                out.write(json.dumps(msg) + "\n")
+                out.flush()
+                print_message(msg)
+            t_last = time.perf_counter()
+    except KeyboardInterrupt:
+        pass
+
+    # From the first record to the last one processed (not the idle wait after it)
+    elapsed = t_last - t_first if t_first is not None else 0.0
+    print_stats(state, elapsed)
+
+
+def print_message(msg):
+    e2e = f", end-to-end {msg['e2e_ms']:.1f} ms" if msg["e2e_ms"] is not None else ""
+
+    if msg["type"] == "wave":
+        print(
+            f"[SG detected at {msg['location']} m] "
+            f"start={msg['t_start']:g} s, end={msg['t_end']:g} s, "
+            f"duration={msg['duration']:g} s, v_min={msg['v_min']:.2f} m/s "
+            f"(latency {msg['latency_ms']:.3f} ms{e2e})"
+        )
+    else:
+        A, B, C = msg["A"], msg["B"], msg["C"]
+        print(
+            f"[JAD Strategy] "
+            f"A ({A[0]:.0f},{A[1]:.0f}), B ({B[0]:.0f},{B[1]:.0f}), C ({C[0]:.0f},{C[1]:.0f}), "
+            f"vt={msg['v_t']:.2f} m/s, feasible={msg['feasible']} "
+            f"(latency {msg['latency_ms']:.3f} ms{e2e})"
+        )
+
+
+def print_stats(state, elapsed):
+    n = state["n_records"]
+    rate = n / elapsed if elapsed > 0 else 0.0
+    mean_us = state["proc_total"] / n * 1e6 if n else 0.0
+    print(
+        f"[Service] {n} records in {elapsed:.2f} s ({rate:.0f} records/s), "
+        f"{state['n_late']} late, processing mean {mean_us:.1f} us / max {state['proc_max'] * 1e6:.1f} us"
+    )
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online JAD planning from streamed detector records")
+    parser.add_argument("jad_speed", type=float, help="km/h")
+    parser.add_argument("Et_offset", type=float, help="s")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tail", metavar="CSV", help="follow a growing CSV file")
+    source.add_argument("--port", type=int, help="listen on a local TCP port")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--once", action="store_true", help="socket: stop when the first client disconnects")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="tail: stop after this many idle seconds")
+    parser.add_argument("--cfg", default="run.sumocfg", help="scenario (ramp / detector locations)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_INSERT, help="insertion headway (s)")
+    parser.add_argument("--interval", type=float, default=AGG_INTERVAL, help="aggregation interval (s)")
+    parser.add_argument("--out", default="jad_service_plans.jsonl")
+    args = parser.parse_args()
+
+    scenario = scenario_generator.load_scenario(args.cfg)
+    state = init_service(
+        args.jad_speed / 3.6, WAVE_SPEED, args.Et_offset,
+        scenario["ramp"], scenario["detector_upstream"], scenario["detector_downstream"],
+        threshold_insert=args.threshold, agg_interval=args.interval
+    )
+
+    # Import the submodules behind Func (and numpy, imported inside the
+    # scoring functions) before the first record arrives, so its latency
+    # does not include them
+    for module in ("jad_simulation", "jad_planning", "numpy"):
+        importlib.import_module(module)
+
+    if args.tail:
+        lines = tail_lines(args.tail, idle_timeout=args.idle_timeout)
+    else:
+        lines = socket_lines(args.host, args.port, once=args.once)
+
+    with open(args.out, "a") as out:
+        serve(lines, state, out)
+    print(f"Plans appended to: {args.out}")
@@ -0,0 +1,672 @@
+import bisect
+import math
+import time
+import traci
+from jad_planning import replan_jad
+
+
+
+# ======================================================
+# Simulation clock
+# ======================================================
+def simulation_time(step_length=1):
+    """
+    Time (s) of the step just simulated (the "step" of the controllers),
+    read from the SUMO clock: getTime() is already at the end of the step.
+    """
+    return _clock(traci.simulation.getTime() - step_length)
+
+
+def _clock(t):
+    # SUMO keeps time in ms; whole seconds stay int, as with 1 s steps
+    t = round(t, 3)
+    return int(t) if t == int(t) else t
+
+
+
+# ======================================================
+# Control the first vehicle to perform a natural stop
+# ======================================================
+STOP_START_TIME = 150          # Simulation time (step) when stopping begins
+STOP_DURATION = 30             # Stop duration (seconds)
+STOP_DISTANCE_TO_END = 500     # Distance from the stop point to the end of the road (m)
+
+
+def handle_first_vehicle_braking(step, veh_ids, target_vehicle, stopped,
+                                 stop_distance_to_end=STOP_DISTANCE_TO_END):
+    """
+    Control the first vehicle to perform one "natural stop" at a specified time
+    Used to create downstream disturbance
+    """
+
+    # If no target vehicle has been selected yet, choose the first vehicle in the current traffic flow
+    if target_vehicle is None and veh_ids:
+        target_vehicle = veh_ids[0]
+
+    # If the target vehicle is still in the network
+    if target_vehicle and target_vehicle in veh_ids:
+
+        # Reached the set time and has not stopped yet
+        # (>=: with a control period, the first update at or after it)
+        if step >= STOP_START_TIME and not stopped:
+            edge_id = traci.vehicle.getRoadID(target_vehicle)
+            lane_id = f"{edge_id}_0"
+            edge_length = traci.lane.getLength(lane_id)
+
+            # Stop position: stop_distance_to_end from the end of the road
+            stop_pos = edge_length - stop_distance_to_end
+
+            # Use setStop to let the vehicle stop naturally
+            traci.vehicle.setStop(
+                vehID=target_vehicle,
+                edgeID=edge_id,
+                pos=stop_pos,
+                duration=STOP_DURATION
+            )
+            stopped = True
+
+    return target_vehicle, stopped
+
+
+
+# ======================================================
+# Repeat the natural stop to create several waves
+# ======================================================
+def handle_repeated_braking(step, veh_ids, stop_times,
+                            stop_duration=30, stop_distance_to_end=500, min_approach=300):
+    """
+    Same "natural stop" as handle_first_vehicle_braking, repeated at every
+    time in stop_times. Each time, the most downstream vehicle that is still
+    at least min_approach (m) before the stop point is stopped.
+
+    Returns the id of the stopped vehicle, or None.
+    """
+    if step not in stop_times or not veh_ids:
+        return None
+
+    edge_id = traci.vehicle.getRoadID(veh_ids[0])
+    edge_length = traci.lane.getLength(f"{edge_id}_0")
+    stop_pos = edge_length - stop_distance_to_end
+
+    target_vehicle = None
+    target_x = None
+    for vid in veh_ids:
+        x = traci.vehicle.getLanePosition(vid)
+        if x < stop_pos - min_approach and (target_x is None or x > target_x):
+            target_vehicle = vid
+            target_x = x
+
+    if target_vehicle is None:
+        return None
+
+    traci.vehicle.setStop(
+        vehID=target_vehicle,
+        edgeID=edge_id,
+        pos=stop_pos,
+        duration=stop_duration
+    )
+    print(f"[Step {step}] Natural stop of {target_vehicle} at x={stop_pos:.0f} m")
+
+    return target_vehicle
+
+
+
+# ======================================================
+# Check for vehicle insertion opportunities
+# ======================================================
+def check_insertion_opportunity_at_ramp(ramp, threshold_insert, 
+                                        step, veh_ids, last_position):
+    """
+    Check if any vehicle crosses the ramp in this step
+    and meets the insertion condition (headway > THRESHOLD)
+
+    Returns:
+    - last_position (updated)
+    - info: None or dict containing all information needed for insertion
+    """
+
+    for focal_id in veh_ids:
+
+        pos = traci.vehicle.getPosition(focal_id)[0]
+
+        if focal_id in last_position:
+            prev_pos = last_position[focal_id]
+
+            # Check if the vehicle crosses the ramp
+            if prev_pos < ramp <= pos:
+
+                focal_x = pos
+                lane_id = traci.vehicle.getLaneID(focal_id)
+                focal_v = traci.vehicle.getSpeed(focal_id)
+
+                # Skip if the vehicle is almost stationary
+                if focal_v < 0.1:
+                    last_position[focal_id] = pos
+                    continue
+
+                # -----------------------------
+                # Find the leader in the same lane
+                # -----------------------------
+                leader_x = None
+                leader_id = None
+
+                for other in veh_ids:
+                    if other == focal_id:
+                        continue
+                    if traci.vehicle.getLaneID(other) != lane_id:
+                        continue
+
+                    pos_other = traci.vehicle.getPosition(other)[0]
+                    if pos_other > focal_x:
+                        if leader_x is None or pos_other < leader_x:
+                            leader_x = pos_other
+                            leader_id = other
+
+                if leader_id is None:
+                    last_position[focal_id] = pos
+                    continue
+
+                leader_v = traci.vehicle.getSpeed(leader_id)
+                dx = leader_x - focal_x
+                headway = dx / focal_v
+
+                # -----------------------------
+                # Meets insertion condition
+                # -----------------------------
+                if headway > threshold_insert:
+                    insertion_info = {
+                        "step": step,
+                        "lane_id": lane_id,
+                        "headway": headway,
+                        "focal_id": focal_id,
+                        "focal_x": focal_x,
+                        "focal_v": focal_v,
+                        "leader_id": leader_id,                                                
+                        "leader_x": leader_x,                        
+                        "leader_v": leader_v
+                    }
+
+                    print(
+                        f"[Insertion opportunities] "
+                        f"({step}, {ramp})"
+                    )
+
+                    last_position[focal_id] = pos
+                    return last_position, insertion_info
+
+        last_position[focal_id] = pos
+
+    return last_position, None
+
+
+
+def ramp_headways(ramp, veh_ids, last_position):
+    """
+    Time headways of all vehicles that crossed the ramp since the last call,
+    measured as in check_insertion_opportunity_at_ramp (distance to the
+    nearest vehicle ahead in the same lane / own speed; stationary vehicles
+    and vehicles without leader are skipped).
+
+    One position per vehicle, plus speed / lane of the crossing vehicles.
+
+    Returns:
+    - last_position (positions of this call)
+    - headways (list of s)
+    """
+    positions = {vid: traci.vehicle.getPosition(vid)[0] for vid in veh_ids}
+    headways = []
+
+    crossing = [
+        vid for vid in veh_ids
+        if vid in last_position and last_position[vid] < ramp <= positions[vid]
+    ]
+    if crossing:
+        by_x = sorted(positions, key=positions.get)
+        xs = [positions[vid] for vid in by_x]
+
+        for focal_id in crossing:
+            focal_v = traci.vehicle.getSpeed(focal_id)
+            if focal_v < 0.1:
+                continue
+            focal_x = positions[focal_id]
+            lane_id = traci.vehicle.getLaneID(focal_id)
+
+            # Nearest vehicle ahead in the same lane
+            for i in range(bisect.bisect_right(xs, focal_x), len(by_x)):
+                if traci.vehicle.getLaneID(by_x[i]) == lane_id:
+                    headways.append((xs[i] - focal_x) / focal_v)
+                    break
+
+    return positions, headways
+
+
+
+# ======================================================
+# Insert a vehicle
+# ======================================================
+def insert_vehicle_at_ramp(jad_plan, 
+                           step, insertion_info, inserted_count):
+    """
+    Insert a vehicle according to insertion_info
+    """
+
+    x_new = (insertion_info["focal_x"] + insertion_info["leader_x"]) / 2
+    v_new = (insertion_info["focal_v"] + insertion_info["leader_v"]) / 2
+    lane_id = insertion_info["lane_id"]
+
+    new_id = f"inserted_{inserted_count}"
+
+    print(
+        f"[Insertion opportunity] "
+        f"step={step}, "
+        f"focal={insertion_info['focal_id']}, "
+        f"leader={insertion_info['leader_id']}, "
+        f"headway={insertion_info['headway']:.2f}s"
+    )
+
+    traci.vehicle.add(
+        vehID=new_id,
+        routeID="route0",
+        typeID="car",
+        depart=str(step)
+    )
+
+    traci.vehicle.setSpeedMode(new_id, 0)
+    traci.vehicle.moveTo(new_id, lane_id, x_new)
+    traci.vehicle.setSpeed(new_id, v_new)
+
+    traci.vehicle.setAccel(new_id, 3.0)
+    traci.vehicle.setDecel(new_id, 5.0)
+
+    jad_plan[new_id] = {
+        "phase": 1,
+        "phase_start": step,
+        "init_speed": v_new
+    }
+
+    print(
+        f"   -> New vehicle {new_id} inserted at "
+        f"x={x_new:.2f}, v={v_new:.2f}\n"
+    )
+
+    return inserted_count + 1
+
+
+
+# ======================================================
+# Control the three-phase behavior of inserted vehicles
+# ======================================================
+def phase_duration(duration, control_period=1):
+    """
+    Phase duration (s) rounded down to whole control periods, so the phase
+    ends at the last control update before its planned end
+    (int(duration) with 1 s control).
+    """
+    return math.floor(duration / control_period + 1e-9) * control_period
+
+
+def control_inserted_vehicles(jad_plan, jad_speed, 
+                              step, Duration_AB, Duration_BC):
+    """
+    Execute three-phase control for inserted vehicles:
+    Phase 1: Maintain insertion speed
+    Phase 2: Force deceleration
+    Phase 3: Resume SUMO automatic car-following
+
+    step is the simulation time (s); Duration_AB / Duration_BC are in
+    seconds (see phase_duration).
+
+    If a vehicle carries re-planned deadlines ("t_B", "t_C", see
+    replan_inserted_vehicles), they replace the fixed Duration_AB / Duration_BC timers.
+    """
+
+    JAD_SAFE_GAP = 8.0  # Minimum safe gap (m)
+
+    to_remove = []
+
+    for vid, info in jad_plan.items():
+
+        # Vehicle has left the network
+        if vid not in traci.vehicle.getIDList():
+            to_remove.append(vid)
+            continue
+
+        phase = info["phase"]
+        start = info["phase_start"]
+
+        # ---------------------------------
+        # Front vehicle safety check
+        # ---------------------------------
+        lane_id = traci.vehicle.getLaneID(vid)
+        pos = traci.vehicle.getPosition(vid)[0]
+
+        front_pos = None
+        for other in traci.vehicle.getIDList():
+            if other == vid:
+                continue
+            if traci.vehicle.getLaneID(other) != lane_id:
+                continue
+
+            pos_other = traci.vehicle.getPosition(other)[0]
+            if pos_other > pos:
+                if front_pos is None or pos_other < front_pos:
+                    front_pos = pos_other
+
+        # If the safe gap is insufficient, immediately resume automatic control
+        if front_pos is not None:
+            gap = front_pos - pos
+            if gap < JAD_SAFE_GAP:
+                print(
+                    f"[Step {step}] {vid} unsafe gap {gap:.2f}m, resuming automatic car-following early"
+                )
+                traci.vehicle.setSpeedMode(vid, 31)
+                traci.vehicle.setSpeed(vid, -1)
+                to_remove.append(vid)
+                continue
+
+        # -----------------------------
+        # Phase 1: Maintain initial speed
+        # -----------------------------
+        if phase == 1:
+            if info.get("t_B") is not None:
+                keep = step < info["t_B"]
+            else:
+                keep = step - start < Duration_AB
+
+            if keep:
+                traci.vehicle.setSpeedMode(vid, 0)
+                traci.vehicle.setSpeed(vid, info["init_speed"])
+            else:
+                info["phase"] = 2
+                info["phase_start"] = step
+
+        # -----------------------------
+        # Phase 2: Force low-speed driving
+        # -----------------------------
+        elif phase == 2:
+            if info.get("t_C") is not None:
+                keep = step < info["t_C"]
+            else:
+                keep = step - start < Duration_BC
+
+            if keep:
+                traci.vehicle.setSpeedMode(vid, 0)
+                traci.vehicle.setSpeed(vid, jad_speed)
+            else:
+                info["phase"] = 3
+                info["phase_start"] = step
+
+        # -----------------------------
+        # Phase 3: Resume natural car-following
+        # -----------------------------
+        elif phase == 3:
+            print(f"[Step {step}] {vid} Phase 3: resuming natural car-following")
+            traci.vehicle.setSpeedMode(vid, 31)
+            traci.vehicle.setSpeed(vid, -1)
+            to_remove.append(vid)
+
+    # Clean up vehicles that have completed control
+    for vid in to_remove:
+        jad_plan.pop(vid, None)
+
+
+
+# ======================================================
+# Section Detection Logic
+# ======================================================
+def detector(step, veh_ids, last_pos, location, sg_state, sg_max_speed, sg_min_duration,
+             prev_step=None, step_length=1):
+    """
+    Use cumulative travel distance getDistance()
+    to detect whether a vehicle passes a specified section.
+
+    If sg_state is provided, perform
+    stop-and-go detection based on cross-section speed
+    (applicable to any detector)
+
+    prev_step: step of the previous call, when steps were skipped
+    (fast-forward, or a detector period longer than step_length).
+    Crossings in the skipped interval are then dated and given a
+    speed by interpolate_crossing.
+    """
+
+    events = []
+    sg_event = None
+    skipped = prev_step is not None and step - prev_step > 1.5 * step_length
+
+    # ======================================================
+    # 1. Detect vehicle crossing the section
+    # ======================================================
+    for vid in veh_ids:
+        pos = traci.vehicle.getDistance(vid)
+
+        if vid in last_pos:
+            prev = last_pos[vid]
+
+            if prev < location <= pos:
+                if skipped:
+                    cross_step, speed = interpolate_crossing(
+                        prev, pos, prev_step, step, traci.vehicle.getSpeed(vid), location,
+                        step_length
+                    )
+                else:
+                    cross_step = step
+                    speed = traci.vehicle.getSpeed(vid)
+
+                # if location == DETECTOR_LOC_DOWNSTREAM:                    
+                #     print(f"[step={step}] veh={vid} >>> CROSS detector @ {location} | speed={speed:.2f}")
+
+                events.append({
+                    "step": cross_step,
+                    "veh_id": vid,
+                    "speed": speed,
+                    "location": location
+                })
+
+        last_pos[vid] = pos
+
+    if skipped:
+        events.sort(key=lambda e: e["step"])
+
+    # ======================================================
+    # 2. Stop-and-Go Detection (one update per step with crossings)
+    # ======================================================
+    if sg_state is not None and events:
+        for s in sorted(set(e["step"] for e in events)):
+            step_events = [e for e in events if e["step"] == s]
+            sg = update_stop_and_go(sg_state, s, step_events, location, sg_max_speed, sg_min_duration)
+            if sg is not None:
+                sg_event = sg
+
+    return last_pos, events, sg_event
+
+
+
+def interpolate_crossing(prev, pos, prev_step, step, speed, location, step_length=1):
+    """
+    Step and speed at which a vehicle passed `location` between two calls,
+    assuming constant acceleration: the start speed follows from the
+    distance travelled and the current speed. The step is the first one
+    (on the step_length grid) at or after the crossing.
+    """
+    dt = step - prev_step
+    v0 = max(2 * (pos - prev) / dt - speed, 0.0)
+    a = (speed - v0) / dt
+    d = location - prev
+
+    if abs(a) < 1e-6:
+        tau = d / v0 if v0 > 0 else dt
+    else:
+        tau = (-v0 + math.sqrt(max(v0 * v0 + 2 * a * d, 0.0))) / a
+
+    tau = min(max(tau, 0.0), dt)
+    n = max(math.ceil(tau / step_length - 1e-9), 1)
+    cross_step = _clock(min(prev_step + n * step_length, step))
+    return cross_step, v0 + a * (cross_step - prev_step)
+
+
+def update_stop_and_go(sg_state, step, events, location, sg_max_speed, sg_min_duration):
+    """
+    Stop-and-go state update with the crossings of one step.
+    Returns the stop-and-go event that ends at this step, or None.
+    """
+    sg_event = None
+
+    # Initialize state (only once)
+    if "in_low_speed" not in sg_state:
+        sg_state["in_low_speed"] = False
+        sg_state["t_start"] = None
+        sg_state["v_start"] = None 
+        sg_state["v_min"] = None
+        sg_state["v_sum"] = 0.0
+        sg_state["n"] = 0
+
+    # Representative speed of current step at this detector
+    v_mean = sum(e["speed"] for e in events) / len(events)
+
+    # ---------- Enter / continue low speed ----------
+    if v_mean < sg_max_speed:
+        if not sg_state["in_low_speed"]:
+            sg_state["in_low_speed"] = True
+            sg_state["t_start"] = step
+            sg_state["v_start"] = v_mean
+            sg_state["v_min"] = v_mean
+            sg_state["v_sum"] = v_mean
+            sg_state["n"] = 1
+        else:
+            # Running aggregates, O(1) per step
+            sg_state["v_min"] = min(sg_state["v_min"], v_mean)
+            sg_state["v_sum"] += v_mean
+            sg_state["n"] += 1
+
+    # ---------- Speed recovery, check if it constitutes S&G ----------
+    else:
+        if sg_state["in_low_speed"]:
+            t_start = sg_state["t_start"]
+            t_end = step
+            duration = t_end - t_start
+            v_end = v_mean
+
+            if duration >= sg_min_duration:
+                sg_event = {
+                    "location": location,
+                    "t_start": t_start,
+                    "t_end": t_end,
+                    "duration": duration,
+                    "v_start": sg_state["v_start"],  
+                    "v_end": v_end,                  
+                    "v_min": sg_state["v_min"],
+                    "v_mean": sg_state["v_sum"] / sg_state["n"]
+                }
+
+            # Reset state (regardless of whether it constitutes S&G)
+            sg_state["in_low_speed"] = False
+            sg_state["t_start"] = None
+            sg_state["v_min"] = None
+            sg_state["v_sum"] = 0.0
+            sg_state["n"] = 0
+
+    return sg_event
+
+
+
+# ======================================================
+# Closed-loop re-planning of inserted vehicles
+# ======================================================
+def controlled_positions(jad_plan, veh_ids):
+    """
+    Position x (m) of every controlled vehicle still in the network,
+    read before the timed re-planning (replan_inserted_vehicles).
+    """
+    return {vid: traci.vehicle.getPosition(vid)[0] for vid in jad_plan if vid in veh_ids}
+
+
+def replan_inserted_vehicles(jad_plan, jad_speed, step, positions, est, deadline=None):
+    """
+    Closed-loop control: re-solve the plan of every controlled vehicle
+    from its current (t, x) with the latest wave estimate, and store
+    the phase deadlines t_B / t_C used by control_inserted_vehicles.
+
+    positions: x (m) per vehicle (controlled_positions), so the solve
+    makes no TraCI call: O(1) arithmetic per controlled vehicle.
+    In phase 1 the vehicle holds its own insertion speed, so that is
+    its vt (est["vt"] is the inflow upstream, not this vehicle).
+
+    deadline: time.perf_counter() value; once it has passed, the
+    remaining vehicles keep their previous plan.
+    Returns the number of vehicles whose re-solve was skipped.
+    """
+    if est["E"] is None or est["F"] is None or est["vw"] is None:
+        return 0
+
+    skipped = 0
+    for vid, info in jad_plan.items():
+        if vid not in positions or info["phase"] not in (1, 2):
+            continue
+
+        if deadline is not None and time.perf_counter() > deadline:
+            skipped += 1
+            continue
+
+        P = (step, positions[vid])
+
+        try:
+            B, C, D = replan_jad(jad_speed, est["w"], info["phase"],
+                                 P, est["E"], est["F"], info["init_speed"], est["vw"])
+        except ZeroDivisionError:
+            continue
+
+        if info["phase"] == 1:
+            info["t_B"] = B[0]
+            est["B"], est["D"] = B, D
+        info["t_C"] = C[0]
+        est["C"] = C
+
+    return skipped
+
+
+
+# -------------------------------
+# Lowest speed behind a vehicle
+# -------------------------------
+def min_speed_behind(vehicle, veh_ids, x_min):
+    """
+    Lowest speed (m/s) of the vehicles between x_min (m) and `vehicle`,
+    a virtual detector over the section behind it (the whole road from
+    x_min once the vehicle has left). None if nobody is there.
+    """
+    x_max = traci.vehicle.getPosition(vehicle)[0] if vehicle in veh_ids else math.inf
+
+    v_min = None
+    for vid in veh_ids:
+        if vid == vehicle:
+            continue
+        if x_min <= traci.vehicle.getPosition(vid)[0] < x_max:
+            v = traci.vehicle.getSpeed(vid)
+            if v_min is None or v < v_min:
+                v_min = v
+    return v_min
+
+
+
+# -------------------------------
+# Record vehicle travel times
+# -------------------------------
+def record_travel_times(travel_times, current_step, veh_ids=None):
+    """
+    Entry / exit time of every vehicle; veh_ids: IDs of this step if
+    already fetched.
+    """
+    if veh_ids is None:
+        veh_ids = traci.vehicle.getIDList()
+    veh_ids = set(veh_ids)
+
+    # Record entry
+    for veh_id in veh_ids:
+        if veh_id not in travel_times:
+            travel_times[veh_id] = {'enter': current_step, 'leave': None}
+
+    # Record exit
+    for veh_id in list(travel_times.keys()):
+        if travel_times[veh_id]['leave'] is None and veh_id not in veh_ids:
+            travel_times[veh_id]['leave'] = current_step
@@ -0,0 +1,233 @@
+import json
+import math
+
+
+# ======================================================
+# Mergeable quantile sketch (t-digest)
+# ======================================================
+#
+# Merging t-digest (Dunning): values are buffered, then sorted into
+# centroids whose size is bounded by the k1 scale function, so the tails
+# (short and long headways) stay precise. The state is a plain dict of
+# lists (JSON), and two digests merge into one with the same error bounds,
+# so sketches of several seeds or workers combine without per-vehicle data.
+
+DIGEST_DELTA = 100     # compression: about 2 x DIGEST_DELTA centroids at most
+
+
+def init_digest(delta=DIGEST_DELTA):
+    return {"delta": delta, "centroids": [], "buffer": [], "n": 0, "min": None, "max": None}
+
+
+def digest_add(d, value, weight=1):
+    d["buffer"].append([value, weight])
+    d["n"] += weight
+    d["min"] = value if d["min"] is None else min(d["min"], value)
+    d["max"] = value if d["max"] is None else max(d["max"], value)
+    if len(d["buffer"]) > 5 * d["delta"]:
+        _compress(d)
+
+
+def digest_merge(*digests):
+    """
+    One digest holding the values of all the given ones.
+    """
+    out = init_digest(max(d["delta"] for d in digests))
+    for d in digests:
+        out["buffer"] += [list(c) for c in d["centroids"]] + [list(c) for c in d["buffer"]]
+        out["n"] += d["n"]
+        for k, f in (("min", min), ("max", max)):
+            if d[k] is not None:
+                out[k] = d[k] if out[k] is None else f(out[k], d[k])
+    _compress(out)
+    return out
+
+
+def _k(q, delta):
+    return delta / (2 * math.pi) * math.asin(2 * q - 1)
+
+
+def _q(k, delta):
+    k = min(max(k, -delta / 4), delta / 4)
+    return (math.sin(2 * math.pi * k / delta) + 1) / 2
+
+
+def _compress(d):
+    points = sorted(d["centroids"] + d["buffer"])
+    d["buffer"] = []
+    if not points:
+        return
+
+    n, delta = d["n"], d["delta"]
+    merged = [list(points[0])]
+    w_before = 0.0
+    q_limit = _q(_k(0.0, delta) + 1, delta)
+
+    for mean, w in points[1:]:
+        cur = merged[-1]
+        if (w_before + cur[1] + w) / n <= q_limit:
+            cur[0] += (mean - cur[0]) * w / (cur[1] + w)
+            cur[1] += w
+        else:
+            w_before += cur[1]
+            q_limit = _q(_k(w_before / n, delta) + 1, delta)
+            merged.append([mean, w])
+
+    d["centroids"] = merged
+
+
+def _curve(d):
+    """
+    Piecewise-linear (cumulative weight, value) points of the distribution.
+    """
+    if d["buffer"]:
+        _compress(d)
+    points = [(0.0, d["min"])]
+    cum = 0.0
+    for mean, w in d["centroids"]:
+        points.append((cum + w / 2, mean))
+        cum += w
+    points.append((cum, d["max"]))
+    return points
+
+
+def digest_quantile(d, q):
+    """
+    Value below which a fraction q of the values lies (None if empty).
+    """
+    if d["n"] == 0:
+        return None
+    target = min(max(q, 0.0), 1.0) * d["n"]
+    points = _curve(d)
+    for (c0, v0), (c1, v1) in zip(points[:-1], points[1:]):
+        if target <= c1:
+            return v0 if c1 == c0 else v0 + (v1 - v0) * (target - c0) / (c1 - c0)
+    return d["max"]
+
+
+def digest_cdf(d, value):
+    """
+    Fraction of the values below value.
+    """
+    if d["n"] == 0:
+        return None
+    if value <= d["min"]:
+        return 0.0
+    if value >= d["max"]:
+        return 1.0
+    points = _curve(d)
+    for (c0, v0), (c1, v1) in zip(points[:-1], points[1:]):
+        if value < v1:
+            cum = c0 if v1 == v0 else c0 + (c1 - c0) * (value - v0) / (v1 - v0)
+            return cum / d["n"]
+    return 1.0
+
+
+
+# ======================================================
+# Headway monitor at the ramp
+# ======================================================
+#
+# Time headways of the vehicles crossing the ramp (as measured by
+# check_insertion_opportunity_at_ramp: gap to the leader / own speed),
+# in one digest for the whole run and one per HEADWAY_WINDOW.
+# duration / n give the rate of candidate crossings for the threshold query.
+
+HEADWAY_WINDOW = 300   # s
+
+
+def init_headway_monitor(window=HEADWAY_WINDOW, delta=DIGEST_DELTA):
+    return {
+        "window": window,
+        "overall": init_digest(delta),
+        "windows": {},          # str(window start) -> digest (str keys: JSON)
+        "t_first": None,
+        "t_last": None
+    }
+
+
+def update_headway_monitor(mon, step, headways):
+    """
+    Add the headways (s) measured at `step`; every call extends the
+    observed period, with or without crossings.
+    """
+    if mon["t_first"] is None:
+        mon["t_first"] = step
+    mon["t_last"] = step
+
+    if not headways:
+        return
+    key = str(int(step // mon["window"] * mon["window"]))
+    win = mon["windows"].get(key)
+    if win is None:
+        win = mon["windows"][key] = init_digest(mon["overall"]["delta"])
+    for h in headways:
+        digest_add(mon["overall"], h)
+        digest_add(win, h)
+
+
+def monitor_duration(mon):
+    if mon.get("duration") is not None:
+        return mon["duration"]
+    if mon["t_first"] is None:
+        return 0.0
+    return mon["t_last"] - mon["t_first"]
+
+
+def merge_headway_monitors(*monitors):
+    """
+    Combine monitors of several seeds / workers; windows with the same
+    start are merged, observed durations add up.
+    """
+    out = init_headway_monitor(monitors[0]["window"], monitors[0]["overall"]["delta"])
+    out["overall"] = digest_merge(*(m["overall"] for m in monitors))
+    keys = sorted({k for m in monitors for k in m["windows"]}, key=float)
+    for key in keys:
+        out["windows"][key] = digest_merge(*(m["windows"][key] for m in monitors if key in m["windows"]))
+    out["duration"] = sum(monitor_duration(m) for m in monitors)
+    return out
+
+
+def insertion_threshold(digest, rate, within=30.0, prob=0.9):
+    """
+    Largest headway threshold h such that an opportunity (a crossing with
+    headway > h) occurs within `within` seconds with probability `prob`,
+    for crossings at `rate` per second with independent headways:
+
+        1 - (1 - P(headway > h)) ** (rate * within) = prob
+    """
+    expected = rate * within
+    if digest["n"] == 0 or expected <= 0:
+        return None
+    p_exceed = 1 - (1 - prob) ** (1 / expected)
+    return digest_quantile(digest, 1 - p_exceed)
+
+
+def monitor_threshold(mon, within=30.0, prob=0.9, window_start=None):
+    """
+    insertion_threshold over the whole monitor, or over one window.
+    """
+    duration = monitor_duration(mon)
+    if window_start is None:
+        digest = mon["overall"]
+    else:
+        digest = mon["windows"].get(str(int(window_start)))
+        duration = min(duration, mon["window"]) if duration else 0.0
+        if digest is None:
+            return None
+    rate = digest["n"] / duration if duration > 0 else 0.0
+    return insertion_threshold(digest, rate, within, prob)
+
+
+def save_headway_monitor(mon, path):
+    for d in [mon["overall"]] + list(mon["windows"].values()):
+        if d["buffer"]:
+            _compress(d)
+    data = dict(mon, duration=monitor_duration(mon))
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def load_headway_monitor(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,230 @@
+import csv
+import glob
+import os
+import re
+import sqlite3
+
+
+# ======================================================
+# Results store (one SQLite file instead of per-run CSVs)
+# ======================================================
+#
+# runs          one row per (jad_speed_kmh, Et_offset, seed, scenario)
+# detector      every detector crossing (save_result's upstream / downstream CSVs)
+# strategy      points A-F, P1-P3, v_t, v_w, wave_speed, jad_speed (save_result's strategy CSV)
+# travel_times  one row per vehicle (append_travel_times_to_csv)
+#
+# WAL mode lets plotting scripts read while sweep workers write.
+
+RESULTS_DB = "results.sqlite"
+
+POINTS = ["A", "B", "C", "D", "E", "F", "P1", "P2", "P3"]
+STRATEGY_COLUMNS = (
+    [f"{p}_{c}" for p in POINTS for c in ("t", "x")]
+    + ["v_t", "v_w", "wave_speed", "jad_speed"]
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        INTEGER PRIMARY KEY,
+    jad_speed_kmh INTEGER NOT NULL,
+    Et_offset     INTEGER NOT NULL,
+    seed          INTEGER NOT NULL,
+    scenario      TEXT    NOT NULL,
+    UNIQUE (jad_speed_kmh, Et_offset, seed, scenario)
+);
+CREATE TABLE IF NOT EXISTS detector (
+    run_id   INTEGER NOT NULL,
+    location REAL    NOT NULL,
+    veh_id   TEXT    NOT NULL,
+    step     REAL    NOT NULL,
+    speed    REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS detector_run ON detector (run_id, location, step);
+CREATE TABLE IF NOT EXISTS strategy (
+    run_id INTEGER PRIMARY KEY,
+    {", ".join(f"{c} REAL" for c in STRATEGY_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS travel_times (
+    run_id      INTEGER NOT NULL,
+    veh_id      TEXT    NOT NULL,
+    travel_time REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS travel_times_run ON travel_times (run_id);
+"""
+
+
+
+# ======================================================
+# Open / create
+# ======================================================
+def open_store(path=RESULTS_DB):
+    db = sqlite3.connect(path, timeout=60)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def _run_key(jad_speed_kmh, Et_offset, seed, scenario):
+    return int(round(jad_speed_kmh)), int(Et_offset), int(seed), scenario
+
+
+def get_run_id(db, jad_speed_kmh, Et_offset, seed=1, scenario="reference"):
+    row = db.execute(
+        "SELECT run_id FROM runs WHERE jad_speed_kmh=? AND Et_offset=? AND seed=? AND scenario=?",
+        _run_key(jad_speed_kmh, Et_offset, seed, scenario)
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+
+# ======================================================
+# Write
+# ======================================================
+def save_run(db, jad_speed, wave_speed, Et_offset, seed, scenario,
+             records_up, records_down,
+             A, B, C, D, E, F,
+             P1, P2, P3,
+             v_t, v_w, travel_times=None):
+    """
+    Same content as Func.save_result (+ travel times), written in one
+    transaction with bulk inserts. A run with the same key is replaced.
+    jad_speed / wave_speed in m/s, as for save_result.
+    """
+    def point_or_none(P):
+        if P is None:
+            return None, None
+        return P[0], P[1]
+
+    key = _run_key(jad_speed * 3.6, Et_offset, seed, scenario)
+
+    with db:
+        old = get_run_id(db, *key)
+        if old is not None:
+            for table in ("detector", "strategy", "travel_times", "runs"):
+                db.execute(f"DELETE FROM {table} WHERE run_id=?", (old,))
+
+        run_id = db.execute(
+            "INSERT INTO runs (jad_speed_kmh, Et_offset, seed, scenario) VALUES (?, ?, ?, ?)", key
+        ).lastrowid
+
+        db.executemany(
+            "INSERT INTO detector VALUES (?, ?, ?, ?, ?)",
+            ((run_id, rec["location"], rec["veh_id"], rec["step"], rec["speed"])
+             for rec in list(records_up) + list(records_down))
+        )
+
+        values = []
+        for P in (A, B, C, D, E, F, P1, P2, P3):
+            values.extend(point_or_none(P))
+        values += [v_t, v_w, wave_speed, jad_speed]
+        db.execute(
+            f"INSERT INTO strategy VALUES ({', '.join('?' * (len(STRATEGY_COLUMNS) + 1))})",
+            [run_id] + values
+        )
+
+        if travel_times:
+            db.executemany(
+                "INSERT INTO travel_times VALUES (?, ?, ?)",
+                ((run_id, veh_id, t["leave"] - t["enter"])
+                 for veh_id, t in travel_times.items() if t["leave"] is not None)
+            )
+
+    return run_id
+
+
+
+# ======================================================
+# Read
+# ======================================================
+def load_detector(db, jad_speed_kmh, Et_offset, location, seed=1, scenario="reference"):
+    """
+    Returns (steps, speeds) of one detector, ordered by time
+    (same as d_4's load_detector_data on the CSV).
+    """
+    rows = db.execute(
+        "SELECT d.step, d.speed FROM detector d JOIN runs r USING (run_id) "
+        "WHERE r.jad_speed_kmh=? AND r.Et_offset=? AND r.seed=? AND r.scenario=? AND d.location=? "
+        "ORDER BY d.step",
+        _run_key(jad_speed_kmh, Et_offset, seed, scenario) + (location,)
+    ).fetchall()
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+
+def load_strategy(db, jad_speed_kmh, Et_offset, seed=1, scenario="reference"):
+    """
+    Returns the strategy row as a dict (columns of d_1_jad_strategy_*.csv,
+    None for empty points), or None if the run is unknown.
+    """
+    row = db.execute(
+        f"SELECT {', '.join('s.' + c for c in STRATEGY_COLUMNS)} FROM strategy s JOIN runs r USING (run_id) "
+        "WHERE r.jad_speed_kmh=? AND r.Et_offset=? AND r.seed=? AND r.scenario=?",
+        _run_key(jad_speed_kmh, Et_offset, seed, scenario)
+    ).fetchone()
+    return None if row is None else dict(zip(STRATEGY_COLUMNS, row))
+
+
+def load_travel_times(db, jad_speed_kmh, Et_offset, seed=1, scenario="reference"):
+    rows = db.execute(
+        "SELECT t.travel_time FROM travel_times t JOIN runs r USING (run_id) "
+        "WHERE r.jad_speed_kmh=? AND r.Et_offset=? AND r.seed=? AND r.scenario=?",
+        _run_key(jad_speed_kmh, Et_offset, seed, scenario)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def list_runs(db):
+    return db.execute(
+        "SELECT jad_speed_kmh, Et_offset, seed, scenario FROM runs "
+        "ORDER BY scenario, jad_speed_kmh, Et_offset, seed"
+    ).fetchall()
+
+
+
+# ======================================================
+# Import existing CSV results
+# ======================================================
+def import_csv_results(db, directory=".", seed=1, scenario="reference"):
+    """
+    Load every d_1_jad_strategy_{speed}_{offset}.csv (and its detector CSVs)
+    found in directory into the store. Returns the number of runs imported.
+    """
+    pattern = re.compile(r"d_1_jad_strategy_(-?\d+)_(-?\d+)\.csv$")
+    n = 0
+
+    for path in sorted(glob.glob(os.path.join(directory, "d_1_jad_strategy_*.csv"))):
+        m = pattern.search(path)
+        if m is None:
+            continue
+        speed, offset = m.group(1), m.group(2)
+
+        with open(path) as f:
+            rows = list(csv.DictReader(f))
+        if not rows:
+            continue
+        row = {k: (float(v) if v != "" else None) for k, v in rows[-1].items()}
+
+        records = []
+        for side in ("upstream", "downstream"):
+            det_path = os.path.join(directory, f"d_1_jad_detector_{side}_{speed}_{offset}.csv")
+            if os.path.exists(det_path):
+                with open(det_path) as f:
+                    records.extend(
+                        {"veh_id": r["veh_id"], "step": float(r["step"]),
+                         "speed": float(r["speed"]), "location": float(r["location"])}
+                        for r in csv.DictReader(f)
+                    )
+
+        points = [
+            None if row[f"{p}_t"] is None else (row[f"{p}_t"], row[f"{p}_x"])
+            for p in POINTS
+        ]
+        jad_speed = row["jad_speed"] if row.get("jad_speed") is not None else int(speed) / 3.6
+        save_run(
+            db, jad_speed, row["wave_speed"], int(offset), seed, scenario,
+            records, [], *points, row["v_t"], row["v_w"]
+        )
+        n += 1
+
+    return n
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+
+
+# ======================================================
+# Content-addressed run cache
+# ======================================================
+#
+# A run is identified by the hash of everything that determines its
+# outputs:
+#   scenario   the sumocfg and the files it loads (net, routes with their
+#              vType parameters, additional files), by content
+#   seed
+#   params     JAD / detection parameters of the runner (JSON)
+#   code       source of the modules with the control functions
+#              (CODE_MODULES + the runner), not the plotting code
+#
+# objects/<key>/ holds copies of the output files of one run (not hard
+# links: SUMO and save_result rewrite their outputs in place); index.sqlite
+# keeps their size and last use, and the least recently used runs are
+# evicted to stay under the disk budget.
+#
+# The same database keeps sweep manifests: one row per run of a named
+# sweep with its status and key, so an interrupted sweep restarts with the
+# runs that are not done yet (or were done with another key).
+
+RUN_CACHE_DIR = "run_cache"
+RUN_CACHE_BUDGET = 5 * 1024 ** 3        # bytes
+CODE_MODULES = [
+    "jad_controller.py", "jad_simulation.py", "jad_planning.py", "jad_io.py",
+    "scenario_generator.py", "ALL_FUNCTIONS.py"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    files     TEXT    NOT NULL,
+    meta      TEXT    NOT NULL,
+    created   REAL    NOT NULL,
+    last_used REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+CREATE TABLE IF NOT EXISTS manifest (
+    sweep   TEXT    NOT NULL,
+    idx     INTEGER NOT NULL,
+    params  TEXT    NOT NULL,
+    key     TEXT,
+    status  TEXT    NOT NULL,
+    updated REAL    NOT NULL,
+    PRIMARY KEY (sweep, idx)
+);
+"""
+
+
+
+# ======================================================
+# Run key
+# ======================================================
+def scenario_files(sumo_cfg):
+    """
+    The sumocfg, the input files it references (net, routes, additional)
+    and the scenario.json of a generated scenario (ramp / detector
+    positions, see scenario_generator.load_scenario) if there is one.
+    """
+    base = os.path.dirname(os.path.abspath(sumo_cfg))
+    files = [os.path.abspath(sumo_cfg)]
+    inputs = ET.parse(sumo_cfg).getroot().find("input")
+    if inputs is not None:
+        for elem in inputs:
+            for name in elem.get("value", "").split(","):
+                if name.strip():
+                    files.append(os.path.join(base, name.strip()))
+    if os.path.exists(os.path.join(base, "scenario.json")):
+        files.append(os.path.join(base, "scenario.json"))
+    return files
+
+
+def file_digest(paths):
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def code_version(runner_file, modules=CODE_MODULES):
+    """
+    Digest of the control code: the runner script and the modules it
+    drives the simulation with.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    return file_digest([os.path.abspath(runner_file)] + [os.path.join(here, m) for m in modules])
+
+
+def scenario_digest(sumo_cfg):
+    return file_digest(scenario_files(sumo_cfg))
+
+
+def run_key(scenario, seed, params, code):
+    """
+    Cache key of a run: sha1 of scenario digest (scenario_digest), seed,
+    parameters (JSON) and code version (code_version).
+    """
+    parts = {
+        "scenario": scenario,
+        "seed": seed,
+        "params": params,
+        "code": code
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+
+# ======================================================
+# Open / look up / store
+# ======================================================
+def open_cache(root=RUN_CACHE_DIR, budget=RUN_CACHE_BUDGET):
+    os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+    db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=60)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    return {"root": root, "budget": budget, "db": db, "hits": 0, "misses": 0, "evicted": 0}
+
+
+def close_cache(cache):
+    cache["db"].close()
+
+
+def _entry_dir(cache, key):
+    return os.path.join(cache["root"], "objects", key)
+
+
+def lookup(cache, key):
+    """
+    File names of a cached run (and mark it as used), None on a miss or if
+    its files are gone.
+    """
+    db = cache["db"]
+    row = db.execute("SELECT files FROM entries WHERE key=?", (key,)).fetchone()
+    if row is not None:
+        files = json.loads(row[0])
+        if all(os.path.exists(os.path.join(_entry_dir(cache, key), f)) for f in files):
+            with db:
+                db.execute("UPDATE entries SET last_used=? WHERE key=?", (time.time(), key))
+            cache["hits"] += 1
+            return files
+        _remove(cache, key)
+
+    cache["misses"] += 1
+    return None
+
+
+def restore(cache, key, dest_dir="."):
+    """
+    Put the output files of a cached run back into dest_dir.
+    Returns the file names, or None on a miss.
+    """
+    files = lookup(cache, key)
+    if files is None:
+        return None
+    for name in files:
+        shutil.copy2(os.path.join(_entry_dir(cache, key), name), os.path.join(dest_dir, name))
+    return files
+
+
+def store(cache, key, paths, meta=None):
+    """
+    Add the output files of a run, then evict least recently used runs
+    until the cache fits its budget again. Every file must exist: an
+    incomplete run is not stored.
+    """
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Run {key[:12]}: missing outputs {', '.join(missing)}")
+
+    entry = _entry_dir(cache, key)
+    os.makedirs(entry, exist_ok=True)
+
+    files, size = [], 0
+    for path in paths:
+        name = os.path.basename(path)
+        shutil.copy2(path, os.path.join(entry, name))
+        files.append(name)
+        size += os.path.getsize(path)
+
+    now = time.time()
+    with cache["db"] as db:
+        db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (key, size, json.dumps(files), json.dumps(meta or {}), now, now)
+        )
+    evict(cache, keep=key)
+    return files
+
+
+def _remove(cache, key):
+    shutil.rmtree(_entry_dir(cache, key), ignore_errors=True)
+    with cache["db"] as db:
+        db.execute("DELETE FROM entries WHERE key=?", (key,))
+
+
+def cache_size(cache):
+    return cache["db"].execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+
+def evict(cache, budget=None, keep=None):
+    """
+    Remove least recently used runs until the total size is within budget
+    (the run `keep` is never removed). Returns the number of runs evicted.
+    """
+    budget = cache["budget"] if budget is None else budget
+    total = cache_size(cache)
+    n = 0
+    for key, size in cache["db"].execute(
+        "SELECT key, size FROM entries ORDER BY last_used"
+    ).fetchall():
+        if total <= budget:
+            break
+        if key == keep:
+            continue
+        _remove(cache, key)
+        total -= size
+        n += 1
+    cache["evicted"] += n
+    return n
+
+
+
+# ======================================================
+# Sweep manifest
+# ======================================================
+def open_sweep(cache, name, runs, keys=None):
+    """
+    Register the runs (JSON-serializable parameter sets, in order) of a
+    sweep; runs already registered keep their status.
+    keys: current run key of each run (run_key); a run done with another
+    key (scenario, parameters or code changed since) is not done.
+    Returns the indices of the runs not done yet, in order.
+    """
+    now = time.time()
+    with cache["db"] as db:
+        db.executemany(
+            "INSERT OR IGNORE INTO manifest VALUES (?, ?, ?, NULL, 'pending', ?)",
+            ((name, i, json.dumps(run), now) for i, run in enumerate(runs))
+        )
+    rows = cache["db"].execute(
+        "SELECT idx, status, key FROM manifest WHERE sweep=? ORDER BY idx", (name,)
+    ).fetchall()
+    return [
+        idx for idx, status, key in rows
+        if idx < len(runs) and (status != "done" or keys is not None and key != keys[idx])
+    ]
+
+
+def mark_run(cache, name, idx, status, key=None):
+    with cache["db"] as db:
+        db.execute(
+            "UPDATE manifest SET status=?, key=COALESCE(?, key), updated=? WHERE sweep=? AND idx=?",
+            (status, key, time.time(), name, idx)
+        )
+
+
+def sweep_status(cache, name):
+    """
+    {status: number of runs} of a sweep.
+    """
+    return dict(cache["db"].execute(
+        "SELECT status, COUNT(*) FROM manifest WHERE sweep=? GROUP BY status", (name,)
+    ).fetchall())
+
+
+def sweep_name(runs, prefix="sweep"):
+    """
+    Default name of a sweep: digest of its run list.
+    """
+    return f"{prefix}_{hashlib.sha1(json.dumps(runs).encode()).hexdigest()[:10]}"
+
+
+def print_cache_stats(cache):
+    n = cache["db"].execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    print(
+        f"[Run cache] {cache['hits']} hits, {cache['misses']} misses, {cache['evicted']} evicted, "
+        f"{n} runs / {cache_size(cache) / 1024 ** 2:.0f} MB "
+        f"(budget {cache['budget'] / 1024 ** 2:.0f} MB) in {cache['root']}"
+    )
@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+
+
+# ======================================================
+# Reference scenario (highway.net.xml / route.rou.xml / run.sumocfg)
+# ======================================================
+REF_LENGTH = 8000.0
+REF_POSITIONS = {
+    "ramp": 1000.0,
+    "detector_upstream": 500,
+    "detector_downstream": 7000,
+    "stop_distance_to_end": 500
+}
+
+LANE_WIDTH = 3.2
+LANE_SPEED = 33.33
+
+# vType library; "car" is the type of the reference route file and of inserted JAD vehicles
+VTYPES = {
+    "car": {
+        "carFollowModel": "Krauss",
+        "accel": "2.0", "decel": "4.5", "tau": "1.2", "tauSigma": "1.2",
+        "accelSigma": "0.95", "decelSigma": "0.95", "sigma": "0.95",
+        "length": "5", "minGap": "1.5", "maxSpeed": "25",
+        "speedFactor": "1.0", "speedDev": "0.0"
+    },
+    "truck": {
+        "carFollowModel": "Krauss",
+        "accel": "1.0", "decel": "3.5", "tau": "1.5", "tauSigma": "1.2",
+        "accelSigma": "0.95", "decelSigma": "0.95", "sigma": "0.95",
+        "length": "12", "minGap": "2.5", "maxSpeed": "22",
+        "speedFactor": "1.0", "speedDev": "0.0"
+    }
+}
+
+
+
+# ======================================================
+# Positions scaled with the corridor length
+# ======================================================
+def whole_meters(x):
+    # Detector positions are written to the output files; whole meters stay
+    # int, as in the reference scenario
+    x = round(x, 2)
+    return int(x) if x == int(x) else x
+
+
+def scaled_positions(length):
+    """
+    Ramp and detectors keep their relative position on the corridor,
+    the natural stop keeps its distance to the end of the road.
+    """
+    scale = length / REF_LENGTH
+    return {
+        "ramp": REF_POSITIONS["ramp"] * scale,
+        "detector_upstream": whole_meters(REF_POSITIONS["detector_upstream"] * scale),
+        "detector_downstream": whole_meters(REF_POSITIONS["detector_downstream"] * scale),
+        "stop_distance_to_end": REF_POSITIONS["stop_distance_to_end"]
+    }
+
+
+
+# ======================================================
+# Writers
+# ======================================================
+def write_net(path, length, lanes):
+    width = LANE_WIDTH * lanes
+
+    lane_lines = []
+    for i in range(lanes):
+        y = -(lanes - i - 0.5) * LANE_WIDTH
+        lane_lines.append(
+            f'        <lane id="edge0_{i}"\n'
+            f'              index="{i}"\n'
+            f'              speed="{LANE_SPEED:.2f}"\n'
+            f'              length="{length:.2f}"\n'
+            f'              shape="0.00,{y:.2f} {length:.2f},{y:.2f}"/>'
+        )
+    inc_lanes = " ".join(f"edge0_{i}" for i in range(lanes))
+
+    with open(path, "w") as f:
+        f.write(f"""<?xml version="1.0" encoding="UTF-8"?>
+
+<net version="1.20" junctionCornerDetail="5" limitTurnSpeed="5.50"
+     xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+     xsi:noNamespaceSchemaLocation="http://sumo.dlr.de/xsd/net_file.xsd">
+
+    <location netOffset="0.00,0.00"
+              convBoundary="0.00,0.00,{length:.2f},0.00"
+              origBoundary="0.00,0.00,{length:.2f},0.00"
+              projParameter="!"/>
+
+    <edge id="edge0" from="start" to="end" priority="-1">
+{chr(10).join(lane_lines)}
+    </edge>
+
+    <junction id="end"
+              type="dead_end"
+              x="{length:.2f}"
+              y="0.00"
+              incLanes="{inc_lanes}"
+              intLanes=""
+              shape="{length:.2f},{-width:.2f} {length:.2f},0.00"/>
+    <junction id="start"
+              type="dead_end"
+              x="0.00"
+              y="0.00"
+              incLanes=""
+              intLanes=""
+              shape="0.00,0.00 0.00,{-width:.2f}"/>
+
+</net>
+""")
+
+
+def write_routes(path, lanes, demand, vtype_mix, horizon):
+    """
+    demand: vehicles per hour and lane
+    vtype_mix: {vtype_id: share}, shares are normalized
+    """
+    total = sum(vtype_mix.values())
+    depart_lane = "random" if lanes > 1 else "first"
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', "<routes>", ""]
+
+    for vtype_id in sorted(set(vtype_mix) | {"car"}):
+        attrs = " ".join(f'{k}="{v}"' for k, v in VTYPES[vtype_id].items())
+        lines.append(f'      <vType id="{vtype_id}" {attrs} />')
+
+    lines += [
+        "",
+        '   <route id="route0" edges="edge0"/>',
+        "",
+        '   <vehicle id="veh0" type="car" route="route0" depart="0" departSpeed="20"/>',
+        ""
+    ]
+
+    for vtype_id, share in sorted(vtype_mix.items()):
+        veh_per_hour = demand * lanes * share / total
+        if veh_per_hour <= 0:
+            continue
+        lines.append(
+            f'   <flow id="flow_{vtype_id}" type="{vtype_id}" route="route0" '
+            f'begin="1" end="{horizon:g}" period="{3600 / veh_per_hour:.4f}" '
+            f'departSpeed="15" departLane="{depart_lane}"/>'
+        )
+
+    lines += ["</routes>", ""]
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+
+def write_detectors(path, lanes, positions):
+    """
+    Native induction loops at both detector locations (one per lane)
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', "<additional>"]
+    for name in ("detector_upstream", "detector_downstream"):
+        for i in range(lanes):
+            lines.append(
+                f'    <inductionLoop id="{name}_{i}" lane="edge0_{i}" '
+                f'pos="{positions[name]:.2f}" period="60" file="detectors.out.xml"/>'
+            )
+    lines += ["</additional>", ""]
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+
+def write_sumocfg(path, horizon, step_length=1.0):
+    with open(path, "w") as f:
+        f.write(f"""<?xml version="1.0" encoding="UTF-8"?>
+<configuration>
+    <input>
+        <net-file value="highway.net.xml"/>
+        <route-files value="route.rou.xml"/>
+        <additional-files value="detectors.add.xml"/>
+    </input>
+
+    <time>
+        <begin value="0"/>
+        <end value="{horizon:g}"/>
+        <step-length value="{step_length:g}"/>
+    </time>
+
+    <output>
+        <fcd-output value="trajectory.xml"/>
+        <fcd-output.distance value="true"/>
+    </output>
+</configuration>
+""")
+
+
+
+# ======================================================
+# Scenario
+# ======================================================
+def generate_scenario(out_dir, length=REF_LENGTH, lanes=1, demand=2400,
+                      vtype_mix=None, horizon=1600, step_length=1.0):
+    """
+    Write highway.net.xml / route.rou.xml / detectors.add.xml / run.sumocfg
+    and scenario.json (parameters, scaled positions, hash) to out_dir.
+
+    Returns the path of the sumocfg.
+    """
+    if vtype_mix is None:
+        vtype_mix = {"car": 1.0}
+
+    os.makedirs(out_dir, exist_ok=True)
+    positions = scaled_positions(length)
+
+    write_net(os.path.join(out_dir, "highway.net.xml"), length, lanes)
+    write_routes(os.path.join(out_dir, "route.rou.xml"), lanes, demand, vtype_mix, horizon)
+    write_detectors(os.path.join(out_dir, "detectors.add.xml"), lanes, positions)
+    write_sumocfg(os.path.join(out_dir, "run.sumocfg"), horizon, step_length)
+
+    params = {
+        "length": length,
+        "lanes": lanes,
+        "demand": demand,
+        "vtype_mix": vtype_mix,
+        "horizon": horizon,
+        "step_length": step_length
+    }
+    scenario = dict(params, **positions)
+    scenario["hash"] = hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()[:12]
+
+    with open(os.path.join(out_dir, "scenario.json"), "w") as f:
+        json.dump(scenario, f, indent=2)
+
+    return os.path.join(out_dir, "run.sumocfg")
+
+
+def load_scenario(cfg_path):
+    """
+    Positions of a generated scenario (scenario.json next to the sumocfg),
+    or those of the reference scenario when there is none.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(cfg_path)), "scenario.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return dict(REF_POSITIONS, length=REF_LENGTH, lanes=1)
+
+
+def parse_vtype_mix(text):
+    """
+    "car:0.8,truck:0.2" -> {"car": 0.8, "truck": 0.2}
+    """
+    mix = {}
+    for item in text.split(","):
+        name, share = item.split(":")
+        if name not in VTYPES:
+            raise ValueError(f"Unknown vType '{name}', available: {', '.join(VTYPES)}")
+        mix[name] = float(share)
+    return mix
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a parametric SUMO corridor scenario")
+    parser.add_argument("out_dir")
+    parser.add_argument("--length", type=float, default=REF_LENGTH, help="corridor length (m)")
+    parser.add_argument("--lanes", type=int, default=1)
+    parser.add_argument("--demand", type=float, default=2400, help="veh/h per lane")
+    parser.add_argument("--vtypes", default="car:1.0", help='e.g. "car:0.8,truck:0.2"')
+    parser.add_argument("--horizon", type=float, default=1600, help="simulation end (s)")
+    parser.add_argument("--step-length", type=float, default=1.0)
+    args = parser.parse_args()
+
+    cfg = generate_scenario(
+        args.out_dir, length=args.length, lanes=args.lanes, demand=args.demand,
+        vtype_mix=parse_vtype_mix(args.vtypes), horizon=args.horizon,
+        step_length=args.step_length
+    )
+    print(f"Scenario written: {cfg}")
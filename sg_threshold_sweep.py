@@ -0,0 +1,180 @@
+import argparse
+import csv
+import numpy as np
+from jad_io import run_tag
+
+
+# ======================================================
+# Offline stop-and-go threshold sweep
+# ======================================================
+#
+# Replays the stop-and-go logic of Func.detector on a saved detector CSV
+# (d_1_jad_detector_{upstream,downstream}_*.csv) for a whole grid of
+# (SG_MAX_SPEED, SG_MIN_DURATION) at once:
+#
+# - crossings are reduced to one mean speed per step with crossings
+#   (the detector state only changes on those steps)
+# - low-speed episodes of every threshold are run-length encoded in one pass
+# - every duration is checked against all episodes with one comparison
+#
+# For each combination the first qualifying episode is reported, i.e. the
+# F / E / v_min that d_1 plans with.
+
+SG_MAX_SPEEDS = np.arange(2.0, 20.01, 1.0)      # m/s
+SG_MIN_DURATIONS = np.arange(10, 121, 5)        # s
+
+
+
+# ======================================================
+# Detector records
+# ======================================================
+def load_detector_steps(csv_file):
+    """
+    Returns (steps, v_mean) with one entry per step that has crossings,
+    v_mean being the mean crossing speed of that step (as in Func.detector).
+    """
+    data = np.loadtxt(csv_file, delimiter=",", skiprows=1, usecols=(1, 2), ndmin=2)
+    if len(data) == 0:
+        return np.array([]), np.array([])
+
+    steps, inverse = np.unique(data[:, 0], return_inverse=True)
+    v_mean = np.bincount(inverse, weights=data[:, 1]) / np.bincount(inverse)
+    return steps, v_mean
+
+
+
+# ======================================================
+# Low-speed episodes for all thresholds
+# ======================================================
+def low_speed_episodes(steps, v_mean, sg_max_speeds):
+    """
+    Run-length encode the low-speed episodes of every threshold.
+
+    Returns a dict of arrays, one entry per closed episode (an episode still
+    running at the end of the records is never reported by the detector):
+    row (index into sg_max_speeds), t_start, t_end, duration, v_start, v_end,
+    v_min, v_mean.
+    """
+    n = len(steps)
+    sg_max_speeds = np.asarray(sg_max_speeds, dtype=float)
+
+    # One row per threshold, one False column as separator between rows
+    low = np.zeros((len(sg_max_speeds), n + 1), dtype=bool)
+    low[:, :n] = v_mean[None, :] < sg_max_speeds[:, None]
+    flat = low.ravel()
+
+    edges = np.diff(flat.astype(np.int8), prepend=0)
+    starts = np.nonzero(edges == 1)[0]
+    ends = np.nonzero(edges == -1)[0]        # first index after the run
+
+    # Closed episodes end on a recorded (high-speed) step, not on the separator
+    closed = ends % (n + 1) < n
+    starts, ends = starts[closed], ends[closed]
+    i_start, i_end = starts % (n + 1), ends % (n + 1)
+
+    v_flat = np.tile(np.append(v_mean, np.inf), len(sg_max_speeds))
+    if len(starts):
+        bounds = np.column_stack([starts, ends]).ravel()
+        v_min = np.minimum.reduceat(v_flat, bounds)[::2]
+        v_sum = np.add.reduceat(v_flat, bounds)[::2]
+    else:
+        v_min = v_sum = np.array([])
+
+    return {
+        "row": starts // (n + 1),
+        "t_start": steps[i_start],
+        "t_end": steps[i_end],
+        "duration": steps[i_end] - steps[i_start],
+        "v_start": v_mean[i_start],
+        "v_end": v_mean[i_end],
+        "v_min": v_min,
+        "v_mean": v_sum / (ends - starts)
+    }
+
+
+
+# ======================================================
+# Threshold grid
+# ======================================================
+def sweep(steps, v_mean, sg_max_speeds=SG_MAX_SPEEDS, sg_min_durations=SG_MIN_DURATIONS):
+    """
+    Evaluate every (sg_max_speed, sg_min_duration) combination.
+
+    Returns a list of dicts (one per combination) with the number of
+    stop-and-go events and F_t / E_t / duration / v_min / v_mean of the first one
+    (None if there is none).
+    """
+    sg_max_speeds = np.asarray(sg_max_speeds, dtype=float)
+    sg_min_durations = np.asarray(sg_min_durations, dtype=float)
+    n_d = len(sg_min_durations)
+
+    ep = low_speed_episodes(steps, v_mean, sg_max_speeds)
+
+    # (episode, duration) pairs that qualify, in episode (= time) order
+    i_ep, i_d = np.nonzero(ep["duration"][:, None] >= sg_min_durations[None, :])
+    key = ep["row"][i_ep] * n_d + i_d
+
+    count = np.bincount(key, minlength=len(sg_max_speeds) * n_d)
+    first_key, first_pos = np.unique(key, return_index=True)
+    first = dict(zip(first_key.tolist(), i_ep[first_pos].tolist()))
+
+    results = []
+    for i_s, sg_max_speed in enumerate(sg_max_speeds):
+        for j, sg_min_duration in enumerate(sg_min_durations):
+            k = i_s * n_d + j
+            e = first.get(k)
+            results.append({
+                "sg_max_speed": float(sg_max_speed),
+                "sg_min_duration": float(sg_min_duration),
+                "n_events": int(count[k]),
+                "F_t": None if e is None else float(ep["t_start"][e]),
+                "E_t": None if e is None else float(ep["t_end"][e]),
+                "duration": None if e is None else float(ep["duration"][e]),
+                "v_min": None if e is None else float(ep["v_min"][e]),
+                "v_mean": None if e is None else float(ep["v_mean"][e])
+            })
+
+    return results
+
+
+def save_sweep(results, csv_file):
+    columns = ["sg_max_speed", "sg_min_duration", "n_events",
+               "F_t", "E_t", "duration", "v_min", "v_mean"]
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for r in results:
+            writer.writerow(["" if r[c] is None else r[c] for c in columns])
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep stop-and-go thresholds over saved detector records")
+    parser.add_argument("jad_speed", type=float, help="JAD_SPEED (km/h) of the d_1 run")
+    parser.add_argument("Et_offset", type=float, help="Et_OFFSET (s) of the d_1 run")
+    parser.add_argument("--side", default="downstream", choices=["upstream", "downstream"])
+    parser.add_argument("--speeds", type=float, nargs=3, metavar=("MIN", "MAX", "STEP"),
+                        help="SG_MAX_SPEED grid (m/s)")
+    parser.add_argument("--durations", type=float, nargs=3, metavar=("MIN", "MAX", "STEP"),
+                        help="SG_MIN_DURATION grid (s)")
+    args = parser.parse_args()
+
+    tag = run_tag(args.jad_speed, args.Et_offset)
+    speeds = SG_MAX_SPEEDS if args.speeds is None else np.arange(
+        args.speeds[0], args.speeds[1] + 1e-9, args.speeds[2])
+    durations = SG_MIN_DURATIONS if args.durations is None else np.arange(
+        args.durations[0], args.durations[1] + 1e-9, args.durations[2])
+
+    steps, v_mean = load_detector_steps(f"d_1_jad_detector_{args.side}_{tag}.csv")
+    results = sweep(steps, v_mean, speeds, durations)
+
+    out_file = f"d_1_jad_sg_sweep_{args.side}_{tag}.csv"
+    save_sweep(results, out_file)
+
+    n_found = sum(r["n_events"] > 0 for r in results)
+    print(f"{len(results)} combinations ({len(speeds)} speeds x {len(durations)} durations), "
+          f"{n_found} with a stop-and-go event")
+    print(f"File saved as: {out_file}")
@@ -0,0 +1,125 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import jad_replay
+
+
+# ======================================================
+# Trajectory arrays shared by parallel workers
+# ======================================================
+#
+# A loaded trajectory is published once as .npy files in shared memory
+# (/dev/shm); workers memory-map them read-only, so every worker sees the
+# same physical pages. Nothing is pickled but the handle (a directory and
+# the array names), and memory stays flat as the worker count grows.
+#
+#   handle = publish_arrays({"t": times, "id": ids, "x": xs})
+#   results = map_shared(handle, func, tasks)    # func(arrays, task), module level
+#   release_arrays(handle)
+
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# Arrays attached in this process, by handle directory
+_attached = {}
+
+
+
+# ======================================================
+# Publish / attach / release
+# ======================================================
+def publish_arrays(arrays, directory=None):
+    """
+    Write every array of the dict once; returns the handle to pass to workers.
+    """
+    path = tempfile.mkdtemp(prefix="jad_traj_", dir=directory or SHARED_DIR)
+    for name, a in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(a))
+    return {"dir": path, "names": list(arrays)}
+
+
+def attach_arrays(handle):
+    """
+    Read-only views of the published arrays (mapped once per process).
+    """
+    arrays = _attached.get(handle["dir"])
+    if arrays is None:
+        arrays = {
+            name: np.load(os.path.join(handle["dir"], f"{name}.npy"), mmap_mode="r")
+            for name in handle["names"]
+        }
+        _attached[handle["dir"]] = arrays
+    return arrays
+
+
+def release_arrays(handle):
+    _attached.pop(handle["dir"], None)
+    shutil.rmtree(handle["dir"], ignore_errors=True)
+
+
+def _run_task(handle, func, task):
+    return func(attach_arrays(handle), task)
+
+
+def map_shared(handle, func, tasks, workers=None):
+    """
+    [func(arrays, task) for task in tasks], in a process pool where
+    every worker reads the published arrays in place.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_task, repeat(handle), repeat(func), tasks))
+
+
+
+# ======================================================
+# Example analysis: headways at many cross-sections
+# ======================================================
+def section_headways(traj, x):
+    """
+    Headway statistics of the vehicles crossing x (as measured at the ramp
+    by check_insertion_opportunity_at_ramp).
+    """
+    crossings = jad_replay.ramp_crossings(traj, x)
+    h = crossings["headway"][~np.isnan(crossings["headway"])]
+    if len(h) == 0:
+        return {"x": x, "crossings": 0, "median": np.nan, "p90": np.nan}
+    return {
+        "x": x,
+        "crossings": len(h),
+        "median": float(np.median(h)),
+        "p90": float(np.percentile(h, 90))
+    }
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headways at many cross-sections, in parallel on shared arrays")
+    parser.add_argument("xml", nargs="?", default="b_1_base_trajectory.xml")
+    parser.add_argument("--sections", type=float, nargs=3, default=[500, 7500, 500],
+                        metavar=("FROM", "TO", "STEP"), help="cross-sections (m)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    traj = jad_replay.load_replay_data(args.xml)
+    sections = np.arange(args.sections[0], args.sections[1] + 1e-9, args.sections[2])
+
+    handle = publish_arrays(traj)
+    try:
+        t0 = time.perf_counter()
+        results = map_shared(handle, section_headways, sections, workers=args.workers)
+        elapsed = time.perf_counter() - t0
+    finally:
+        release_arrays(handle)
+
+    size = sum(a.nbytes for a in traj.values()) / 1e6
+    print(f"{'x (m)':>8}{'crossings':>12}{'median (s)':>12}{'p90 (s)':>10}")
+    for r in results:
+        print(f"{r['x']:>8.0f}{r['crossings']:>12}{r['median']:>12.2f}{r['p90']:>10.2f}")
+    print(f"\n{len(sections)} sections in {elapsed:.1f} s, {size:.0f} MB of arrays shared")
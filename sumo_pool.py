@@ -0,0 +1,117 @@
+import os
+import time
+from collections import deque
+import traci
+
+
+# ======================================================
+# Warm pool of SUMO instances
+# ======================================================
+#
+# traci.start pays process startup, network / route loading and the TraCI
+# connection (about 1 s here) for every run, which dominates short runs
+# (early exit, bisection). A pool starts its instances once; each run is
+# a traci.load of the same cfg with the run's seed and output files, in
+# the running process. Loading (or closing) an instance also finalizes
+# the output files of its previous run.
+#
+#   pool = sumo_pool.start_pool(2, "run.sumocfg", ["--no-warnings"])
+#   inst = sumo_pool.acquire(pool, seed=3, outputs=["--fcd-output", "traj.xml"])
+#   ... inst["conn"].simulationStep() ...
+#   sumo_pool.release(pool, inst)       # traj.xml is complete
+#   sumo_pool.close_pool(pool)
+#
+# Idle instances are loaded with their outputs sent to os.devnull, so a
+# pool never writes the cfg's default output files.
+
+
+def sumo_args(sumo_cfg, seed, options=(), outputs=()):
+    """
+    SUMO options of one run, without the binary (as traci.load expects).
+    """
+    return ["-c", sumo_cfg, "--seed", str(seed), *options, *outputs]
+
+
+def idle_outputs():
+    return ["--fcd-output", os.devnull]
+
+
+def start_pool(size, sumo_cfg, options=(), label="pool"):
+    """
+    Start `size` SUMO instances of sumo_cfg, labeled <label>0, <label>1, ...
+    options: SUMO options passed to every run (e.g. --no-warnings).
+    """
+    sumo_binary = os.path.join(os.environ["SUMO_HOME"], "bin", "sumo")
+    pool = {
+        "sumo_cfg": sumo_cfg,
+        "options": list(options),
+        "size": size,
+        "instances": [],
+        "free": deque(),
+        "n_runs": 0,
+        "start_time": 0.0,
+        "load_time": 0.0
+    }
+
+    for i in range(size):
+        inst_label = f"{label}{i}"
+        t0 = time.perf_counter()
+        traci.start(
+            [sumo_binary, *sumo_args(sumo_cfg, 0, pool["options"], idle_outputs())],
+            label=inst_label, doSwitch=False
+        )
+        pool["start_time"] += time.perf_counter() - t0
+
+        inst = {"label": inst_label, "conn": traci.getConnection(inst_label), "n_runs": 0}
+        pool["instances"].append(inst)
+        pool["free"].append(inst)
+
+    return pool
+
+
+def acquire(pool, seed, outputs=(), switch=False):
+    """
+    Take a free instance and load a new run (seed, output options).
+    With switch=True, the module-level traci functions talk to it
+    (for scripts written against `traci.`).
+    """
+    if not pool["free"]:
+        raise RuntimeError("No free SUMO instance in the pool")
+    inst = pool["free"].popleft()
+
+    t0 = time.perf_counter()
+    inst["conn"].load(sumo_args(pool["sumo_cfg"], seed, pool["options"], outputs))
+    pool["load_time"] += time.perf_counter() - t0
+
+    inst["n_runs"] += 1
+    pool["n_runs"] += 1
+    if switch:
+        traci.switch(inst["label"])
+    return inst
+
+
+def release(pool, inst):
+    """
+    Give an instance back. It is reloaded idle, which closes the output
+    files of the run it just finished.
+    """
+    inst["conn"].load(sumo_args(pool["sumo_cfg"], 0, pool["options"], idle_outputs()))
+    pool["free"].append(inst)
+
+
+def close_pool(pool):
+    for inst in pool["instances"]:
+        inst["conn"].close()
+    pool["instances"] = []
+    pool["free"].clear()
+
+
+def print_pool_stats(pool, elapsed=None):
+    n = pool["n_runs"]
+    line = (
+        f"[SUMO pool] {n} runs on {pool['size']} instances, "
+        f"startup {pool['start_time']:.2f} s once, load {pool['load_time'] * 1e3 / max(n, 1):.1f} ms per run"
+    )
+    if elapsed is not None:
+        line += f", {elapsed:.1f} s total"
+    print(line)
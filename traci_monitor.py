@@ -0,0 +1,280 @@
+import csv
+import sys
+import time
+import types
+
+
+# ======================================================
+# Counting socket (bytes on the TraCI connection)
+# ======================================================
+class _CountingSocket:
+    """
+    Thin proxy around the TraCI socket that counts bytes sent / received.
+    Everything else is forwarded to the original socket.
+    """
+
+    def __init__(self, sock, monitor):
+        self._sock = sock
+        self._monitor = monitor
+
+    def send(self, data, *args):
+        n = self._sock.send(data, *args)
+        self._monitor.bytes_sent += n
+        self._monitor._step_bytes += n
+        return n
+
+    def recv(self, bufsize, *args):
+        data = self._sock.recv(bufsize, *args)
+        self._monitor.bytes_recv += len(data)
+        self._monitor._step_bytes += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+
+# ======================================================
+# Caller attribution
+# ======================================================
+def _caller(frame):
+    """
+    "module.function" of the code issuing a call made from `frame`. Frames
+    of <listcomp>, <genexpr>, <lambda>, ... are skipped up to the function
+    that contains them; module-level code is reported as "module.<module>".
+    """
+    while frame.f_code.co_name.startswith("<") and frame.f_code.co_name != "<module>" \
+            and frame.f_back is not None:
+        frame = frame.f_back
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+
+# ======================================================
+# Domain proxy (traci.vehicle, traci.lane, ...)
+# ======================================================
+class _DomainProxy:
+
+    def __init__(self, domain, prefix, monitor):
+        self._domain = domain
+        self._prefix = prefix
+        self._monitor = monitor
+
+    def __getattr__(self, name):
+        attr = getattr(self._domain, name)
+        if callable(attr) and not isinstance(attr, type):
+            # Cache the wrapper on the proxy: later accesses skip __getattr__
+            attr = self._monitor._wrap(attr, f"{self._prefix}.{name}")
+            setattr(self, name, attr)
+        return attr
+
+
+
+# ======================================================
+# TraCI monitor
+# ======================================================
+class TraciMonitor:
+    """
+    Drop-in replacement for the `traci` module that counts every call:
+    - per API       ("vehicle.getPosition", "simulationStep", ...)
+    - per caller    ("module.function" issuing the call; comprehensions,
+                     generator expressions and lambdas count for the
+                     function that contains them)
+    - per step      (calls between two simulationStep() calls; calls made
+                     before the first one are counted as setup)
+    together with wall-clock latency and, for socket connections,
+    the bytes exchanged with SUMO.
+
+    Steps whose call count exceeds `step_budget` are flagged.
+    """
+
+    def __init__(self, traci_module, step_budget=None):
+        self._traci = traci_module
+        self.step_budget = step_budget
+
+        self.api_calls = {}       # api -> [calls, seconds]
+        self.caller_calls = {}    # (caller, api) -> calls
+        self.step_calls = []      # calls issued during each step
+        self.step_bytes = []      # bytes exchanged during each step
+        self.over_budget = []     # (step, calls)
+        self.setup_calls = 0      # calls before the first simulationStep()
+        self.setup_bytes = 0
+
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+
+        self._step = None         # open step, None before the first simulationStep()
+        self._step_count = 0
+        self._step_bytes = 0
+
+    # ------------------------------
+    # Attribute forwarding
+    # ------------------------------
+    def __getattr__(self, name):
+        attr = getattr(self._traci, name)
+        if isinstance(attr, (type, types.ModuleType)):
+            return attr
+        if callable(attr):
+            attr = self._wrap(attr, name)
+        elif not isinstance(attr, (int, float, str, bytes, tuple, list, dict)):
+            attr = _DomainProxy(attr, name, self)
+        else:
+            return attr
+        # Cache wrappers and proxies: later accesses skip __getattr__
+        setattr(self, name, attr)
+        return attr
+
+    def _wrap(self, func, api):
+        monitor = self
+        is_step = api == "simulationStep"
+
+        def counted(*args, **kwargs):
+            caller = _caller(sys._getframe(1))
+            if is_step:
+                monitor._close_step()
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            monitor._count(api, caller, time.perf_counter() - t0)
+            return result
+
+        return counted
+
+    def _count(self, api, caller, seconds):
+        entry = self.api_calls.setdefault(api, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+        key = (caller, api)
+        self.caller_calls[key] = self.caller_calls.get(key, 0) + 1
+
+        if api != "simulationStep":
+            self._step_count += 1
+
+        if api in ("start", "init", "connect"):
+            self._hook_socket()
+
+    def _close_step(self):
+        """
+        Close the open step before simulationStep() k+1 starts step k+1.
+        Calls issued from simulationStep() k (included) up to k+1 belong to
+        step k (k from 0, as the `step` counter of the drivers); calls before
+        the first simulationStep() go to setup.
+        """
+        if self._step is None:
+            self.setup_calls += self._step_count
+            self.setup_bytes += self._step_bytes
+            self._step = 0
+        else:
+            self.step_calls.append(self._step_count)
+            self.step_bytes.append(self._step_bytes)
+            if self.step_budget is not None and self._step_count > self.step_budget:
+                self.over_budget.append((self._step, self._step_count))
+            self._step += 1
+
+        self._step_count = 0
+        self._step_bytes = 0
+
+    def _steps(self):
+        """
+        Per-step calls, per-step bytes, over-budget steps, setup calls and
+        setup bytes, including the step still open (the last one of a run, never followed
+        by a simulationStep()).
+        """
+        step_calls, step_bytes, over_budget = self.step_calls, self.step_bytes, self.over_budget
+        if self._step is not None:
+            step_calls = step_calls + [self._step_count]
+            step_bytes = step_bytes + [self._step_bytes]
+            if self.step_budget is not None and self._step_count > self.step_budget:
+                over_budget = over_budget + [(self._step, self._step_count)]
+        else:
+            # No step yet: everything counted so far is setup
+            return [], [], [], self.setup_calls + self._step_count, self.setup_bytes + self._step_bytes
+        return step_calls, step_bytes, over_budget, self.setup_calls, self.setup_bytes
+
+    def _hook_socket(self):
+        """
+        Count bytes where measurable (socket TraCI; libsumo has no socket).
+        """
+        try:
+            conn = self._traci.getConnection()
+        except Exception:
+            return
+        sock = getattr(conn, "_socket", None)
+        if sock is not None and not isinstance(sock, _CountingSocket):
+            conn._socket = _CountingSocket(sock, self)
+
+    # ------------------------------
+    # Reporting
+    # ------------------------------
+    def report(self, top=15):
+        """
+        Print an end-of-run summary of TraCI usage.
+        """
+        step_calls, _, over_budget, setup_calls, _ = self._steps()
+        total_calls = sum(c for c, _ in self.api_calls.values())
+        total_time = sum(s for _, s in self.api_calls.values())
+        n_steps = len(step_calls)
+
+        print("\n========== TraCI call report ==========")
+        print(f"steps={n_steps}, calls={total_calls}, time={total_time:.3f} s, "
+              f"sent={self.bytes_sent} B, received={self.bytes_recv} B")
+
+        print(f"setup calls (before the first step): {setup_calls}")
+        if n_steps:
+            print(f"calls per step: mean={sum(step_calls) / n_steps:.1f}, "
+                  f"max={max(step_calls)}")
+
+        print("\n[Per API]")
+        print(f"{'api':<40}{'calls':>10}{'total ms':>12}{'mean us':>10}")
+        rows = sorted(self.api_calls.items(), key=lambda kv: -kv[1][0])
+        for api, (calls, seconds) in rows[:top]:
+            print(f"{api:<40}{calls:>10}{seconds * 1e3:>12.1f}{seconds / calls * 1e6:>10.1f}")
+
+        print("\n[Per caller]")
+        per_caller = {}
+        for (caller, api), calls in self.caller_calls.items():
+            per_caller[caller] = per_caller.get(caller, 0) + calls
+        for caller, calls in sorted(per_caller.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"{caller:<40}{calls:>10}")
+
+        if self.step_budget is not None:
+            print(f"\n[Budget] {len(over_budget)} steps exceed {self.step_budget} calls")
+            for step, calls in over_budget[:10]:
+                print(f"   step {step}: {calls} calls")
+
+        print("=======================================\n")
+
+    def save_report(self, csv_file):
+        """
+        Write per-step call counts and bytes to CSV (calls made before the
+        first step on a "setup" row).
+        """
+        step_calls, step_bytes, _, setup_calls, setup_bytes = self._steps()
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["step", "calls", "bytes", "over_budget"])
+            writer.writerow(["setup", setup_calls, setup_bytes, 0])
+            for step, (calls, nbytes) in enumerate(zip(step_calls, step_bytes)):
+                over = self.step_budget is not None and calls > self.step_budget
+                writer.writerow([step, calls, nbytes, int(over)])
+
+
+
+# ======================================================
+# Install the monitor
+# ======================================================
+def install(traci_module, modules=(), step_budget=None):
+    """
+    Wrap `traci_module` and replace the `traci` global of every module
+    in `modules` (e.g. ALL_FUNCTIONS) by the monitor. Modules that
+    provide set_traci (the ALL_FUNCTIONS facade) are switched through it.
+
+    Returns the monitor, to be used in place of `traci` by the caller.
+    """
+    monitor = TraciMonitor(traci_module, step_budget=step_budget)
+    for module in modules:
+        if hasattr(module, "set_traci"):
+            module.set_traci(monitor)
+        else:
+            module.traci = monitor
+    return monitor
@@ -0,0 +1,73 @@
+import argparse
+import os
+import time
+import numpy as np
+import ALL_FUNCTIONS as Func
+
+
+# ======================================================
+# Convert SUMO trajectory XML to the compact archive
+# ======================================================
+#
+# d_1_jad_trajectory_55_0.xml -> d_1_jad_trajectory_55_0.traj.npz
+# (format: see jad_io.write_trajectory_archive). Every script that reads
+# trajectories through Func.load_trajectory accepts the archive in place
+# of the XML file.
+
+def archive_path(xml_file):
+    return os.path.splitext(xml_file)[0] + Func.TRAJECTORY_ARCHIVE_SUFFIX
+
+
+def archive_trajectory(xml_file, out_file=None, check=True):
+    """
+    Write the archive of xml_file. With check=True the archive is decoded
+    and compared with the XML values.
+
+    Returns (archive path, XML size, archive size).
+    """
+    out_file = out_file or archive_path(xml_file)
+
+    times, ids, cols = Func.load_fcd_columns(xml_file, attrs=("x", "speed"))
+    Func.write_trajectory_archive(out_file, times, ids, cols["x"], cols["speed"])
+
+    if check:
+        a_times, a_ids, a_xs, a_speeds = Func.load_trajectory_archive(out_file, speeds=True)
+        order = np.lexsort((times, ids))
+        a_order = np.lexsort((a_times, a_ids))
+        same = (
+            np.array_equal(ids[order], a_ids[a_order])
+            and np.allclose(times[order], a_times[a_order], rtol=0, atol=5e-4)
+            and np.allclose(cols["x"][order], a_xs[a_order], rtol=0, atol=5e-3)
+            and np.allclose(cols["speed"][order], a_speeds[a_order], rtol=0, atol=5e-3)
+        )
+        if not same:
+            raise ValueError(f"Archive of {xml_file} does not match the XML")
+
+    return out_file, os.path.getsize(xml_file), os.path.getsize(out_file)
+
+
+
+# ======================================================
+# Main entry
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive SUMO trajectory XML files")
+    parser.add_argument("xml", nargs="+")
+    parser.add_argument("--no-check", action="store_true", help="skip the round-trip check")
+    parser.add_argument("--remove-xml", action="store_true", help="delete the XML after archiving")
+    args = parser.parse_args()
+
+    for xml_file in args.xml:
+        out_file, xml_size, out_size = archive_trajectory(xml_file, check=not args.no_check)
+
+        t0 = time.perf_counter()
+        Func.load_trajectory(out_file)
+        t_load = time.perf_counter() - t0
+
+        print(
+            f"{xml_file} -> {out_file}: {xml_size / 1e6:.1f} MB -> {out_size / 1e6:.2f} MB "
+            f"({xml_size / out_size:.0f}x), load {t_load:.2f} s"
+        )
+
+        if args.remove_xml:
+            os.remove(xml_file)